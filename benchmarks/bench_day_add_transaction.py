@@ -0,0 +1,81 @@
+# Compares Day.add_transaction against the original linear scan.
+#
+# Usage: python -m benchmarks.bench_day_add_transaction
+import datetime as dt
+import timeit
+
+from typing import Callable, List
+
+from zaim_to_monarch import Amount, Day, Transaction
+
+from .legacy import LegacyTransaction, LinearDay
+
+_DATE = dt.date(year=2020, month=1, day=4)
+
+
+def _transactions(count: int, factory: Callable = Transaction) -> List:
+    # A monarch pull, the zaim rows that match it, and PDF rows without ids.
+    transactions: List = []
+
+    for i in range(count):
+        transactions.append(
+            factory(
+                date=_DATE,
+                merchant=f"merchant {i}",
+                amount=Amount(jpy=100 + i, usd=1),
+                monarch_id=f"m{i}",
+            )
+        )
+
+    for i in range(count):
+        transactions.append(
+            factory(
+                date=_DATE,
+                merchant=f"merchant {i}",
+                amount=Amount(jpy=100 + i, usd=1),
+                zaim_id=f"z{i}",
+            )
+        )
+
+    for i in range(count):
+        transactions.append(
+            factory(
+                date=_DATE,
+                merchant=f"statement {i}",
+                amount=Amount(jpy=100 + count + i, usd=1),
+            )
+        )
+
+    return transactions
+
+
+def _run(day_factory: Callable, transactions: List[Transaction]) -> None:
+    day = day_factory(day=_DATE.day, transactions=[])
+    for transaction in transactions:
+        day.add_transaction(transaction)
+
+
+def main() -> None:
+    print(f"{'per day':>8} {'linear (ms)':>12} {'indexed (ms)':>13} {'speedup':>8}")
+
+    for count in (10, 100, 1000):
+        repeat = max(1, 1000 // count)
+
+        linear = min(
+            timeit.repeat(
+                lambda: _run(LinearDay, _transactions(count, LegacyTransaction)), number=1, repeat=repeat
+            )
+        )
+        indexed = min(
+            timeit.repeat(
+                lambda: _run(Day, _transactions(count)), number=1, repeat=repeat
+            )
+        )
+
+        print(
+            f"{count:>8} {linear * 1000:>12.2f} {indexed * 1000:>13.2f} {linear / indexed:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# Times the sync engine on synthetic data of configurable size: adding zaim
+# transactions to accounts, importing them into Monarch against an in-memory
+# MonarchMoney, and a dry-run push. Results can be saved as JSON and
+# compared against an earlier run.
+#
+# Usage: python -m benchmarks.bench_sync [--accounts 2] [--years 1]
+#            [--per_day 5] [--repeat 3] [--output results.json]
+#            [--compare baseline.json] [--threshold 20]
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from zaim_to_monarch import Account, Monarch
+
+from .synthetic import SyntheticDataset
+
+
+def _add_transactions(dataset: SyntheticDataset) -> Callable[[], Tuple[int, Any]]:
+    def run() -> Tuple[int, Any]:
+        return len(dataset.incoming), dataset.zaim_accounts()
+
+    return run
+
+
+def _import_accounts(dataset: SyntheticDataset) -> Callable[[], Tuple[int, Any]]:
+    accounts = dataset.zaim_accounts()
+
+    def run() -> Tuple[int, Any]:
+        monarch = Monarch(mm=dataset.monarch_money())
+        asyncio.run(_import(monarch, accounts))
+        return len(dataset.incoming) + len(dataset.existing), monarch
+
+    return run
+
+
+def _push_dry_run(dataset: SyntheticDataset) -> Callable[[], Tuple[int, Any]]:
+    def run() -> Tuple[int, Any]:
+        monarch = Monarch(mm=dataset.monarch_money())
+        asyncio.run(_import(monarch, dataset.zaim_accounts()))
+
+        # Only the push itself is timed.
+        start = time.perf_counter()
+        asyncio.run(monarch.push(dry_run=True))
+        return _pending(monarch), time.perf_counter() - start
+
+    return run
+
+
+async def _import(monarch: Monarch, accounts: List[Account]) -> None:
+    await monarch.login()
+    for account in accounts:
+        await monarch.import_account(account)
+
+
+def _pending(monarch: Monarch) -> int:
+    return sum(
+        1
+        for account in monarch.accounts().values()
+        for year in account.years.values()
+        for month in year.months.values()
+        for day in month.days.values()
+        for transaction in day.transactions
+        if transaction.needs_push_to_monarch
+    )
+
+
+def _measure(run: Callable[[], Tuple[int, Any]], repeat: int) -> Dict[str, float]:
+    # The fastest of repeat runs is reported. Peak memory is measured in a
+    # separate run since tracemalloc slows everything down.
+    seconds = float("inf")
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            items, result = run()
+            elapsed = time.perf_counter() - start
+            # Phases that time themselves return their own duration.
+            if isinstance(result, float):
+                elapsed = result
+            seconds = min(seconds, elapsed)
+            del result
+
+        gc.collect()
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "items": items,
+        "seconds": seconds,
+        "per_second": items / seconds if seconds > 0 else 0,
+        "peak_bytes": peak,
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            universal_newlines=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(
+    baseline: Dict[str, Any], results: Dict[str, Any], threshold: float
+) -> bool:
+    # Returns False when any phase got slower or bigger by more than
+    # threshold percent.
+    ok = True
+    print(f"\nCompared to {baseline.get('commit') or 'baseline'}:")
+    for phase, current in results["phases"].items():
+        before = baseline["phases"].get(phase)
+        if not before:
+            continue
+        for metric, better in (("per_second", 1), ("peak_bytes", -1)):
+            if not before[metric]:
+                continue
+            change = (current[metric] - before[metric]) / before[metric] * 100
+            regressed = change * better < -threshold
+            ok = ok and not regressed
+            print(
+                f"{phase:>18} {metric:>11} {change:>+7.1f}%"
+                + (" REGRESSION" if regressed else "")
+            )
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=2)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--per_day", type=int, default=5)
+    parser.add_argument("--overlap", type=float, default=0.5)
+    parser.add_argument("--pdf_fraction", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Report the fastest of this many runs."
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare against an earlier JSON file.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=20,
+        help="Percent change in throughput or memory reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    dataset = SyntheticDataset(
+        accounts=args.accounts,
+        years=args.years,
+        per_day=args.per_day,
+        overlap=args.overlap,
+        pdf_fraction=args.pdf_fraction,
+        seed=args.seed,
+    )
+    print(
+        f"{len(dataset.incoming)} zaim transactions, "
+        f"{len(dataset.existing)} monarch transactions"
+    )
+
+    results: Dict[str, Any] = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "dataset": {
+            "accounts": args.accounts,
+            "years": args.years,
+            "per_day": args.per_day,
+            "overlap": args.overlap,
+            "pdf_fraction": args.pdf_fraction,
+            "seed": args.seed,
+        },
+        "repeat": args.repeat,
+        "phases": {},
+    }
+
+    print(f"{'phase':>18} {'items':>8} {'seconds':>8} {'items/s':>9} {'peak MB':>8}")
+    for name, phase in (
+        ("add_transaction", _add_transactions),
+        ("import_account", _import_accounts),
+        ("push_dry_run", _push_dry_run),
+    ):
+        measured = _measure(phase(dataset), args.repeat)
+        results["phases"][name] = measured
+        print(
+            f"{name:>18} {measured['items']:>8} {measured['seconds']:>8.2f} "
+            f"{measured['per_second']:>9.0f} {measured['peak_bytes'] / 1e6:>8.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not _compare(baseline, results, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
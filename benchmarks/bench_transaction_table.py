@@ -0,0 +1,79 @@
+# Compares memory and insert throughput of the columnar TransactionTable
+# against the previous tree of per-transaction dataclasses.
+#
+# Usage: python -m benchmarks.bench_transaction_table [transactions]
+import datetime as dt
+import gc
+import sys
+import time
+import tracemalloc
+
+from typing import Callable, List, Tuple
+
+from zaim_to_monarch import Account, Amount, Transaction
+
+from .legacy import LegacyAccount, LegacyTransaction
+
+_MERCHANTS = [f"merchant {i}" for i in range(500)]
+
+
+def _rows(count: int) -> List[Tuple[dt.date, str, int, str]]:
+    # Ten years of history for one account.
+    start = dt.date(year=2015, month=1, day=1)
+    days = 3650
+    return [
+        (
+            start + dt.timedelta(days=i * days // count),
+            _MERCHANTS[i % len(_MERCHANTS)],
+            100 + (i * 37) % 20000,
+            str(1000000 + i),
+        )
+        for i in range(count)
+    ]
+
+
+def _measure(
+    account_factory: Callable, transaction_factory: Callable, rows: List
+) -> Tuple[float, int]:
+    gc.collect()
+    tracemalloc.start()
+
+    start = time.perf_counter()
+    account = account_factory(name="account", id="", balance=None, years={})
+    for date, merchant, yen, zaim_id in rows:
+        account.add_transaction(
+            transaction_factory(
+                date=date,
+                merchant=merchant,
+                amount=Amount(jpy=yen, date=date),
+                zaim_id=zaim_id,
+            )
+        )
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, memory
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = _rows(count)
+
+    print(f"{count} transactions")
+    print(f"{'structure':>10} {'inserts/s':>10} {'memory (MB)':>12} {'bytes/tx':>9}")
+
+    for name, account_factory, transaction_factory in (
+        ("tree", LegacyAccount, LegacyTransaction),
+        ("table", Account, Transaction),
+    ):
+        elapsed, memory = _measure(account_factory, transaction_factory, rows)
+        print(
+            f"{name:>10} {count / elapsed:>10.0f} {memory / 1e6:>12.1f} {memory / count:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# Compares reading a page of Zaim results row by row with WebDriver calls
+# against ZaimCrawler's single script call per page.
+#
+# Usage: python -m benchmarks.bench_zaim_extraction [--page saved.html]
+#            [--rows 500] [--latency 1.0] [--chrome]
+#
+# Without --chrome the page is parsed into an in-memory stand-in for the
+# driver and every WebDriver call costs --latency milliseconds, which is
+# about what a local chromedriver round-trip costs. With --chrome the page
+# is loaded into headless Chrome from a file.
+import argparse
+import html
+import os
+import re
+import tempfile
+import time
+
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from selenium.webdriver.common.by import By
+
+from zaim_to_monarch.zaim_crawler import _EXTRACT_ROWS_SCRIPT, ZaimCrawler, parse_rows
+
+from .legacy import legacy_extract_rows
+
+_YEAR = "2020"
+
+
+def _synthetic_page(count: int) -> str:
+    rows = []
+    for i in range(count):
+        from_account = '<img data-title="Wallet">' if i % 3 else ""
+        to_account = '<img data-title="Bank">' if i % 3 != 1 else ""
+        rows.append(
+            f"""<div class="SearchResult-module__body___x1">
+  <div><i data-url="/money/{1000000 + i}"></i></div>
+  <div><i title="1（集計に含める）"></i></div>
+  <div>{str(i % 12 + 1).zfill(2)}月{str(i % 28 + 1).zfill(2)}日（木）</div>
+  <div><span data-title="Food"></span><span>Groceries</span></div>
+  <div><span>¥{i * 10:,}</span></div>
+  <div>{from_account}</div>
+  <div>{to_account}</div>
+  <div><span>{html.escape(f"Store {i}")}</span></div>
+  <div><span>Item {i}</span></div>
+  <div><span></span></div>
+</div>"""
+        )
+    return (
+        '<html><body><div class="SearchResult-module__list___x1">'
+        + "\n".join(rows)
+        + "</div></body></html>"
+    )
+
+
+class _Element:
+    def __init__(
+        self,
+        tag: str,
+        attrs: Dict[str, str],
+        parent: Optional["_Element"],
+        latency: float,
+    ):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children: List[_Element] = []
+        self.texts: List[str] = []
+        self._latency = latency
+
+    def _round_trip(self) -> None:
+        time.sleep(self._latency)
+
+    def descendants(self):
+        for child in self.children:
+            yield child
+            yield from child.descendants()
+
+    def root(self) -> "_Element":
+        return self if self.parent is None else self.parent.root()
+
+    def inner_text(self) -> str:
+        return "".join(self.texts) + "".join(
+            child.inner_text() for child in self.children
+        )
+
+    def _match(self, by: str, value: str, whole_document: bool) -> List["_Element"]:
+        if by == By.TAG_NAME:
+            return [e for e in self.descendants() if e.tag == value]
+
+        prefix = re.search(r"starts-with\(@class, '([^']+)'\)", value).group(1)
+        scope = self.root() if whole_document else self
+        return [
+            e for e in scope.descendants() if e.attrs.get("class", "").startswith(prefix)
+        ]
+
+    def find_elements(self, by: str, value: str) -> List["_Element"]:
+        self._round_trip()
+        return self._match(by, value, value.startswith("//"))
+
+    def find_element(self, by: str, value: str) -> "_Element":
+        return self.find_elements(by, value)[0]
+
+    def get_attribute(self, name: str) -> Optional[str]:
+        self._round_trip()
+        return self.attrs.get(name)
+
+    @property
+    def text(self) -> str:
+        self._round_trip()
+        return self.inner_text().strip()
+
+
+class _TreeBuilder(HTMLParser):
+    _VOID = {"img", "br", "input", "meta", "link"}
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self._latency = latency
+        self.root = _Element("document", {}, None, latency)
+        self._current = self.root
+
+    def handle_starttag(self, tag, attrs) -> None:
+        element = _Element(tag, dict(attrs), self._current, self._latency)
+        self._current.children.append(element)
+        if tag not in self._VOID:
+            self._current = element
+
+    def handle_endtag(self, tag) -> None:
+        if tag not in self._VOID and self._current.parent is not None:
+            self._current = self._current.parent
+
+    def handle_data(self, data) -> None:
+        self._current.texts.append(data)
+
+
+class _SimulatedDriver:
+    # Stands in for a Chrome driver on a static page. execute_script runs the
+    # equivalent of ZaimCrawler's extraction script in one round-trip.
+    def __init__(self, page: str, latency: float):
+        builder = _TreeBuilder(latency)
+        builder.feed(page)
+        self._document = builder.root
+        self._latency = latency
+
+    def find_element(self, by: str, value: str) -> _Element:
+        return self._document.find_element(by, value)
+
+    def execute_script(self, script: str, *args) -> List[Dict[str, Any]]:
+        time.sleep(self._latency)
+        rows = self._document._match(
+            By.XPATH, "//*[starts-with(@class, 'SearchResult-module__body___')]", True
+        )
+        data = []
+        for row in rows:
+            items = row._match(By.TAG_NAME, "div", False)
+            spans = items[3]._match(By.TAG_NAME, "span", False)
+            from_account = items[5]._match(By.TAG_NAME, "img", False)
+            to_account = items[6]._match(By.TAG_NAME, "img", False)
+            first = lambda item, tag: item._match(By.TAG_NAME, tag, False)[0]
+            data.append(
+                {
+                    "url": first(items[0], "i").attrs["data-url"],
+                    "count": first(items[1], "i").attrs["title"],
+                    "date": items[2].inner_text(),
+                    "category": spans[0].attrs["data-title"],
+                    "genre": spans[1].inner_text(),
+                    "amount": first(items[4], "span").inner_text(),
+                    "from_account": (
+                        from_account[0].attrs["data-title"] if from_account else None
+                    ),
+                    "to_account": (
+                        to_account[0].attrs["data-title"] if to_account else None
+                    ),
+                    "place": first(items[7], "span").inner_text(),
+                    "name": first(items[8], "span").inner_text(),
+                    "comment": first(items[9], "span").inner_text(),
+                }
+            )
+        return data
+
+
+def _chrome_driver(page: str):
+    from selenium.webdriver import Chrome, ChromeOptions
+
+    options = ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    driver = Chrome(options=options)
+
+    fd, path = tempfile.mkstemp(suffix=".html")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(page)
+    driver.get(f"file://{path}")
+    return driver
+
+
+def _legacy(driver) -> List[Dict[str, Any]]:
+    data: List[Dict[str, Any]] = []
+    legacy_extract_rows(driver, _YEAR, data)
+    return data
+
+
+def _bulk(driver) -> List[Dict[str, Any]]:
+    # The scroll at the end of the script is not part of the extraction.
+    script = _EXTRACT_ROWS_SCRIPT.replace(
+        "rows[rows.length - 1].scrollIntoView(true);", ""
+    )
+    rows = driver.execute_script(
+        script, ZaimCrawler._RESULTS_CSS, ZaimCrawler._ROWS_CSS
+    )
+    return parse_rows(rows, _YEAR, set())
+
+
+def _measure(extract: Callable, driver) -> Tuple[int, float]:
+    start = time.perf_counter()
+    rows = extract(driver)
+    elapsed = time.perf_counter() - start
+    return len(rows), elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page", help="A saved zaim.net/money page.")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument(
+        "--latency", type=float, default=1.0, help="Milliseconds per WebDriver call."
+    )
+    parser.add_argument("--chrome", action="store_true")
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, encoding="utf-8") as f:
+            page = f.read()
+    else:
+        page = _synthetic_page(args.rows)
+
+    if args.chrome:
+        driver = _chrome_driver(page)
+        print("headless chrome")
+    else:
+        driver = _SimulatedDriver(page, args.latency / 1000)
+        print(f"simulated driver, {args.latency}ms per call")
+
+    print(f"{'method':>10} {'rows':>6} {'seconds':>8} {'rows/s':>9}")
+    results = {}
+    for name, extract in (("per-row", _legacy), ("bulk", _bulk)):
+        count, elapsed = _measure(extract, driver)
+        results[name] = elapsed
+        print(f"{name:>10} {count:>6} {elapsed:>8.3f} {count / elapsed:>9.0f}")
+    print(f"speedup: {results['per-row'] / results['bulk']:.1f}x")
+
+    if args.chrome:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# Frozen copies of structures that have since been optimized, kept so the
+# benchmarks can report before/after numbers from a single checkout.
+import bisect
+import dataclasses
+import datetime
+import datetime as dt
+
+from typing import Any, Dict, List, Optional
+
+from selenium.webdriver.common.by import By
+
+from zaim_to_monarch import Amount
+
+
+# Transactions as one dataclass per row inside nested Year/Month/Day dicts,
+# with the per-day hash indexes, before the columnar TransactionTable.
+@dataclasses.dataclass(frozen=False)
+class LegacyTransaction:
+    date: dt.date
+    merchant: str
+    amount: Amount
+    zaim_id: str = ""
+    monarch_id: str = ""
+    needs_push_to_monarch: bool = False
+    # The day this transaction was added to. Used to keep the day's
+    # indexes in sync when an indexed field is reassigned.
+    _day: Optional["LegacyDay"] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __setattr__(self, name: str, value) -> None:
+        day: Optional[LegacyDay] = self.__dict__.get("_day")
+
+        if day is None or not name in LegacyDay.INDEXED_FIELDS:
+            object.__setattr__(self, name, value)
+            return
+
+        day._unindex(self)
+        object.__setattr__(self, name, value)
+        day._index(self)
+
+    def __str__(self):
+        return f"Date: {self.date} Merchant: {self.merchant} Amount: {self.amount} zaim_id: {self.zaim_id} monarch_id: {self.monarch_id}"
+
+
+@dataclasses.dataclass(frozen=False)
+class LegacyDay:
+    INDEXED_FIELDS = ("zaim_id", "monarch_id", "amount")
+
+    day: int
+    transactions: List[LegacyTransaction]
+
+    # Positions in self.transactions, in ascending order, keyed by id or by
+    # amount_jpy. Matching picks the earliest position, exactly as a scan of
+    # self.transactions would.
+    _by_zaim_id: Dict[str, List[int]] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _by_monarch_id: Dict[str, List[int]] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _by_amount_jpy: Dict[float, List[int]] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _by_amount_jpy_without_zaim_id: Dict[float, List[int]] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _positions: Dict[int, int] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        for position, transaction in enumerate(self.transactions):
+            self._attach(transaction, position)
+
+    def add_transaction(self, new_transaction: LegacyTransaction) -> None:
+
+        if not new_transaction.monarch_id:
+            new_transaction.needs_push_to_monarch = True
+
+        duplicate: Optional[int] = None
+
+        if new_transaction.zaim_id:
+            duplicate = self._first(self._by_zaim_id, new_transaction.zaim_id)
+
+        if new_transaction.monarch_id:
+            position = self._first(self._by_monarch_id, new_transaction.monarch_id)
+            if position is not None and (duplicate is None or position < duplicate):
+                duplicate = position
+
+        match: Optional[int] = None
+
+        # Transactions sourced from PDFs will not have any ID.
+        # In this case, the merchant info may differ and cannot
+        # be used to distinguish transactions. Use amount_jpy as
+        # an approximate proxy for an ID.
+        if not new_transaction.zaim_id and not new_transaction.monarch_id:
+            match = self._first(self._by_amount_jpy, new_transaction.amount.jpy)
+
+        # Similarly, transactions that were originally created from
+        # a PDF import may have a monarch id but not a zaim id.
+        # In this case, update the zaim id when a match is found.
+        if new_transaction.zaim_id:
+            match = self._first(
+                self._by_amount_jpy_without_zaim_id, new_transaction.amount.jpy
+            )
+
+        # An id match on an earlier (or the same) transaction wins, as it
+        # would have been found first when scanning in order.
+        if duplicate is not None and (match is None or duplicate <= match):
+            return
+
+        if match is not None:
+            transaction = self.transactions[match]
+
+            if new_transaction.zaim_id:
+                transaction.zaim_id = new_transaction.zaim_id
+            else:
+                transaction.merchant = new_transaction.merchant
+                transaction.amount = new_transaction.amount
+
+            transaction.needs_push_to_monarch = True
+            return
+
+        self.transactions.append(new_transaction)
+        self._attach(new_transaction, len(self.transactions) - 1)
+
+    def _attach(self, transaction: LegacyTransaction, position: int) -> None:
+        self._positions[id(transaction)] = position
+        object.__setattr__(transaction, "_day", self)
+        self._index(transaction)
+
+    def _index(self, transaction: LegacyTransaction) -> None:
+        position = self._positions[id(transaction)]
+
+        if transaction.zaim_id:
+            bisect.insort(self._by_zaim_id.setdefault(transaction.zaim_id, []), position)
+        if transaction.monarch_id:
+            bisect.insort(
+                self._by_monarch_id.setdefault(transaction.monarch_id, []), position
+            )
+
+        amount_jpy = transaction.amount.jpy
+        bisect.insort(self._by_amount_jpy.setdefault(amount_jpy, []), position)
+        if not transaction.zaim_id:
+            bisect.insort(
+                self._by_amount_jpy_without_zaim_id.setdefault(amount_jpy, []),
+                position,
+            )
+
+    def _unindex(self, transaction: LegacyTransaction) -> None:
+        position = self._positions[id(transaction)]
+
+        if transaction.zaim_id:
+            self._remove(self._by_zaim_id, transaction.zaim_id, position)
+        if transaction.monarch_id:
+            self._remove(self._by_monarch_id, transaction.monarch_id, position)
+
+        amount_jpy = transaction.amount.jpy
+        self._remove(self._by_amount_jpy, amount_jpy, position)
+        if not transaction.zaim_id:
+            self._remove(self._by_amount_jpy_without_zaim_id, amount_jpy, position)
+
+    @staticmethod
+    def _first(index: Dict, key) -> Optional[int]:
+        positions = index.get(key)
+        return positions[0] if positions else None
+
+    @staticmethod
+    def _remove(index: Dict, key, position: int) -> None:
+        positions = index[key]
+        positions.pop(bisect.bisect_left(positions, position))
+        if not positions:
+            del index[key]
+
+
+@dataclasses.dataclass(frozen=False)
+class LegacyMonth:
+    month: int
+    days: Dict[int, LegacyDay]
+
+    def add_transaction(self, transaction: LegacyTransaction) -> None:
+        day = transaction.date.day
+
+        if not day in self.days:
+            self.days[day] = LegacyDay(day, [])
+
+        self.days[day].add_transaction(transaction)
+
+
+@dataclasses.dataclass(frozen=False)
+class LegacyYear:
+    year: int
+    months: Dict[int, LegacyMonth]
+
+    def add_transaction(self, transaction: LegacyTransaction) -> None:
+        month = transaction.date.month
+
+        if not month in self.months:
+            self.months[month] = LegacyMonth(month, {})
+
+        self.months[month].add_transaction(transaction)
+
+
+@dataclasses.dataclass(frozen=False)
+class LegacyAccount:
+    name: str
+    id: str
+    balance: Optional[Amount]
+    years: Dict[int, LegacyYear]
+
+    def add_transaction(self, transaction: LegacyTransaction) -> None:
+        year = transaction.date.year
+
+        if not year in self.years:
+            self.years[year] = LegacyYear(year, {})
+
+        self.years[year].add_transaction(transaction)
+
+
+# Day.add_transaction before the hash indexes.
+@dataclasses.dataclass(frozen=False)
+class LinearDay:
+    day: int
+    transactions: List[LegacyTransaction]
+
+    def add_transaction(self, new_transaction: LegacyTransaction) -> None:
+
+        if not new_transaction.monarch_id:
+            new_transaction.needs_push_to_monarch = True
+
+        for transaction in self.transactions:
+            if new_transaction.zaim_id and (
+                transaction.zaim_id == new_transaction.zaim_id
+            ):
+                return
+
+            if new_transaction.monarch_id and (
+                transaction.monarch_id == new_transaction.monarch_id
+            ):
+                return
+
+            if not new_transaction.zaim_id and not new_transaction.monarch_id:
+                if new_transaction.amount.jpy == transaction.amount.jpy:
+                    transaction.merchant = new_transaction.merchant
+                    transaction.amount = new_transaction.amount
+                    transaction.needs_push_to_monarch = True
+                    return
+
+            if (
+                not transaction.zaim_id
+                and new_transaction.zaim_id
+                and new_transaction.amount.jpy == transaction.amount.jpy
+            ):
+                transaction.zaim_id = new_transaction.zaim_id
+                transaction.needs_push_to_monarch = True
+                return
+
+        self.transactions.append(new_transaction)
+
+
+# ZaimCrawler._crawler before the single script call per page: several
+# WebDriver round-trips per row and a linear duplicate check.
+def legacy_extract_rows(driver, year: str, data: List[Dict[str, Any]]) -> None:
+    table = driver.find_element(
+        by=By.XPATH,
+        value="//*[starts-with(@class, 'SearchResult-module__list___')]",
+    )
+    lines = table.find_elements(
+        by=By.XPATH,
+        value="//*[starts-with(@class, 'SearchResult-module__body___')]",
+    )
+
+    for line in lines:
+        items = line.find_elements(by=By.TAG_NAME, value="div")
+
+        item = {}
+        item["id"] = (
+            items[0]
+            .find_element(by=By.TAG_NAME, value="i")
+            .get_attribute("data-url")
+            .split("/")[2]
+        )
+
+        flg_duplicate = next(
+            (row["id"] for row in data if row["id"] == item["id"]), None
+        )
+        if flg_duplicate:
+            continue
+
+        item["count"] = (
+            items[1]
+            .find_element(by=By.TAG_NAME, value="i")
+            .get_attribute("title")
+            .split("（")[0]
+        )
+        date = items[2].text.split("（")[0]
+        item["date"] = datetime.datetime.strptime(f"{year}年{date}", "%Y年%m月%d日")
+        item["category"] = (
+            items[3]
+            .find_element(by=By.TAG_NAME, value="span")
+            .get_attribute("data-title")
+        )
+        item["genre"] = items[3].find_elements(by=By.TAG_NAME, value="span")[1].text
+        item["amount"] = int(
+            items[4]
+            .find_element(by=By.TAG_NAME, value="span")
+            .text.strip("¥")
+            .replace(",", "")
+        )
+        m_from = items[5].find_elements(by=By.TAG_NAME, value="img")
+        if len(m_from) != 0:
+            item["from_account"] = m_from[0].get_attribute("data-title")
+        m_to = items[6].find_elements(by=By.TAG_NAME, value="img")
+        if len(m_to) != 0:
+            item["to_account"] = m_to[0].get_attribute("data-title")
+        item["type"] = (
+            "transfer"
+            if "from_account" in item and "to_account" in item
+            else (
+                "payment"
+                if "from_account" in item
+                else "income" if "to_account" in item else None
+            )
+        )
+        item["place"] = items[7].find_element(by=By.TAG_NAME, value="span").text
+        item["name"] = items[8].find_element(by=By.TAG_NAME, value="span").text
+        item["comment"] = items[9].find_element(by=By.TAG_NAME, value="span").text
+        data.append(item)
@@ -0,0 +1,291 @@
+# A local stand-in for the Monarch API. Serves the GraphQL operations that
+# Monarch uses through MonarchMoney from an InMemoryMonarchMoney, with a
+# configurable latency per request, a limit on concurrent requests and
+# random 429 responses. Documents of aliased createTransaction and
+# updateTransaction fields, as sent by MonarchBatch, are run field by field.
+# Point the sync at it by setting MONARCH_BASE_URL to the address it prints.
+#
+# Usage: python -m benchmarks.monarch_server [--port 8765] [--latency 0.05]
+#            [--max_concurrency 8] [--throttle_rate 0.01]
+#            [--accounts 2] [--years 1] [--per_day 5]
+import argparse
+import asyncio
+import random
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiohttp import web
+from graphql import FieldNode, GraphQLError, OperationDefinitionNode, parse
+
+from .synthetic import InMemoryMonarchMoney, SyntheticDataset
+
+TOKEN = "local-token"
+
+Operation = Callable[[InMemoryMonarchMoney, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def _update_account(
+    store: InMemoryMonarchMoney, input: Dict[str, Any]
+) -> Awaitable[Dict[str, Any]]:
+    account = store.accounts[input["id"]]
+    return store.update_account(
+        account_id=input["id"],
+        account_balance=input.get("displayBalance", account["displayBalance"]),
+    )
+
+
+# GraphQL operation name to the call on the store that answers it.
+_OPERATIONS: Dict[str, Operation] = {
+    "GetAccounts": lambda store, variables: store.get_accounts(),
+    "GetTransactionsList": lambda store, variables: store.get_transactions(
+        limit=variables["limit"],
+        offset=variables["offset"],
+        start_date=variables["filters"].get("startDate"),
+        end_date=variables["filters"].get("endDate"),
+        account_ids=variables["filters"].get("accounts") or [],
+    ),
+    "Common_CreateTransactionMutation": lambda store, variables: store.create_transaction(
+        date=variables["input"]["date"],
+        account_id=variables["input"]["accountId"],
+        amount=variables["input"]["amount"],
+        merchant_name=variables["input"]["merchantName"],
+        category_id=variables["input"]["categoryId"],
+        notes=variables["input"].get("notes", ""),
+        update_balance=variables["input"].get("shouldUpdateBalance", False),
+    ),
+    "Web_TransactionDrawerUpdateTransaction": lambda store, variables: store.update_transaction(
+        transaction_id=variables["input"]["id"],
+        category_id=variables["input"].get("category"),
+        merchant_name=variables["input"].get("name"),
+        amount=variables["input"].get("amount"),
+        date=variables["input"].get("date"),
+        notes=variables["input"].get("notes"),
+    ),
+    "Web_CreateManualAccount": lambda store, variables: store.create_manual_account(
+        account_type=variables["input"]["type"],
+        account_sub_type=variables["input"]["subtype"],
+        is_in_net_worth=variables["input"]["includeInNetWorth"],
+        account_name=variables["input"]["name"],
+        account_balance=variables["input"]["displayBalance"],
+    ),
+    "Common_UpdateAccount": lambda store, variables: _update_account(
+        store, variables["input"]
+    ),
+    "GetCategories": lambda store, variables: store.get_transaction_categories(),
+    "ManageGetCategoryGroups": lambda store, variables: store.get_transaction_category_groups(),
+    "Web_CreateCategory": lambda store, variables: store.create_transaction_category(
+        group_id=variables["input"]["group"],
+        transaction_category_name=variables["input"]["name"],
+    ),
+}
+
+
+# Mutation fields that may be batched, and the operation that runs each.
+_BATCH_FIELDS: Dict[str, str] = {
+    "createTransaction": "Common_CreateTransactionMutation",
+    "updateTransaction": "Web_TransactionDrawerUpdateTransaction",
+}
+
+
+class MonarchServer:
+    # Requests over max_concurrency, and a throttle_rate fraction of the
+    # rest, are answered with 429 like the real service does when it is
+    # overloaded. Accepted requests wait latency seconds before they are
+    # answered, while holding their concurrency slot.
+    def __init__(
+        self,
+        store: InMemoryMonarchMoney,
+        latency: float = 0,
+        max_concurrency: Optional[int] = None,
+        throttle_rate: float = 0,
+        seed: int = 0,
+    ):
+        self.store: InMemoryMonarchMoney = store
+        self.latency: float = latency
+        self.max_concurrency: Optional[int] = max_concurrency
+        self.throttle_rate: float = throttle_rate
+        self._random: random.Random = random.Random(seed)
+
+        self.requests: Dict[str, int] = {}
+        self.throttled: int = 0
+        self.in_flight: int = 0
+        self.max_in_flight: int = 0
+
+        self._runner: Optional[web.AppRunner] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/auth/login/", self._login)
+        app.router.add_post("/graphql", self._graphql)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        # Returns the base URL. Port 0 picks a free port.
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def summary(self) -> str:
+        total = sum(self.requests.values())
+        return (
+            f"{total} requests, {self.throttled} throttled, "
+            f"at most {self.max_in_flight} at once. "
+            + ", ".join(f"{name}: {n}" for name, n in sorted(self.requests.items()))
+        )
+
+    async def _login(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if not body.get("username") or not body.get("password"):
+            return web.json_response({"detail": "Missing credentials"}, status=401)
+        return web.json_response({"token": TOKEN})
+
+    async def _graphql(self, request: web.Request) -> web.Response:
+        if request.headers.get("Authorization") != f"Token {TOKEN}":
+            return web.json_response({"detail": "Not logged in"}, status=401)
+
+        body = await request.json()
+        name = body.get("operationName") or ""
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+        if (
+            self.max_concurrency is not None and self.in_flight >= self.max_concurrency
+        ) or (self.throttle_rate and self._random.random() < self.throttle_rate):
+            self.throttled += 1
+            return web.json_response(
+                {"detail": "Too many requests"}, status=429, headers={"Retry-After": "1"}
+            )
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return web.json_response(
+                await self._execute(name, body.get("query"), body.get("variables"))
+            )
+        finally:
+            self.in_flight -= 1
+
+    async def _execute(
+        self, name: str, query: Optional[str], variables: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        operation = _OPERATIONS.get(name)
+        if operation is None:
+            return await self._execute_batch(name, query or "", variables or {})
+        try:
+            return {"data": await operation(self.store, variables or {})}
+        except KeyError as e:
+            return {"errors": [{"message": f"{name}: unknown id {e}"}]}
+
+    async def _execute_batch(
+        self, name: str, query: str, variables: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        try:
+            definition = parse(query).definitions[0]
+        except (GraphQLError, IndexError):
+            return {"errors": [{"message": f"Unsupported operation {name}"}]}
+
+        fields = []
+        if isinstance(definition, OperationDefinitionNode):
+            fields = definition.selection_set.selections
+        if not fields or not all(
+            isinstance(field, FieldNode)
+            and field.name.value in _BATCH_FIELDS
+            and len(field.arguments) == 1
+            for field in fields
+        ):
+            return {"errors": [{"message": f"Unsupported operation {name}"}]}
+
+        # Every field fails on its own, like the payload errors of Monarch.
+        data: Dict[str, Any] = {}
+        for field in fields:
+            alias = (field.alias or field.name).value
+            input = variables.get(field.arguments[0].value.name.value)
+            try:
+                result = await _OPERATIONS[_BATCH_FIELDS[field.name.value]](
+                    self.store, {"input": input}
+                )
+                data[alias] = result[field.name.value]
+            except (KeyError, TypeError) as e:
+                data[alias] = {
+                    "transaction": None,
+                    "errors": {
+                        "message": f"Unknown or missing id {e}",
+                        "code": "NOT_FOUND",
+                        "fieldErrors": [],
+                    },
+                }
+        return {"data": data}
+
+
+async def _serve(server: MonarchServer, host: str, port: int) -> None:
+    base_url = await server.start(host, port)
+    print(f"Serving the Monarch API at {base_url}")
+    print(f"export MONARCH_BASE_URL={base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        print(server.summary())
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="Seconds added to every request."
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        help="Answer requests beyond this many in flight with 429.",
+    )
+    parser.add_argument(
+        "--throttle_rate",
+        type=float,
+        default=0,
+        help="Fraction of requests answered with 429.",
+    )
+    parser.add_argument("--accounts", type=int, default=2)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--per_day", type=int, default=5)
+    parser.add_argument("--overlap", type=float, default=0.5)
+    parser.add_argument("--pdf_fraction", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = SyntheticDataset(
+        accounts=args.accounts,
+        years=args.years,
+        per_day=args.per_day,
+        overlap=args.overlap,
+        pdf_fraction=args.pdf_fraction,
+        seed=args.seed,
+    )
+    server = MonarchServer(
+        dataset.monarch_money(),
+        latency=args.latency,
+        max_concurrency=args.max_concurrency,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
+    print(
+        f"{args.accounts} accounts with {len(dataset.existing)} monarch transactions"
+    )
+    try:
+        asyncio.run(_serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
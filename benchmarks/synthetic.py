@@ -0,0 +1,268 @@
+# Synthetic zaim and monarch data for the sync benchmarks, and an in-memory
+# stand-in for MonarchMoney that serves it.
+import asyncio
+import dataclasses
+import datetime as dt
+import random
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from zaim_to_monarch import Account, Amount, Transaction
+
+_MERCHANTS = [f"merchant {i}" for i in range(500)]
+
+CATEGORY_NAME = "zaim-to-monarch"
+
+
+class InMemoryMonarchMoney:
+    # Implements the MonarchMoney calls used by Monarch against dicts. Every
+    # call can be given a latency to simulate the network.
+    def __init__(self, latency: float = 0):
+        self.latency: float = latency
+        self.accounts: Dict[str, Dict[str, Any]] = {}
+        self.transactions: Dict[str, Dict[str, Any]] = {}
+        self.categories: List[Dict[str, Any]] = [
+            {"id": "1", "name": CATEGORY_NAME, "group": {"id": "1"}}
+        ]
+        self.category_groups: List[Dict[str, Any]] = [{"id": "1", "name": "Other"}]
+        self.calls: Dict[str, int] = {}
+        self._next_id: int = 1000000000
+
+    def add_account(self, account_id: str, name: str, balance: float = 0) -> None:
+        self.accounts[account_id] = {
+            "id": account_id,
+            "displayName": name,
+            "displayBalance": balance,
+            "currentBalance": balance,
+            "isManual": True,
+        }
+
+    def add_transaction(
+        self,
+        account_id: str,
+        date: dt.date,
+        amount_usd: float,
+        merchant: str,
+        notes: str,
+        transaction_id: Optional[str] = None,
+    ) -> str:
+        transaction_id = transaction_id or self._new_id()
+        self.transactions[transaction_id] = {
+            "id": transaction_id,
+            "amount": amount_usd,
+            "date": date.isoformat(),
+            "notes": notes,
+            "merchant": {"name": merchant},
+            "category": {"id": self.categories[0]["id"]},
+            "account": {
+                "id": account_id,
+                "displayName": self.accounts[account_id]["displayName"],
+            },
+        }
+        return transaction_id
+
+    async def login(self, *args, **kwargs) -> None:
+        await self._call("login")
+
+    async def get_accounts(self) -> Dict[str, Any]:
+        await self._call("get_accounts")
+        return {"accounts": [dict(account) for account in self.accounts.values()]}
+
+    async def create_manual_account(
+        self,
+        account_type: str = "",
+        account_sub_type: str = "",
+        is_in_net_worth: bool = True,
+        account_name: str = "",
+        account_balance: float = 0,
+    ) -> Dict[str, Any]:
+        await self._call("create_manual_account")
+        account_id = self._new_id()
+        self.add_account(account_id, account_name, account_balance)
+        return {"createManualAccount": {"account": {"id": account_id}, "errors": None}}
+
+    async def update_account(
+        self, account_id: str = "", account_balance: float = 0
+    ) -> Dict[str, Any]:
+        await self._call("update_account")
+        account = self.accounts[account_id]
+        account["displayBalance"] = account["currentBalance"] = account_balance
+        return {"updateAccount": {"account": {"id": account_id}, "errors": None}}
+
+    async def get_transactions(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        account_ids: List[str] = [],
+    ) -> Dict[str, Any]:
+        await self._call("get_transactions")
+        results = [
+            transaction
+            for transaction in self.transactions.values()
+            if (not start_date or start_date <= transaction["date"])
+            and (not end_date or transaction["date"] <= end_date)
+            and (not account_ids or transaction["account"]["id"] in account_ids)
+        ]
+        results.sort(key=lambda transaction: transaction["date"], reverse=True)
+        return {
+            "allTransactions": {
+                "totalCount": len(results),
+                "results": results[offset : offset + limit],
+            }
+        }
+
+    async def create_transaction(
+        self,
+        date: str,
+        account_id: str,
+        amount: float,
+        merchant_name: str,
+        category_id: str,
+        notes: str = "",
+        update_balance: bool = False,
+    ) -> Dict[str, Any]:
+        await self._call("create_transaction")
+        transaction_id = self.add_transaction(
+            account_id, dt.date.fromisoformat(date), amount, merchant_name, notes
+        )
+        return {
+            "createTransaction": {"transaction": {"id": transaction_id}, "errors": None}
+        }
+
+    async def update_transaction(
+        self,
+        transaction_id: str,
+        category_id: Optional[str] = None,
+        merchant_name: Optional[str] = None,
+        goal_id: Optional[str] = None,
+        amount: Optional[float] = None,
+        date: Optional[str] = None,
+        hide_from_reports: Optional[bool] = None,
+        needs_review: Optional[bool] = None,
+        notes: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        await self._call("update_transaction")
+        transaction = self.transactions[transaction_id]
+        if merchant_name is not None:
+            transaction["merchant"] = {"name": merchant_name}
+        if notes is not None:
+            transaction["notes"] = notes
+        if amount is not None:
+            transaction["amount"] = amount
+        if date is not None:
+            transaction["date"] = date
+        return {"updateTransaction": {"transaction": {"id": transaction_id}}}
+
+    async def get_transaction_categories(self) -> Dict[str, Any]:
+        await self._call("get_transaction_categories")
+        return {"categories": list(self.categories)}
+
+    async def get_transaction_category_groups(self) -> Dict[str, Any]:
+        await self._call("get_transaction_category_groups")
+        return {"categoryGroups": list(self.category_groups)}
+
+    async def create_transaction_category(
+        self, group_id: str, transaction_category_name: str, **kwargs
+    ) -> Dict[str, Any]:
+        await self._call("create_transaction_category")
+        category = {
+            "id": self._new_id(),
+            "name": transaction_category_name,
+            "group": {"id": group_id},
+        }
+        self.categories.append(category)
+        return {"createCategory": {"category": category, "errors": None}}
+
+    async def _call(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _new_id(self) -> str:
+        self._next_id += 1
+        return str(self._next_id)
+
+
+@dataclasses.dataclass(frozen=False)
+class SyntheticDataset:
+    # accounts x years x per_day zaim transactions. Of those, overlap are
+    # already in monarch with their zaim id, pdf_fraction are in monarch
+    # without an id (as a PDF import leaves them) and get the zaim id
+    # attached, and pdf_fraction more arrive without an id, as from a PDF,
+    # and rename an id-less monarch row. The rest are new.
+    accounts: int = 2
+    years: int = 1
+    per_day: int = 5
+    overlap: float = 0.5
+    pdf_fraction: float = 0.1
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        # (account index, date, yen, merchant, zaim id) of incoming rows, and
+        # (account index, date, yen, merchant, notes) of monarch rows.
+        self.incoming: List[Tuple[int, dt.date, int, str, str]] = []
+        self.existing: List[Tuple[int, dt.date, int, str, str]] = []
+
+        rng = random.Random(self.seed)
+        start = dt.date(year=2020, month=1, day=1)
+        days = (dt.date(year=2020 + self.years, month=1, day=1) - start).days
+
+        for account in range(self.accounts):
+            for day in range(days):
+                date = start + dt.timedelta(days=day)
+                for i in range(self.per_day):
+                    # Amounts are unique within a day so rows only merge
+                    # where the dataset means them to.
+                    yen = 100 + i * 1000 + rng.randrange(1000)
+                    merchant = rng.choice(_MERCHANTS)
+                    zaim_id = str(((account * days + day) * self.per_day + i) + 1)
+                    r = rng.random()
+
+                    if r < self.overlap:
+                        notes = f"amount_jpy={yen},zaim_id={zaim_id}"
+                        self.existing.append((account, date, yen, merchant, notes))
+                    elif r < self.overlap + self.pdf_fraction:
+                        self.existing.append(
+                            (account, date, yen, "STATEMENT", f"amount_jpy={yen}")
+                        )
+                    elif r < self.overlap + 2 * self.pdf_fraction:
+                        self.existing.append(
+                            (account, date, yen, "STATEMENT", f"amount_jpy={yen}")
+                        )
+                        zaim_id = ""
+
+                    self.incoming.append((account, date, yen, merchant, zaim_id))
+
+    def account_name(self, account: int) -> str:
+        return f"Account {account}"
+
+    def account_id(self, account: int) -> str:
+        return str(10000 + account)
+
+    def zaim_accounts(self) -> List[Account]:
+        accounts = [
+            Account(self.account_name(i), "", Amount(jpy=1000000, usd=6500), {})
+            for i in range(self.accounts)
+        ]
+        for account, date, yen, merchant, zaim_id in self.incoming:
+            accounts[account].add_transaction(
+                Transaction(
+                    date=date,
+                    merchant=merchant,
+                    amount=Amount(jpy=yen, date=date),
+                    zaim_id=zaim_id,
+                )
+            )
+        return accounts
+
+    def monarch_money(self, latency: float = 0) -> InMemoryMonarchMoney:
+        mm = InMemoryMonarchMoney(latency)
+        for i in range(self.accounts):
+            mm.add_account(self.account_id(i), self.account_name(i), 6500)
+        for account, date, yen, merchant, notes in self.existing:
+            mm.add_transaction(
+                self.account_id(account), date, round(yen / 150, 2), merchant, notes
+            )
+        return mm
@@ -2,61 +2,85 @@ import argparse
 import asyncio
 import datetime as dt
 import os
-import schedule
+import signal
+import sys
 import time
 import traceback
 import zaim_to_monarch
 
-from dateutil.relativedelta import relativedelta
 from dotenv import load_dotenv
+from typing import Optional
 
 
-def sync_once(start_date: dt.date, end_date: dt.date) -> None:
+def sync_once(
+    start_date: dt.date,
+    end_date: dt.date,
+    options: zaim_to_monarch.SyncOptions,
+    crawler_manager: Optional[zaim_to_monarch.ZaimCrawlerManager] = None,
+) -> None:
     if end_date < start_date:
         print("Start date cannot be after end date.")
         return 1
 
-    asyncio.run(zaim_to_monarch.do_sync(start_date, end_date))
+    asyncio.run(
+        zaim_to_monarch.do_sync(start_date, end_date, options, crawler_manager)
+    )
 
 
-def import_pdfs(pdfs_dir: str) -> None:
-    asyncio.run(zaim_to_monarch.import_pdfs(pdfs_dir))
+def import_pdfs(pdfs_dir: str, options: zaim_to_monarch.SyncOptions) -> None:
+    asyncio.run(zaim_to_monarch.import_pdfs(pdfs_dir, options))
 
 
-last_sync_date = dt.datetime.min
+def apply_plan(plan_file: str, options: zaim_to_monarch.SyncOptions) -> None:
+    asyncio.run(zaim_to_monarch.apply_plan(plan_file, options))
 
 
-def periodic_sync_once(days_interval: int) -> None:
-    global last_sync_date
-    if last_sync_date == dt.datetime.min:
-        last_sync_date = dt.datetime.now() - relativedelta(days=days_interval)
+def periodic_sync_once(
+    days_interval: int,
+    options: zaim_to_monarch.SyncOptions,
+    state: zaim_to_monarch.SyncState,
+    crawler_manager: Optional[zaim_to_monarch.ZaimCrawlerManager] = None,
+) -> None:
+    sync_start, sync_end = state.sync_range(days_interval, dt.date.today())
+    run = state.start_run(sync_start, sync_end)
 
     try:
-        # Always sync one more week than is necessary in case any delayed transactions have appeared since the last sync.
-        sync_start = (last_sync_date - relativedelta(days=7)).date()
-        print(f"Syncing data from {sync_start} to {dt.date.today()}")
-        sync_once(sync_start, dt.date.today())
-        last_sync_date = dt.date.today()
-    except Exception:
+        print(f"Syncing data from {sync_start} to {sync_end}")
+        sync_once(sync_start, sync_end, options, crawler_manager)
+        state.finish_run(run)
+    except Exception as e:
         traceback.print_exc()
+        state.finish_run(run, error=repr(e))
         print(
             "Exception occurred when syncing. Sleeping until next sync attempt."
         )
 
 
-def periodic_sync(days_interval: int) -> None:
-    schedule.every(days_interval).days.do(
-        periodic_sync_once, days_interval=days_interval
-    )
+def periodic_sync(days_interval: int, options: zaim_to_monarch.SyncOptions) -> None:
+    # The watermark and last run survive restarts, so a restarted daemon
+    # only syncs immediately when a sync is due.
+    state = zaim_to_monarch.SyncState()
 
-    # Running initial sync.
-    schedule.run_all()
+    # Chrome stays logged in between syncs and is stopped on exit, including
+    # when the container is stopped.
+    crawler_manager = zaim_to_monarch.ZaimCrawlerManager(options.crawler_pool_size)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    try:
+        while True:
+            next_due = state.next_due(days_interval)
 
-    while True:
-        remaining_sleep_hours = schedule.idle_seconds() / 60 / 60
-        print(f"Time until next sync: {round(remaining_sleep_hours)} hours")
-        schedule.run_pending()
-        time.sleep(3600)
+            if dt.datetime.now() >= next_due:
+                periodic_sync_once(days_interval, options, state, crawler_manager)
+                continue
+
+            remaining_sleep_seconds = (next_due - dt.datetime.now()).total_seconds()
+            print(
+                f"Time until next sync: {round(remaining_sleep_seconds / 60 / 60)} hours"
+            )
+            time.sleep(min(3600, max(0, remaining_sleep_seconds)))
+    finally:
+        crawler_manager.close()
 
 
 def dir_path(path: str) -> str:
@@ -93,21 +117,120 @@ def main() -> int:
         help="Parse and upload transaction data from PDFs in the specified directory.",
     )
 
+    parser.add_argument(
+        "--plan_file",
+        help="Where --pdf saves the change plan shown for confirmation. Defaults to a file in the cache directory.",
+    )
+
+    parser.add_argument(
+        "--apply_plan",
+        help="Apply a change plan saved by --pdf without recomputing it.",
+    )
+
+    parser.add_argument(
+        "--pdf_workers",
+        type=int,
+        help="Number of PDFs extracted at once. Defaults to PDF_WORKERS or the number of CPUs.",
+    )
+
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        help="Number of concurrent Monarch requests used when pushing transactions. Defaults to MONARCH_PUSH_CONCURRENCY or 1.",
+    )
+
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        help="Number of transactions created or updated per Monarch request. Defaults to MONARCH_BATCH_SIZE or 1.",
+    )
+
+    parser.add_argument(
+        "--rate_limit",
+        type=float,
+        help="Most Monarch requests per second. Lowered while Monarch throttles. Defaults to MONARCH_RATE_LIMIT or 20.",
+    )
+
+    parser.add_argument(
+        "--crawlers",
+        type=int,
+        help="Number of zaim sessions that crawl months concurrently. Defaults to ZAIM_CRAWLER_POOL_SIZE or 1.",
+    )
+
+    parser.add_argument(
+        "--refresh_cache",
+        action="store_true",
+        help="Crawl every zaim month again instead of reading settled months from the month cache.",
+    )
+
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Import and push each zaim month while the next months are crawled, or each month of a PDF statement once it is parsed.",
+    )
+
+    parser.add_argument(
+        "--report_dir",
+        help="Directory of the JSON report written after every run. Defaults to SYNC_REPORT_DIR or the cache directory.",
+    )
+
+    parser.add_argument(
+        "--prometheus_file",
+        help="Write the metrics of every run to this file in the Prometheus text format. Defaults to SYNC_PROMETHEUS_FILE.",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="CPU and memory profile the crawl, pull, merge and push phases. With every_n_days, runs a single sync.",
+    )
+
+    parser.add_argument(
+        "--full_sync",
+        action="store_true",
+        help="Ignore the sync ledger and compare every transaction against monarch.",
+    )
+
     args = parser.parse_args()
 
-    if not (bool(args.every_n_days) ^ bool(args.date_range) ^ bool(args.pdf)):
-        print("Choose either date_range, every_n_days, or pdf.")
+    modes = [args.every_n_days, args.date_range, args.pdf, args.apply_plan]
+    if sum(1 for mode in modes if mode) != 1:
+        print("Choose either date_range, every_n_days, pdf, or apply_plan.")
         return -1
 
     load_dotenv()
 
+    options = zaim_to_monarch.SyncOptions(
+        push_concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        rate_limit=args.rate_limit,
+        full_sync=args.full_sync,
+        crawler_pool_size=args.crawlers,
+        refresh_zaim_cache=args.refresh_cache,
+        streaming=args.stream,
+        pdf_workers=args.pdf_workers,
+        report_dir=args.report_dir,
+        prometheus_file=args.prometheus_file,
+        profile=args.profile,
+        plan_file=args.plan_file,
+    )
+
     if args.pdf:
-        return import_pdfs(args.pdf)
+        return import_pdfs(args.pdf, options)
+
+    if args.apply_plan:
+        return apply_plan(args.apply_plan, options)
 
     if args.date_range:
-        return sync_once(args.date_range[0], args.date_range[1])
+        return sync_once(args.date_range[0], args.date_range[1], options)
+
+    if args.profile:
+        return periodic_sync_once(
+            args.every_n_days, options, zaim_to_monarch.SyncState()
+        )
 
-    return periodic_sync(args.every_n_days)
+    return periodic_sync(args.every_n_days, options)
 
 
 if __name__ == "__main__":
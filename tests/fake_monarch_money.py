@@ -1,15 +1,29 @@
+import asyncio
 import json
 import os
 
+from gql.transport.exceptions import TransportServerError
 from typing import Any, Dict, List, Optional
 
 
+class FatalError(BaseException):
+    # Not caught by the push, like KeyboardInterrupt.
+    pass
+
+
 class FakeMonarchMoney:
     def __init__(self):
         self.get_accounts_count: int = 0
+        self.get_transactions_count: int = 0
         self.balances: Dict[str, float] = {}
         self.category_exists: bool = True
         self.create_transaction_count: int = 0
+        # create_transaction raises on the calls of these numbers.
+        self.failing_creates: List[int] = []
+        self.create_transaction_category_count: int = 0
+        self.request_delay: float = 0
+        self.in_flight: int = 0
+        self.max_in_flight: int = 0
         self.new_transaction_category_group_id: str = ""
         self.new_transaction_category_name: str = ""
         self.new_transaction_date: str = ""
@@ -19,12 +33,19 @@ class FakeMonarchMoney:
         self.new_transaction_category_id: str = ""
         self.new_transaction_notes: str = ""
         self.update_transaction_count: int = 0
+        self.gql_call_count: int = 0
+        # gql_call fails the whole request on the calls of these numbers.
+        self.failing_gql_calls: List[int] = []
+        # gql_call raises FatalError on the calls of these numbers.
+        self.fatal_gql_calls: List[int] = []
         self.update_transaction_id: str = ""
         self.update_transaction_merchant: str = ""
         self.update_transaction_notes: str = ""
         return
 
-    async def login(self, username: str, password: str) -> None:
+    async def login(
+        self, username: str, password: str, mfa_secret_key: Optional[str] = None
+    ) -> None:
         return
 
     async def get_accounts(self) -> Dict:
@@ -44,14 +65,25 @@ class FakeMonarchMoney:
     async def get_transactions(
         self,
         limit: int = 0,
+        offset: int = 0,
         start_date: str = "",
         end_date: str = "",
         account_ids: List[str] = [],
     ) -> Dict:
+        self.get_transactions_count += 1
         self.get_transactions_start_date = start_date
         self.get_transactions_end_date = end_date
         self.get_transactions_account_ids = account_ids
-        return self._load_json_response("get_transactions.json")
+
+        response = self._load_json_response("get_transactions.json")
+        results = [
+            result
+            for result in response["allTransactions"]["results"]
+            if start_date <= result["date"] <= end_date
+            and result["account"]["id"] in account_ids
+        ]
+        response["allTransactions"]["results"] = results[offset : offset + limit]
+        return response
 
     async def update_account(
         self, account_id: str = "", account_balance: float = 0
@@ -74,6 +106,7 @@ class FakeMonarchMoney:
         group_id: str,
         transaction_category_name: str,
     ):
+        self.create_transaction_category_count += 1
         self.new_transaction_category_group_id = group_id
         self.new_transaction_category_name = transaction_category_name
         return self._load_json_response("create_transaction_category.json")
@@ -88,6 +121,9 @@ class FakeMonarchMoney:
         notes: str = "",
     ) -> Dict[str, Any]:
         self.create_transaction_count += 1
+        await self._simulate_request()
+        if self.create_transaction_count in self.failing_creates:
+            raise RuntimeError("Failed to create transaction")
         self.new_transaction_date = date
         self.new_transaction_account_id = account_id
         self.new_transaction_amount = amount
@@ -103,11 +139,36 @@ class FakeMonarchMoney:
         notes: Optional[str] = None,
     ) -> Dict[str, Any]:
         self.update_transaction_count += 1
+        await self._simulate_request()
         self.update_transaction_id = transaction_id
         self.update_transaction_merchant = merchant_name
         self.update_transaction_notes = notes
         return
 
+    async def gql_call(
+        self,
+        operation: str,
+        graphql_query: Any,
+        variables: Dict[str, Any] = {},
+    ) -> Dict[str, Any]:
+        # Answers batches of MonarchBatch. Every mutation succeeds.
+        self.gql_call_count += 1
+        if self.gql_call_count in self.failing_gql_calls:
+            raise TransportServerError("Service unavailable", 503)
+        if self.gql_call_count in self.fatal_gql_calls:
+            raise FatalError()
+        await self._simulate_request()
+        return {
+            alias: {"transaction": {"id": f"batch_{alias}"}, "errors": None}
+            for alias in variables
+        }
+
+    async def _simulate_request(self) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.request_delay)
+        self.in_flight -= 1
+
     def _load_json_response(self, filename: str) -> Dict:
         tests_dir = os.path.split(os.path.realpath(__file__))[0]
         json_dir = os.path.join(tests_dir, "monarch_responses")
@@ -0,0 +1,52 @@
+import random
+import time
+
+from typing import Any, Dict, List, Optional
+
+
+class FakeCrawler:
+    instances: List["FakeCrawler"] = []
+    fail_with_cookies: bool = False
+    # Months whose results list does not load.
+    incomplete_months: List = []
+
+    def __init__(
+        self, user_id, password, cookies: Optional[List[Dict[str, Any]]] = None
+    ):
+        if cookies is not None and FakeCrawler.fail_with_cookies:
+            raise RuntimeError("chrome did not start")
+
+        self.logged_in: bool = cookies is None
+        self.cookie_jar: List[Dict[str, Any]] = cookies or [{"name": "session"}]
+        self.months: List = []
+        self.month_timings: List = []
+        self.closed: bool = False
+        self.logged_out: bool = False
+        self.page_loads: int = 0
+        self.rss: Optional[int] = 100 * 1024 * 1024
+        self.last_month_complete: bool = True
+        FakeCrawler.instances.append(self)
+
+    def cookies(self) -> List[Dict[str, Any]]:
+        return self.cookie_jar
+
+    def get_account_balances(self) -> Dict[str, int]:
+        return {"Wallet": 1000}
+
+    def get_data(self, year, month):
+        time.sleep(random.random() / 100)
+        self.months.append((year, month))
+        self.page_loads += 1
+        self.last_month_complete = (year, month) not in FakeCrawler.incomplete_months
+        if not self.last_month_complete:
+            return reversed([])
+        return reversed([{"id": f"{year}{month}-{i}"} for i in range(2)])
+
+    def is_logged_in(self) -> bool:
+        return not self.closed and not self.logged_out
+
+    def rss_bytes(self) -> Optional[int]:
+        return self.rss
+
+    def close(self) -> None:
+        self.closed = True
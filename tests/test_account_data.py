@@ -1,8 +1,10 @@
 from currency_converter import CurrencyConverter
 import datetime as dt
+import random
 from dateutil.relativedelta import relativedelta
+from typing import List
 
-from zaim_to_monarch import Account, Amount, Day, Transaction
+from zaim_to_monarch import Account, Amount, Day, Transaction, account_data
 
 
 def test_amount_usd() -> None:
@@ -175,3 +177,205 @@ def test_add_zaim_id_to_missing_zaim_id_updates() -> None:
     assert day.transactions[0].merchant == transaction.merchant
     assert day.transactions[0].zaim_id == new_transaction.zaim_id
     assert day.transactions[0].needs_push_to_monarch
+
+
+def _reference_add_transaction(
+    transactions: List[Transaction], new_transaction: Transaction
+) -> None:
+    # The original linear scan that Day.add_transaction must stay equivalent to.
+    if not new_transaction.monarch_id:
+        new_transaction.needs_push_to_monarch = True
+
+    for transaction in transactions:
+        if new_transaction.zaim_id and transaction.zaim_id == new_transaction.zaim_id:
+            return
+        if (
+            new_transaction.monarch_id
+            and transaction.monarch_id == new_transaction.monarch_id
+        ):
+            return
+        if not new_transaction.zaim_id and not new_transaction.monarch_id:
+            if new_transaction.amount.jpy == transaction.amount.jpy:
+                transaction.merchant = new_transaction.merchant
+                transaction.amount = new_transaction.amount
+                transaction.needs_push_to_monarch = True
+                return
+        if (
+            not transaction.zaim_id
+            and new_transaction.zaim_id
+            and new_transaction.amount.jpy == transaction.amount.jpy
+        ):
+            transaction.zaim_id = new_transaction.zaim_id
+            transaction.needs_push_to_monarch = True
+            return
+
+    transactions.append(new_transaction)
+
+
+def _copy(transaction: Transaction) -> Transaction:
+    return Transaction(
+        date=transaction.date,
+        merchant=transaction.merchant,
+        amount=transaction.amount,
+        zaim_id=transaction.zaim_id,
+        monarch_id=transaction.monarch_id,
+    )
+
+
+def test_day_add_transaction_matches_linear_scan() -> None:
+    rng = random.Random(1234)
+    date = dt.datetime(year=2020, month=1, day=4).date()
+
+    def random_transaction(i: int) -> Transaction:
+        return Transaction(
+            date=date,
+            merchant=f"merchant {i}",
+            amount=Amount(usd=1, jpy=rng.choice([100, 150, 200, 250, 300])),
+            zaim_id=rng.choice(["", "", "z1", "z2", "z3", "z4"]),
+            monarch_id=rng.choice(["", "", "m1", "m2", "m3"]),
+        )
+
+    for _ in range(200):
+        day: Day = Day(day=4, transactions=[])
+        expected: List[Transaction] = []
+
+        for i in range(rng.randint(1, 30)):
+            transaction = random_transaction(i)
+            day.add_transaction(_copy(transaction))
+            _reference_add_transaction(expected, _copy(transaction))
+
+        assert [
+            (t.merchant, t.amount.jpy, t.zaim_id, t.monarch_id, t.needs_push_to_monarch)
+            for t in day.transactions
+        ] == [
+            (t.merchant, t.amount.jpy, t.zaim_id, t.monarch_id, t.needs_push_to_monarch)
+            for t in expected
+        ]
+
+
+def test_day_reindexes_reassigned_ids() -> None:
+    day: Day = Day(day=4, transactions=[])
+
+    transaction: Transaction = Transaction(
+        date=dt.datetime(year=2020, month=1, day=4).date(),
+        merchant="nowhere",
+        amount=Amount(usd=1, jpy=150),
+        zaim_id="zaim id",
+    )
+    day.add_transaction(transaction)
+
+    # Monarch.push assigns the monarch id after the transaction is created.
+    transaction.monarch_id = "monarch id"
+
+    day.add_transaction(
+        Transaction(
+            date=dt.datetime(year=2020, month=1, day=4).date(),
+            merchant="different merchant",
+            amount=Amount(usd=2, jpy=250),
+            monarch_id="monarch id",
+        )
+    )
+
+    assert len(day.transactions) == 1
+
+
+def test_amount_defers_conversion(monkeypatch) -> None:
+    conversions: List[str] = []
+    store = account_data.default_store()
+
+    class CountingStore:
+        def convert(self, *args):
+            conversions.append("convert")
+            return store.convert(*args)
+
+        def convert_many(self, *args):
+            conversions.append("convert_many")
+            return store.convert_many(*args)
+
+    monkeypatch.setattr(account_data, "default_store", lambda: CountingStore())
+
+    amount: Amount = Amount(jpy=150, date=dt.date(year=2020, month=1, day=4))
+    assert amount.jpy == 150
+    assert conversions == []
+
+    assert amount.usd > 0
+    assert amount.usd > 0
+    assert conversions == ["convert"]
+
+
+def test_amount_resolve_many_matches_single_conversions() -> None:
+    dates = [dt.date(year=2020, month=1, day=day) for day in (1, 2, 2, 5, 1)]
+
+    amounts: List[Amount] = [
+        Amount(jpy=100 * (i + 1), date=date) for i, date in enumerate(dates)
+    ] + [Amount(usd=i + 1, date=date) for i, date in enumerate(dates)]
+    Amount.resolve_many(amounts)
+
+    for i, date in enumerate(dates):
+        assert amounts[i].usd == Amount(jpy=100 * (i + 1), date=date).usd
+        assert amounts[len(dates) + i].jpy == Amount(usd=i + 1, date=date).jpy
+
+
+def test_account_transactions_are_table_rows() -> None:
+    account: Account = Account(name="account", id="id", balance=None, years={})
+
+    for day in range(1, 11):
+        account.add_transaction(
+            Transaction(
+                date=dt.date(year=2020, month=1, day=day),
+                merchant="nowhere",
+                amount=Amount(jpy=150 * day, date=dt.date(year=2020, month=1, day=day)),
+                zaim_id=str(day),
+            )
+        )
+
+    assert len(account.table) == 10
+
+    transaction = account.years[2020].months[1].days[3].transactions[0]
+    assert transaction.zaim_id == "3"
+    assert transaction.amount.jpy == 450
+    assert transaction.needs_push_to_monarch
+
+    transaction.needs_push_to_monarch = False
+    transaction.monarch_id = "monarch id"
+
+    transaction = account.years[2020].months[1].days[3].transactions[0]
+    assert not transaction.needs_push_to_monarch
+    assert transaction.monarch_id == "monarch id"
+    assert account.years[2020].months[1].days[4].transactions[0].needs_push_to_monarch
+
+
+def test_transaction_added_to_second_account_is_copied() -> None:
+    first: Account = Account(name="first", id="", balance=None, years={})
+    second: Account = Account(name="second", id="", balance=None, years={})
+
+    transaction: Transaction = Transaction(
+        date=dt.date(year=2020, month=1, day=4),
+        merchant="nowhere",
+        amount=Amount(usd=1, jpy=150),
+        zaim_id="zaim id",
+    )
+
+    first.add_transaction(transaction)
+    second.add_transaction(transaction)
+
+    second.years[2020].months[1].days[4].transactions[0].monarch_id = "monarch id"
+
+    assert transaction.monarch_id == ""
+    assert first.years[2020].months[1].days[4].transactions[0] == transaction
+
+
+def test_resolve_amounts_converts_table_rows() -> None:
+    account: Account = Account(name="account", id="", balance=None, years={})
+    date = dt.date(year=2020, month=1, day=4)
+
+    account.add_transaction(
+        Transaction(date=date, merchant="nowhere", amount=Amount(jpy=15000, date=date))
+    )
+    transaction = account.years[2020].months[1].days[4].transactions[0]
+    assert account.table.usd_cents(0) is None
+
+    Transaction.resolve_amounts([transaction])
+
+    assert account.table.usd_cents(0) == round(Amount(jpy=15000, date=date).usd * 100)
+    assert transaction.amount.usd == account.table.usd_cents(0) / 100
@@ -0,0 +1,163 @@
+import datetime as dt
+import pytest
+
+from zaim_to_monarch import Account, Amount, ChangePlan, Monarch, Transaction
+
+from .fake_monarch_money import FakeMonarchMoney
+
+pytest_plugins = "pytest_asyncio"
+
+
+async def _plan(transaction: Transaction) -> ChangePlan:
+    monarch: Monarch = Monarch(mm=FakeMonarchMoney())
+    await monarch.login()
+
+    account: Account = Account(
+        name="New Account",
+        id="",
+        balance=Amount(usd=100),
+        years={},
+    )
+    account.add_transaction(transaction)
+    await monarch.import_account(account)
+
+    return await monarch.plan()
+
+
+def _transaction() -> Transaction:
+    return Transaction(
+        date=dt.date(year=2020, month=9, day=10),
+        merchant="Amazon",
+        amount=Amount(usd=6, jpy=123),
+        zaim_id="1234",
+    )
+
+
+@pytest.mark.asyncio
+async def test_plan_lists_changes_without_making_them() -> None:
+    plan = await _plan(_transaction())
+
+    assert [change.name for change in plan.accounts_to_create] == ["New Account"]
+    assert plan.accounts_to_create[0].balance_usd == 100
+    assert not plan.balance_updates
+    assert len(plan.transactions_to_create) == 1
+    change = plan.transactions_to_create[0]
+    assert change.date == "2020-09-10"
+    assert change.amount_usd == 6
+    assert change.notes == "amount_jpy=123,zaim_id=1234"
+    assert not plan.transactions_to_update
+    assert plan.category_id == "2222"
+
+
+@pytest.mark.asyncio
+async def test_apply_updates_planned_transactions() -> None:
+    transaction = _transaction()
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+
+    account: Account = Account(name="New Account", id="", balance=None, years={})
+    account.add_transaction(transaction)
+    await monarch.import_account(account)
+
+    plan = await monarch.plan()
+    await monarch.apply(plan)
+
+    assert fake_monarch_money.create_transaction_count == 1
+    assert fake_monarch_money.new_transaction_account_id == "new_account_id"
+    # The imported transaction now carries the id of the created one.
+    pushed = monarch.accounts()["New Account"].years[2020].months[9].days[10]
+    assert pushed.transactions[0].monarch_id
+    assert not pushed.transactions[0].needs_push_to_monarch
+    assert (await monarch.plan()).is_empty()
+
+
+@pytest.mark.asyncio
+async def test_saved_plan_is_applied_by_another_monarch(tmp_path) -> None:
+    plan = await _plan(_transaction())
+    path = str(tmp_path / "plan.json")
+    plan.save(path)
+
+    loaded = ChangePlan.load(path)
+    assert loaded == plan
+
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+    await monarch.apply(loaded)
+
+    assert fake_monarch_money.create_transaction_count == 1
+    assert fake_monarch_money.new_transaction_account_id == "new_account_id"
+    assert fake_monarch_money.new_transaction_category_id == "2222"
+    assert fake_monarch_money.new_transaction_notes == "amount_jpy=123,zaim_id=1234"
+    assert monarch.accounts()["New Account"].id == "new_account_id"
+
+
+@pytest.mark.asyncio
+async def test_apply_rejects_plans_for_unknown_accounts(tmp_path) -> None:
+    plan = await _plan(_transaction())
+    plan.accounts_to_create = []
+
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+
+    with pytest.raises(ValueError):
+        await monarch.apply(plan)
+    assert fake_monarch_money.create_transaction_count == 0
+
+
+@pytest.mark.asyncio
+async def test_applied_plan_is_refused(tmp_path) -> None:
+    plan = await _plan(_transaction())
+    path = str(tmp_path / "plan.json")
+
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+    await monarch.apply(plan)
+    plan.save(path)
+
+    loaded = ChangePlan.load(path)
+    assert loaded.applied_at
+    with pytest.raises(ValueError, match="already applied"):
+        await monarch.apply(loaded)
+    assert fake_monarch_money.create_transaction_count == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_apply_keeps_ids_of_created_transactions(tmp_path) -> None:
+    transaction = _transaction()
+    monarch: Monarch = Monarch(mm=FakeMonarchMoney())
+    await monarch.login()
+    account: Account = Account(name="New Account", id="", balance=None, years={})
+    account.add_transaction(transaction)
+    account.add_transaction(
+        Transaction(
+            date=dt.date(year=2020, month=9, day=11),
+            merchant="Costco",
+            amount=Amount(usd=7, jpy=456),
+            zaim_id="5678",
+        )
+    )
+    await monarch.import_account(account)
+    plan = await monarch.plan()
+
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    fake_monarch_money.failing_creates = [2]
+    monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+    with pytest.raises(RuntimeError):
+        await monarch.apply(plan)
+
+    assert not plan.applied_at
+    created, failed = plan.transactions_to_create
+    assert created.monarch_id
+    assert not failed.monarch_id
+
+    # Applying the plan again only creates the transaction that failed.
+    fake_monarch_money.failing_creates = []
+    await monarch.apply(plan)
+    assert fake_monarch_money.create_transaction_count == 3
+    assert fake_monarch_money.update_transaction_count == 1
+    assert plan.applied_at
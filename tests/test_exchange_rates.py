@@ -0,0 +1,145 @@
+import datetime as dt
+import io
+import os
+import pathlib
+import time
+import zipfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from zaim_to_monarch import exchange_rates
+from zaim_to_monarch.exchange_rates import ExchangeRates, ExchangeRateStore
+
+
+def _ecb_zip(rows) -> bytes:
+    lines = ["Date,USD,JPY,"]
+    for date, usd, jpy in rows:
+        lines.append(f"{date},{usd},{jpy},")
+
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w") as z:
+        z.writestr("eurofxref-hist.csv", "\n".join(lines))
+    return content.getvalue()
+
+
+_ROWS = [
+    ("2020-01-06", "1.0", "100"),
+    ("2020-01-03", "1.0", "N/A"),
+    ("2020-01-02", "2.0", "120"),
+]
+
+
+def test_rates_interpolate_missing_days() -> None:
+    rates = ExchangeRates.from_zip(_ecb_zip(_ROWS))
+
+    assert rates.convert(100, "JPY", "EUR", dt.date(2020, 1, 2)) == 100 / 120
+    # JPY is missing from 01-03 to 01-05, 1 and 3 days away from 120 and 100.
+    assert rates.convert(115, "JPY", "EUR", dt.date(2020, 1, 3)) == 1
+    assert rates.convert(1, "USD", "JPY", dt.date(2020, 1, 6)) == 100
+
+
+def test_rates_out_of_range_use_closest_date() -> None:
+    rates = ExchangeRates.from_zip(_ecb_zip(_ROWS))
+
+    assert rates.convert(1, "USD", "JPY", dt.date(2019, 1, 1)) == 60
+    assert rates.convert(1, "USD", "JPY", dt.date(2021, 1, 1)) == 100
+    assert rates.convert(1, "USD", "JPY") == 100
+
+
+def test_store_is_lazy(tmp_path: pathlib.Path) -> None:
+    cache_file = tmp_path / "rates.zip"
+    ExchangeRateStore(cache_file=str(cache_file), url="file:///does/not/exist")
+
+    assert not cache_file.exists()
+
+
+def test_store_uses_fresh_cache_without_download(tmp_path: pathlib.Path) -> None:
+    cache_file = tmp_path / "rates.zip"
+    cache_file.write_bytes(_ecb_zip(_ROWS))
+
+    store = ExchangeRateStore(
+        cache_file=str(cache_file),
+        max_age=dt.timedelta(days=1),
+        url="file:///does/not/exist",
+    )
+
+    assert store.convert(1, "USD", "JPY", dt.date(2020, 1, 6)) == 100
+    store.wait_for_refresh()
+    assert cache_file.read_bytes() == _ecb_zip(_ROWS)
+
+
+def test_store_refreshes_stale_cache_in_background(tmp_path: pathlib.Path) -> None:
+    cache_file = tmp_path / "rates.zip"
+    cache_file.write_bytes(_ecb_zip(_ROWS))
+    stale = time.time() - 2 * 24 * 60 * 60
+    os.utime(cache_file, (stale, stale))
+
+    newer_file = tmp_path / "newer.zip"
+    newer_file.write_bytes(_ecb_zip([("2020-01-06", "1.0", "200")]))
+
+    store = ExchangeRateStore(
+        cache_file=str(cache_file),
+        max_age=dt.timedelta(days=1),
+        url=newer_file.as_uri(),
+    )
+
+    # The stale rates are served while the refresh runs.
+    assert store.convert(1, "USD", "JPY", dt.date(2020, 1, 6)) in (100, 200)
+    store.wait_for_refresh()
+
+    assert store.convert(1, "USD", "JPY", dt.date(2020, 1, 6)) == 200
+    assert cache_file.read_bytes() == newer_file.read_bytes()
+
+
+def test_store_refreshes_rates_that_go_stale_after_loading(
+    tmp_path: pathlib.Path,
+) -> None:
+    max_age = dt.timedelta(days=1)
+    cache_file = tmp_path / "rates.zip"
+    cache_file.write_bytes(_ecb_zip(_ROWS))
+    # Stale in a moment.
+    almost_stale = time.time() - max_age.total_seconds() + 0.2
+    os.utime(cache_file, (almost_stale, almost_stale))
+
+    newer_file = tmp_path / "newer.zip"
+    newer_file.write_bytes(_ecb_zip([("2020-01-06", "1.0", "200")]))
+
+    store = ExchangeRateStore(
+        cache_file=str(cache_file), max_age=max_age, url=newer_file.as_uri()
+    )
+    assert store.convert(1, "USD", "JPY", dt.date(2020, 1, 6)) == 100
+    store.wait_for_refresh()
+    assert store.convert(1, "USD", "JPY", dt.date(2020, 1, 6)) == 100
+
+    time.sleep(0.3)
+    store.convert(1, "USD", "JPY", dt.date(2020, 1, 6))
+    store.wait_for_refresh()
+
+    assert store.convert(1, "USD", "JPY", dt.date(2020, 1, 6)) == 200
+    assert cache_file.read_bytes() == newer_file.read_bytes()
+
+
+def test_store_falls_back_to_bundled_rates(tmp_path: pathlib.Path) -> None:
+    store = ExchangeRateStore(
+        cache_file=str(tmp_path / "rates.zip"), url="file:///does/not/exist"
+    )
+
+    assert store.convert(1, "USD", "JPY", dt.date(2020, 1, 6)) > 0
+
+
+def test_default_store_is_created_once(monkeypatch) -> None:
+    created = []
+
+    class SlowStore:
+        def __init__(self) -> None:
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(exchange_rates, "_default_store", None)
+    monkeypatch.setattr(exchange_rates, "ExchangeRateStore", SlowStore)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        stores = list(executor.map(lambda _: exchange_rates.default_store(), range(4)))
+
+    assert len(created) == 1
+    assert all(store is created[0] for store in stores)
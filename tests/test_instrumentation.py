@@ -0,0 +1,82 @@
+import datetime as dt
+import json
+import pytest
+
+from zaim_to_monarch import Account, Amount, Instrumentation, Monarch, Transaction
+
+from .fake_monarch_money import FakeMonarchMoney
+
+pytest_plugins = "pytest_asyncio"
+
+
+def test_report_and_prometheus(tmp_path) -> None:
+    instrumentation = Instrumentation("sync")
+    with instrumentation.phase("monarch push"):
+        instrumentation.count("monarch_creates", 2)
+        instrumentation.observe("monarch_create_seconds", 0.02)
+        instrumentation.observe("monarch_create_seconds", 0.2)
+
+    prometheus_file = tmp_path / "sync.prom"
+    path = instrumentation.write(str(tmp_path / "reports"), str(prometheus_file))
+
+    with open(path) as f:
+        report = json.load(f)
+    assert report["run"] == "sync"
+    assert report["error"] is None
+    assert [phase["name"] for phase in report["phases"]] == ["monarch push"]
+    assert report["counters"] == {"monarch_creates": 2}
+    assert report["histograms"]["monarch_create_seconds"]["count"] == 2
+    assert report["histograms"]["monarch_create_seconds"]["max"] == 0.2
+
+    prometheus = prometheus_file.read_text()
+    assert "zaim_to_monarch_sync_success 1" in prometheus
+    assert "zaim_to_monarch_sync_monarch_creates 2" in prometheus
+    assert 'zaim_to_monarch_sync_phase_seconds{phase="monarch push"}' in prometheus
+    assert 'zaim_to_monarch_sync_monarch_create_seconds_bucket{le="0.025"} 1' in prometheus
+    assert 'zaim_to_monarch_sync_monarch_create_seconds_bucket{le="+Inf"} 2' in prometheus
+    assert "zaim_to_monarch_sync_monarch_create_seconds_count 2" in prometheus
+
+
+@pytest.mark.asyncio
+async def test_monarch_counts_pulls_merges_and_pushes() -> None:
+    instrumentation = Instrumentation()
+    monarch: Monarch = Monarch(
+        mm=FakeMonarchMoney(), instrumentation=instrumentation
+    )
+    await monarch.login()
+
+    account: Account = Account(
+        name="JP Checking",
+        id="1234",
+        balance=None,
+        years={},
+    )
+    # Matches the pulled transaction with this zaim id.
+    account.add_transaction(
+        Transaction(
+            date=dt.date(year=2020, month=9, day=16),
+            merchant="Store",
+            amount=Amount(usd=20, jpy=2000),
+            zaim_id="5467",
+        )
+    )
+    account.add_transaction(
+        Transaction(
+            date=dt.date(year=2020, month=9, day=10),
+            merchant="Amazon",
+            amount=Amount(usd=6, jpy=123),
+            zaim_id="1234",
+        )
+    )
+
+    await monarch.import_account(account)
+    await monarch.push(dry_run=False)
+
+    counters = instrumentation.counters
+    assert counters["monarch_pulls"] == 1
+    assert counters["imported_transactions"] == 2
+    assert counters["imported_new_transactions"] == 1
+    assert counters["imported_matched_transactions"] == 1
+    assert counters["monarch_creates"] == 1
+    assert instrumentation.histograms["monarch_create_seconds"].summary()["count"] == 1
+    assert instrumentation.histograms["merge_seconds"].summary()["count"] == 1
@@ -0,0 +1,145 @@
+import datetime as dt
+import pathlib
+import pytest
+
+from zaim_to_monarch import Account, Amount, Monarch, Transaction
+from zaim_to_monarch.ledger import SyncLedger
+
+from .fake_monarch_money import FakeMonarchMoney
+
+pytest_plugins = "pytest_asyncio"
+
+
+def _zaim_account(name: str, merchant: str = "Amazon") -> Account:
+    account: Account = Account(name=name, id="", balance=None, years={})
+    date = dt.date(year=2020, month=9, day=10)
+    account.add_transaction(
+        Transaction(
+            date=date,
+            merchant=merchant,
+            amount=Amount(jpy=123, usd=6),
+            zaim_id="1234",
+        )
+    )
+    return account
+
+
+def test_ledger_detects_changed_content(tmp_path: pathlib.Path) -> None:
+    ledger = SyncLedger(str(tmp_path / "ledger.sqlite3"))
+    date = dt.date(year=2020, month=9, day=10)
+    content_hash = SyncLedger.content_hash(date, "Amazon", 123)
+
+    ledger.record("JP Checking", "44444", [("1234", "m1", content_hash)])
+
+    assert ledger.is_unchanged("JP Checking", "1234", content_hash)
+    assert not ledger.is_unchanged(
+        "JP Checking", "1234", SyncLedger.content_hash(date, "Amazon", 124)
+    )
+    assert not ledger.is_unchanged("JP Savings", "1234", content_hash)
+
+
+def test_ledger_consistency_requires_same_account_ids(tmp_path: pathlib.Path) -> None:
+    ledger = SyncLedger(str(tmp_path / "ledger.sqlite3"))
+    ledger.record("JP Checking", "44444", [])
+
+    assert ledger.check_consistency({"JP Checking": "44444"})
+    assert not ledger.check_consistency({"JP Checking": "55555"})
+    assert not ledger.check_consistency({})
+
+
+def test_unreadable_ledger_is_replaced(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "ledger.sqlite3"
+    path.write_bytes(b"not a database" * 100)
+
+    ledger = SyncLedger(str(path))
+
+    assert len(ledger) == 0
+
+
+@pytest.mark.asyncio
+async def test_push_records_synced_transactions(tmp_path: pathlib.Path) -> None:
+    ledger = SyncLedger(str(tmp_path / "ledger.sqlite3"))
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money, ledger=ledger)
+    await monarch.login()
+
+    await monarch.import_account(_zaim_account("JP Checking"))
+    await monarch.push(dry_run=False)
+
+    assert fake_monarch_money.create_transaction_count == 1
+    assert len(ledger) == 1
+
+
+@pytest.mark.asyncio
+async def test_push_records_transactions_pushed_before_a_failure(
+    tmp_path: pathlib.Path,
+) -> None:
+    ledger = SyncLedger(str(tmp_path / "ledger.sqlite3"))
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    fake_monarch_money.failing_creates = [3]
+    monarch: Monarch = Monarch(mm=fake_monarch_money, ledger=ledger, batch_size=1)
+    await monarch.login()
+
+    account: Account = Account(name="JP Checking", id="", balance=None, years={})
+    for day in range(1, 6):
+        account.add_transaction(
+            Transaction(
+                date=dt.date(year=2020, month=9, day=day),
+                merchant="Amazon",
+                amount=Amount(jpy=123, usd=6),
+                zaim_id=str(day),
+            )
+        )
+    await monarch.import_account(account)
+
+    with pytest.raises(RuntimeError, match="1 of 5"):
+        await monarch.push(dry_run=False)
+
+    # The failed create did not stop the ones after it.
+    assert fake_monarch_money.create_transaction_count == 5
+    assert len(ledger) == 4
+
+
+@pytest.mark.asyncio
+async def test_import_skips_ledger_transactions(tmp_path: pathlib.Path) -> None:
+    ledger = SyncLedger(str(tmp_path / "ledger.sqlite3"))
+
+    monarch: Monarch = Monarch(mm=FakeMonarchMoney(), ledger=ledger)
+    await monarch.login()
+    await monarch.import_account(_zaim_account("JP Checking"))
+    await monarch.push(dry_run=False)
+
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch = Monarch(mm=fake_monarch_money, ledger=ledger)
+    await monarch.login()
+    await monarch.import_account(_zaim_account("JP Checking"))
+    await monarch.push(dry_run=False)
+
+    assert monarch.ledger_skipped == 1
+    assert fake_monarch_money.get_transactions_count == 0
+    assert fake_monarch_money.create_transaction_count == 0
+
+    # Changed content is compared against monarch again.
+    await monarch.import_account(_zaim_account("JP Checking", merchant="Costco"))
+    assert fake_monarch_money.get_transactions_count == 1
+
+
+@pytest.mark.asyncio
+async def test_inconsistent_ledger_falls_back_to_full_pull(
+    tmp_path: pathlib.Path,
+) -> None:
+    ledger = SyncLedger(str(tmp_path / "ledger.sqlite3"))
+    date = dt.date(year=2020, month=9, day=10)
+    ledger.record(
+        "JP Checking",
+        "old account id",
+        [("1234", "m1", SyncLedger.content_hash(date, "Amazon", 123))],
+    )
+
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money, ledger=ledger)
+    await monarch.login()
+    await monarch.import_account(_zaim_account("JP Checking"))
+
+    assert monarch.ledger_skipped == 0
+    assert fake_monarch_money.get_transactions_count == 1
@@ -1,9 +1,10 @@
+import asyncio
 import datetime as dt
 import pytest
 
 from zaim_to_monarch import Account, Amount, Monarch, Transaction
 
-from .fake_monarch_money import FakeMonarchMoney
+from .fake_monarch_money import FakeMonarchMoney, FatalError
 
 pytest_plugins = "pytest_asyncio"
 
@@ -45,7 +46,7 @@ async def test_login_retrieves_accounts() -> None:
 
 
 @pytest.mark.asyncio
-async def test_import_account_updates_balance() -> None:
+async def test_push_updates_imported_balance() -> None:
     fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
     monarch: Monarch = Monarch(mm=fake_monarch_money)
     await monarch.login()
@@ -56,6 +57,11 @@ async def test_import_account_updates_balance() -> None:
 
     await monarch.import_account(updated_account)
 
+    # The balance is part of the change plan, pushed with the transactions.
+    assert not fake_monarch_money.balances
+
+    await monarch.push(dry_run=False)
+
     assert "44444" in fake_monarch_money.balances
     assert fake_monarch_money.balances["44444"] == 600
 
@@ -371,3 +377,215 @@ async def test_push_existing_transaction_that_needs_merchant_update() -> None:
         fake_monarch_money.update_transaction_notes
         == "amount_jpy=2000,zaim_id=5467"
     )
+
+
+@pytest.mark.asyncio
+async def test_push_concurrency_is_bounded() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    fake_monarch_money.request_delay = 0.01
+    monarch: Monarch = Monarch(mm=fake_monarch_money, push_concurrency=3)
+    await monarch.login()
+
+    new_account: Account = Account(
+        name="New Account",
+        id="1234",
+        balance=Amount(usd=100),
+        years={},
+    )
+
+    for day in range(1, 11):
+        new_account.add_transaction(
+            Transaction(
+                date=dt.datetime(year=2020, month=9, day=day).date(),
+                merchant="Amazon",
+                amount=Amount(usd=6, jpy=123),
+                zaim_id=str(day),
+            )
+        )
+
+    await monarch.import_account(new_account)
+
+    fake_monarch_money.category_exists = False
+
+    await monarch.push(dry_run=False)
+
+    assert fake_monarch_money.create_transaction_count == 10
+    assert fake_monarch_money.max_in_flight == 3
+    assert fake_monarch_money.create_transaction_category_count == 1
+    assert fake_monarch_money.new_transaction_account_id == "new_account_id"
+
+    assert monarch.push_stats.created == 10
+    assert monarch.push_stats.updated == 0
+    assert len(monarch.push_stats.latencies) == 10
+
+
+@pytest.mark.asyncio
+async def test_push_concurrency_defaults_to_sequential() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+
+    new_account: Account = Account(
+        name="New Account",
+        id="1234",
+        balance=Amount(usd=100),
+        years={},
+    )
+
+    for day in range(1, 4):
+        new_account.add_transaction(
+            Transaction(
+                date=dt.datetime(year=2020, month=9, day=day).date(),
+                merchant="Amazon",
+                amount=Amount(usd=6, jpy=123),
+                zaim_id=str(day),
+            )
+        )
+
+    await monarch.import_account(new_account)
+    await monarch.push(dry_run=False)
+
+    assert fake_monarch_money.create_transaction_count == 3
+    assert fake_monarch_money.max_in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_push_error_stops_other_workers() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    fake_monarch_money.request_delay = 0.01
+    fake_monarch_money.fatal_gql_calls = [3]
+    monarch: Monarch = Monarch(
+        mm=fake_monarch_money, push_concurrency=3, batch_size=2
+    )
+    await monarch.login()
+
+    new_account: Account = Account(name="New Account", id="", balance=None, years={})
+    for day in range(1, 11):
+        new_account.add_transaction(
+            Transaction(
+                date=dt.datetime(year=2020, month=9, day=day).date(),
+                merchant="Amazon",
+                amount=Amount(usd=6, jpy=123),
+                zaim_id=str(day),
+            )
+        )
+    await monarch.import_account(new_account)
+
+    with pytest.raises(FatalError):
+        await monarch.push(dry_run=False)
+    await asyncio.sleep(0.05)
+
+    # The batches in flight when the third one failed were cancelled.
+    assert fake_monarch_money.gql_call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_request_does_not_stop_other_batches() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    fake_monarch_money.failing_gql_calls = [2]
+    monarch: Monarch = Monarch(mm=fake_monarch_money, batch_size=2)
+    await monarch.login()
+
+    new_account: Account = Account(name="New Account", id="", balance=None, years={})
+    for day in range(1, 7):
+        new_account.add_transaction(
+            Transaction(
+                date=dt.datetime(year=2020, month=9, day=day).date(),
+                merchant="Amazon",
+                amount=Amount(usd=6, jpy=123),
+                zaim_id=str(day),
+            )
+        )
+    await monarch.import_account(new_account)
+
+    with pytest.raises(RuntimeError, match="2 of 6"):
+        await monarch.push(dry_run=False)
+
+    assert fake_monarch_money.gql_call_count == 3
+    assert monarch.push_stats.created == 4
+
+
+def _account_with_months(name: str, months) -> Account:
+    account: Account = Account(name=name, id="", balance=None, years={})
+
+    for year, month in months:
+        account.add_transaction(
+            Transaction(
+                date=dt.datetime(year=year, month=month, day=1).date(),
+                merchant="Amazon",
+                amount=Amount(usd=6, jpy=123),
+                zaim_id=f"{name}-{year}-{month}",
+            )
+        )
+
+    return account
+
+
+@pytest.mark.asyncio
+async def test_import_accounts_pulls_consecutive_months_in_one_request() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+
+    await monarch.import_accounts(
+        [
+            _account_with_months("JP Checking", [(2020, 8), (2020, 9)]),
+            _account_with_months("JP Savings", [(2020, 10), (2021, 2)]),
+        ]
+    )
+
+    # Aug-Oct 2020 is one run, Feb 2021 is another.
+    assert fake_monarch_money.get_transactions_count == 2
+    assert fake_monarch_money.get_transactions_start_date == "2021-02-01"
+    assert fake_monarch_money.get_transactions_end_date == "2021-02-28"
+    assert fake_monarch_money.get_transactions_account_ids == ["55555"]
+
+    month = monarch.accounts()["JP Checking"].years[2020].months[9]
+    assert 19 in month.days
+    assert 16 in month.days
+
+
+@pytest.mark.asyncio
+async def test_import_accounts_skips_months_already_pulled() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+
+    await monarch.import_account(_account_with_months("JP Checking", [(2020, 9)]))
+    assert fake_monarch_money.get_transactions_count == 1
+
+    await monarch.import_account(_account_with_months("JP Checking", [(2020, 9)]))
+    assert fake_monarch_money.get_transactions_count == 1
+
+    day = monarch.accounts()["JP Checking"].years[2020].months[9].days[19]
+    assert len(day.transactions) == 1
+
+
+@pytest.mark.asyncio
+async def test_import_accounts_pages_through_results() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    monarch._TRANSACTION_LIMIT = 2
+    await monarch.login()
+
+    await monarch.import_account(_account_with_months("JP Checking", [(2020, 9)]))
+
+    assert fake_monarch_money.get_transactions_count == 3
+
+    month = monarch.accounts()["JP Checking"].years[2020].months[9]
+    assert sorted(month.days.keys()) == [1, 5, 11, 13, 16, 19]
+
+
+@pytest.mark.asyncio
+async def test_find_transaction_category_does_not_create_it() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+
+    fake_monarch_money.category_exists = False
+    await monarch.find_transaction_category()
+    assert fake_monarch_money.create_transaction_category_count == 0
+
+    fake_monarch_money.category_exists = True
+    await monarch.find_transaction_category()
+    assert monarch._transaction_category_id
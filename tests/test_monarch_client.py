@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from typing import Any, Dict, List
+
+from zaim_to_monarch import Instrumentation
+from zaim_to_monarch.monarch_client import RateLimitedMonarchMoney
+
+pytest_plugins = "pytest_asyncio"
+
+
+class FlakyMonarchMoney:
+    # Raises the given errors, in order, before answering.
+    def __init__(self, errors: List[Exception]):
+        self.errors: List[Exception] = errors
+        self.calls: int = 0
+
+    async def _answer(self) -> Dict[str, Any]:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"ok": True}
+
+    async def get_transactions(self, **kwargs) -> Dict[str, Any]:
+        return await self._answer()
+
+    async def create_transaction(self, **kwargs) -> Dict[str, Any]:
+        return await self._answer()
+
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    monkeypatch.setattr(RateLimitedMonarchMoney, "_BASE_DELAY", 0.001)
+
+
+@pytest.mark.asyncio
+async def test_idempotent_calls_are_retried() -> None:
+    mm = FlakyMonarchMoney(
+        [TransportServerError("busy", 503), asyncio.TimeoutError()]
+    )
+    instrumentation = Instrumentation()
+    client = RateLimitedMonarchMoney(mm, instrumentation=instrumentation)
+
+    assert await client.get_transactions(limit=1) == {"ok": True}
+    assert mm.calls == 3
+    assert client.retries == 2
+    assert instrumentation.counters["monarch_retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_creates_are_only_retried_when_throttled() -> None:
+    mm = FlakyMonarchMoney([TransportServerError("throttled", 429)])
+    client = RateLimitedMonarchMoney(mm, max_rate=10)
+
+    assert await client.create_transaction(amount=1) == {"ok": True}
+    assert client.throttled == 1
+    assert client.rate < 10
+
+    # The create may have gone through before the error, so it is not repeated.
+    mm.errors = [TransportServerError("busy", 502)]
+    with pytest.raises(TransportServerError):
+        await client.create_transaction(amount=1)
+    assert mm.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries() -> None:
+    mm = FlakyMonarchMoney([TransportServerError("busy", 500)] * 3)
+    client = RateLimitedMonarchMoney(mm, max_retries=2)
+
+    with pytest.raises(TransportServerError):
+        await client.get_transactions(limit=1)
+    assert mm.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_query_errors_are_not_retried() -> None:
+    mm = FlakyMonarchMoney([TransportQueryError("bad input")])
+    client = RateLimitedMonarchMoney(mm)
+
+    with pytest.raises(TransportQueryError):
+        await client.get_transactions(limit=1)
+    assert mm.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_and_recovers() -> None:
+    mm = FlakyMonarchMoney([])
+    client = RateLimitedMonarchMoney(mm, max_rate=100)
+
+    # A second worth of requests is let through at once, the rest are spaced.
+    for _ in range(120):
+        await client.get_transactions(limit=1)
+    assert client.wait_seconds > 0.1
+
+    client.rate = 50
+    await client.get_transactions(limit=1)
+    assert client.rate > 50
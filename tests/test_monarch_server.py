@@ -0,0 +1,196 @@
+import datetime as dt
+import pytest
+
+from gql.transport.exceptions import TransportServerError
+
+from benchmarks.monarch_server import MonarchServer
+from benchmarks.synthetic import InMemoryMonarchMoney
+from zaim_to_monarch import (
+    Account,
+    Amount,
+    ChangePlan,
+    Monarch,
+    Transaction,
+    TransactionChange,
+)
+from zaim_to_monarch.monarch_batch import OPERATION
+from zaim_to_monarch.monarch_client import RateLimitedMonarchMoney
+from zaim_to_monarch.monarchmoney import MonarchMoney, MonarchMoneyEndpoints
+
+pytest_plugins = "pytest_asyncio"
+
+
+@pytest.fixture
+def restore_base_url():
+    base_url = MonarchMoneyEndpoints.BASE_URL
+    yield
+    MonarchMoneyEndpoints.BASE_URL = base_url
+
+
+async def _login(server: MonarchServer, monkeypatch, tmp_path) -> Monarch:
+    base_url = await server.start()
+    monkeypatch.setenv("MONARCH_BASE_URL", base_url)
+    monkeypatch.setenv("MONARCH_USERNAME", "user")
+    monkeypatch.setenv("MONARCH_PASSWORD", "password")
+    monkeypatch.delenv("MONARCH_MFA_KEY", raising=False)
+
+    session_file = str(tmp_path / "session.pickle")
+    monarch = Monarch(mm=MonarchMoney(session_file=session_file))
+    await monarch.login()
+    return monarch
+
+
+@pytest.mark.asyncio
+async def test_sync_against_local_server(monkeypatch, tmp_path, restore_base_url) -> None:
+    store = InMemoryMonarchMoney()
+    store.add_account("10", "JP Checking", 5)
+    store.add_transaction(
+        "10", dt.date(2020, 7, 1), 1, "Old", "amount_jpy=150,zaim_id=1"
+    )
+    server = MonarchServer(store, max_concurrency=4)
+    try:
+        monarch = await _login(server, monkeypatch, tmp_path)
+
+        account = Account(
+            name="JP Checking",
+            id="",
+            balance=Amount(jpy=3000, usd=20),
+            years={},
+        )
+        for zaim_id, day in (("1", 1), ("2", 2)):
+            date = dt.date(2020, 7, day)
+            account.add_transaction(
+                Transaction(
+                    date=date,
+                    merchant="Store",
+                    amount=Amount(jpy=150, usd=1),
+                    zaim_id=zaim_id,
+                )
+            )
+        await monarch.import_account(account)
+        await monarch.push(dry_run=False)
+    finally:
+        await server.stop()
+
+    assert store.accounts["10"]["displayBalance"] == 20
+    assert len(store.transactions) == 2
+    assert server.requests["Common_CreateTransactionMutation"] == 1
+    assert server.requests["GetTransactionsList"] == 1
+    # Nothing was saved over the real session.
+    assert not (tmp_path / "session.pickle").exists()
+
+
+@pytest.mark.asyncio
+async def test_throttled_requests_get_429(monkeypatch, tmp_path, restore_base_url) -> None:
+    monkeypatch.setenv("MONARCH_MAX_RETRIES", "2")
+    monkeypatch.setattr(RateLimitedMonarchMoney, "_BASE_DELAY", 0.001)
+    store = InMemoryMonarchMoney()
+    server = MonarchServer(store, throttle_rate=1)
+    try:
+        with pytest.raises(TransportServerError) as e:
+            await _login(server, monkeypatch, tmp_path)
+    finally:
+        await server.stop()
+
+    assert e.value.code == 429
+    # Throttled requests are retried before giving up.
+    assert server.throttled == 3
+
+
+@pytest.mark.asyncio
+async def test_push_survives_throttling(monkeypatch, tmp_path, restore_base_url) -> None:
+    monkeypatch.setenv("MONARCH_RATE_LIMIT", "1000")
+    monkeypatch.setattr(RateLimitedMonarchMoney, "_BASE_DELAY", 0.001)
+    store = InMemoryMonarchMoney()
+    store.add_account("10", "JP Checking", 5)
+    server = MonarchServer(store, throttle_rate=0.3, seed=1)
+    try:
+        monarch = await _login(server, monkeypatch, tmp_path)
+
+        account = Account(name="JP Checking", id="", balance=None, years={})
+        for day in range(1, 11):
+            account.add_transaction(
+                Transaction(
+                    date=dt.date(2020, 7, day),
+                    merchant=f"Store {day}",
+                    amount=Amount(jpy=150, usd=1),
+                    zaim_id=str(day),
+                )
+            )
+        await monarch.import_account(account)
+        await monarch.push(dry_run=False)
+    finally:
+        await server.stop()
+
+    assert server.throttled > 0
+    assert len(store.transactions) == 10
+
+
+@pytest.mark.asyncio
+async def test_batched_push_against_local_server(
+    monkeypatch, tmp_path, restore_base_url
+) -> None:
+    monkeypatch.setenv("MONARCH_BATCH_SIZE", "10")
+    store = InMemoryMonarchMoney()
+    store.add_account("10", "JP Checking", 5)
+    server = MonarchServer(store)
+    try:
+        monarch = await _login(server, monkeypatch, tmp_path)
+
+        account = Account(name="JP Checking", id="", balance=None, years={})
+        for day in range(1, 6):
+            account.add_transaction(
+                Transaction(
+                    date=dt.date(2020, 7, day),
+                    merchant=f"Store {day}",
+                    amount=Amount(jpy=150, usd=1),
+                    zaim_id=str(day),
+                )
+            )
+        await monarch.import_account(account)
+        await monarch.push(dry_run=False)
+
+        pushed = monarch.accounts()["JP Checking"].years[2020].months[7].days[3]
+        assert pushed.transactions[0].monarch_id in store.transactions
+    finally:
+        await server.stop()
+
+    assert server.requests[OPERATION] == 1
+    assert "Common_CreateTransactionMutation" not in server.requests
+    assert len(store.transactions) == 5
+
+
+@pytest.mark.asyncio
+async def test_batched_push_reports_failed_mutations(
+    monkeypatch, tmp_path, restore_base_url
+) -> None:
+    monkeypatch.setenv("MONARCH_BATCH_SIZE", "2")
+    store = InMemoryMonarchMoney()
+    store.add_account("10", "JP Checking", 5)
+    server = MonarchServer(store)
+
+    def change(monarch_id: str) -> TransactionChange:
+        return TransactionChange(
+            account_name="JP Checking",
+            monarch_id=monarch_id,
+            date="2020-07-01",
+            amount_usd=1,
+            merchant="Store",
+            notes="amount_jpy=150",
+        )
+
+    plan = ChangePlan(
+        transactions_to_create=[change("")],
+        transactions_to_update=[change("does-not-exist")],
+        category_id="1",
+    )
+    try:
+        monarch = await _login(server, monkeypatch, tmp_path)
+        with pytest.raises(RuntimeError, match="1 of 2"):
+            await monarch.apply(plan)
+    finally:
+        await server.stop()
+
+    # The create of the same batch went through.
+    assert len(store.transactions) == 1
+    assert plan.transactions_to_create[0].monarch_id in store.transactions
@@ -0,0 +1,97 @@
+import datetime as dt
+import pathlib
+
+from zaim_to_monarch import Zaim
+from zaim_to_monarch.month_cache import MonthCache
+from zaim_to_monarch.zaim_crawler_pool import ZaimCrawlerPool
+
+from .fake_zaim_crawler import FakeCrawler
+
+_TODAY = dt.date(year=2020, month=6, day=15)
+
+
+def _rows():
+    return [
+        {
+            "id": "1234",
+            "date": dt.datetime(year=2020, month=1, day=10),
+            "amount": 1234,
+            "place": "コンビニ",
+            "from_account": "Wallet",
+        }
+    ]
+
+
+def test_month_cache_round_trip(tmp_path: pathlib.Path) -> None:
+    cache = MonthCache("user", str(tmp_path), settled_days=60)
+
+    assert cache.get(2020, 1, _TODAY) is None
+    cache.put(2020, 1, _rows(), _TODAY)
+
+    assert MonthCache("user", str(tmp_path), settled_days=60).get(
+        2020, 1, _TODAY
+    ) == _rows()
+    assert MonthCache("other user", str(tmp_path), settled_days=60).get(
+        2020, 1, _TODAY
+    ) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_month_cache_skips_recent_months(tmp_path: pathlib.Path) -> None:
+    cache = MonthCache("user", str(tmp_path), settled_days=60)
+
+    # April ended 45 days before _TODAY.
+    cache.put(2020, 4, _rows(), _TODAY)
+
+    assert cache.get(2020, 4, _TODAY) is None
+    assert cache.get(2020, 4, dt.date(year=2020, month=7, day=15)) is None
+    assert (cache.hits, cache.misses, cache.recent) == (0, 1, 1)
+
+
+def test_month_cache_refresh(tmp_path: pathlib.Path) -> None:
+    MonthCache("user", str(tmp_path), settled_days=60).put(2020, 1, _rows(), _TODAY)
+
+    cache = MonthCache("user", str(tmp_path), settled_days=60, refresh=True)
+
+    assert cache.get(2020, 1, _TODAY) is None
+    assert cache.misses == 1
+
+
+def test_zaim_reads_settled_months_from_cache(tmp_path: pathlib.Path) -> None:
+    FakeCrawler.instances = []
+    pool = ZaimCrawlerPool("user", "password", 1, crawler_factory=FakeCrawler)
+    cache = MonthCache("user", str(tmp_path), settled_days=0)
+    current_month = (dt.date.today().year, dt.date.today().month)
+    months = [(2020, 1), current_month]
+
+    # The first load crawls both months, the second only the current one.
+    for _ in range(2):
+        zaim = Zaim(crawler=pool, month_cache=cache)
+        assert [month for month, _ in zaim._get_months(months)] == months
+
+    assert FakeCrawler.instances[0].months == [
+        (2020, 1),
+        current_month,
+        current_month,
+    ]
+    assert cache.hits == 1
+
+
+def test_zaim_does_not_cache_months_that_did_not_load(tmp_path: pathlib.Path) -> None:
+    FakeCrawler.instances = []
+    FakeCrawler.incomplete_months = [(2020, 1)]
+    try:
+        pool = ZaimCrawlerPool("user", "password", 1, crawler_factory=FakeCrawler)
+        cache = MonthCache("user", str(tmp_path), settled_days=0)
+
+        zaim = Zaim(crawler=pool, month_cache=cache)
+        assert list(zaim._get_months([(2020, 1)])) == [((2020, 1), [])]
+        assert cache.get(2020, 1) is None
+
+        # Once it loads, the month is cached.
+        FakeCrawler.incomplete_months = []
+        rows = list(zaim._get_months([(2020, 1)]))[0][1]
+        assert len(rows) == 2
+        assert cache.get(2020, 1) == rows
+    finally:
+        FakeCrawler.incomplete_months = []
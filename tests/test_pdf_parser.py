@@ -0,0 +1,137 @@
+import datetime as dt
+import os
+import pathlib
+import pytest
+import stat
+
+from typing import List, Union
+
+from zaim_to_monarch import Account
+from zaim_to_monarch.pdf_cache import PdfCache
+from zaim_to_monarch.pdf_parser import PdfParser
+
+# Stands in for pdftotext: prints the "PDF", which is already text, after
+# sleeping for the number of seconds on its first line.
+_FAKE_PDFTOTEXT = """#!/bin/sh
+sleep $(head -n 1 "$3")
+tail -n +2 "$3"
+"""
+
+
+@pytest.fixture
+def pdf_dir(tmp_path: pathlib.Path, monkeypatch) -> pathlib.Path:
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    pdftotext = bin_dir / "pdftotext"
+    pdftotext.write_text(_FAKE_PDFTOTEXT)
+    pdftotext.chmod(pdftotext.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    statements = tmp_path / "statements"
+    statements.mkdir()
+    return statements
+
+
+def _write_statement(
+    directory: pathlib.Path, name: str, delay: float, lines: List[str]
+) -> None:
+    (directory / name).write_text("\n".join([str(delay)] + lines) + "\n")
+
+
+def _merchants(parser: Union[PdfParser, Account]) -> List[str]:
+    account = parser.get_account() if isinstance(parser, PdfParser) else parser
+    return [
+        transaction.merchant
+        for year in account.years.values()
+        for month in year.months.values()
+        for day in month.days.values()
+        for transaction in day.transactions
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_parse_dir_is_ordered_by_filename(
+    pdf_dir: pathlib.Path, workers: int
+) -> None:
+    # The first statement finishes last.
+    _write_statement(
+        pdf_dir, "2020-01.pdf", 0.3, ["20/01/05 Coffee Shop      JPY 1,200.00"]
+    )
+    _write_statement(
+        pdf_dir, "2020-02.pdf", 0, ["20/01/05 Coffee Shop Refund JPY 1,200.00"]
+    )
+    _write_statement(
+        pdf_dir,
+        "2020-03.pdf",
+        0.1,
+        ["Statement header", "20/03/01 Train              JPY ‑300.00"],
+    )
+    (pdf_dir / "notes.txt").write_text("0\n20/04/01 Ignored JPY 1.00\n")
+
+    parser = PdfParser("Card", workers=workers)
+    parser.parse_dir(str(pdf_dir))
+
+    # Same amount on the same day: the later statement renames the first.
+    assert _merchants(parser) == ["Coffee Shop Refund", "Train"]
+
+    train = parser.get_account().years[2020].months[3].days[1].transactions[0]
+    assert train.amount.jpy == 300
+    assert train.date == dt.date(year=2020, month=3, day=1)
+
+
+def test_parse_dir_reads_unchanged_statements_from_cache(
+    pdf_dir: pathlib.Path, tmp_path: pathlib.Path
+) -> None:
+    _write_statement(pdf_dir, "2020-01.pdf", 0, ["20/01/05 Coffee JPY 1,200.00"])
+    _write_statement(pdf_dir, "2020-02.pdf", 0, ["20/02/05 Train JPY 300.00"])
+    cache_dir = str(tmp_path / "cache")
+
+    first = PdfParser("Card", cache=PdfCache(PdfParser.cache_version(), cache_dir))
+    first.parse_dir(str(pdf_dir))
+
+    # pdftotext is gone, so only cached statements can be parsed.
+    (tmp_path / "bin" / "pdftotext").unlink()
+    cache = PdfCache(PdfParser.cache_version(), cache_dir)
+    second = PdfParser("Card", cache=cache)
+    second.parse_dir(str(pdf_dir))
+
+    assert _merchants(second) == _merchants(first) == ["Coffee", "Train"]
+    coffee = second.get_account().years[2020].months[1].days[5].transactions[0]
+    assert coffee.amount.jpy == -1200
+    assert (cache.hits, cache.misses) == (2, 0)
+
+    # Changed statements and a new parser version are parsed again.
+    _write_statement(pdf_dir, "2020-02.pdf", 0, ["20/02/05 Bus JPY 200.00"])
+    with pytest.raises(FileNotFoundError):
+        PdfParser("Card", cache=cache).parse_dir(str(pdf_dir))
+
+    PdfCache("v0-00000000", cache_dir)
+    assert not os.path.exists(os.path.join(cache_dir, PdfParser.cache_version()))
+
+
+def test_stream_dir_yields_months_in_statement_order(pdf_dir: pathlib.Path) -> None:
+    _write_statement(
+        pdf_dir,
+        "2020-02.pdf",
+        0,
+        ["20/02/05 Train JPY 300.00", "20/01/30 Coffee JPY 1,200.00"],
+    )
+    _write_statement(pdf_dir, "2020-01.pdf", 0.1, ["20/01/05 Bus JPY 200.00"])
+
+    parser = PdfParser("Card", workers=2)
+    months = [
+        (
+            account.name,
+            list(account.years),
+            list(account.years[2020].months),
+            _merchants(account),
+        )
+        for account in parser.stream_dir(str(pdf_dir))
+    ]
+
+    assert months == [
+        ("Card", [2020], [1], ["Bus"]),
+        ("Card", [2020], [1], ["Coffee"]),
+        ("Card", [2020], [2], ["Train"]),
+    ]
+    assert not parser.get_account().years
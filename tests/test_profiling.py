@@ -0,0 +1,74 @@
+import datetime as dt
+import os
+import pstats
+import pytest
+
+from zaim_to_monarch import Account, Amount, Instrumentation, Monarch, Transaction
+from zaim_to_monarch.profiling import Profiler
+
+from .fake_monarch_money import FakeMonarchMoney
+
+pytest_plugins = "pytest_asyncio"
+
+
+def _allocate(n: int) -> list:
+    return [str(i) * 10 for i in range(n)]
+
+
+def test_nested_phases_are_profiled_separately(tmp_path) -> None:
+    profiler = Profiler()
+    try:
+        with profiler.phase("outer"):
+            kept = _allocate(10000)
+            with profiler.phase("inner"):
+                kept += _allocate(20000)
+    finally:
+        profiler.stop()
+
+    directory = profiler.write("run", str(tmp_path))
+
+    inner = pstats.Stats(os.path.join(directory, "inner.prof"))
+    outer = pstats.Stats(os.path.join(directory, "outer.prof"))
+    assert any(function[2] == "_allocate" for function in inner.stats)
+    # The outer phase was paused while the inner one ran.
+    assert [
+        stats[0] for function, stats in outer.stats.items() if function[2] == "_allocate"
+    ] == [1]
+
+    with open(os.path.join(directory, "inner-allocations.txt")) as f:
+        assert "test_profiling.py" in f.read()
+    assert "Profile of inner" in profiler.summary()
+
+
+@pytest.mark.asyncio
+async def test_monarch_phases_are_profiled() -> None:
+    profiler = Profiler()
+    monarch: Monarch = Monarch(
+        mm=FakeMonarchMoney(), instrumentation=Instrumentation(profiler=profiler)
+    )
+    try:
+        await monarch.login()
+
+        account: Account = Account(
+            name="JP Checking",
+            id="1234",
+            balance=None,
+            years={},
+        )
+        account.add_transaction(
+            Transaction(
+                date=dt.date(year=2020, month=9, day=10),
+                merchant="Amazon",
+                amount=Amount(usd=6, jpy=123),
+                zaim_id="1234",
+            )
+        )
+        await monarch.import_account(account)
+        await monarch.push(dry_run=False)
+    finally:
+        profiler.stop()
+
+    summary = profiler.summary()
+    for phase in ("pull", "merge", "push"):
+        assert f"Profile of {phase}" in summary
+    assert "add_transaction" in summary
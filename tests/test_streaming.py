@@ -0,0 +1,71 @@
+import datetime as dt
+import pytest
+
+from typing import Dict, Iterator, List
+
+from zaim_to_monarch import Account, Amount, Monarch, Transaction
+from zaim_to_monarch.zaim_to_monarch import _stream_sync
+
+from .fake_monarch_money import FakeMonarchMoney
+
+pytest_plugins = "pytest_asyncio"
+
+
+class FakeZaim:
+    def __init__(self, months: List[int], fail_at: int = 0):
+        self.months = months
+        self.fail_at = fail_at
+        self.yielded: int = 0
+
+    def stream_data(
+        self, start_date, end_date, ledger
+    ) -> Iterator[Dict[str, Account]]:
+        for i, month in enumerate(self.months):
+            if self.fail_at and month == self.fail_at:
+                raise RuntimeError("zaim went away")
+
+            account = Account(
+                name="JP Checking",
+                id="",
+                balance=Amount(jpy=1000, usd=10) if i == 0 else None,
+                years={},
+            )
+            date = dt.date(year=2020, month=month, day=10)
+            account.add_transaction(
+                Transaction(
+                    date=date,
+                    merchant=f"Store {month}",
+                    amount=Amount(jpy=100 * month, usd=month),
+                    zaim_id=str(month),
+                )
+            )
+            self.yielded += 1
+            yield {account.name: account}
+
+
+@pytest.mark.asyncio
+async def test_stream_sync_pushes_month_by_month() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+
+    await _stream_sync(FakeZaim([7, 8, 9, 10]), monarch, None, None, None, 1)
+
+    assert fake_monarch_money.create_transaction_count == 4
+    assert fake_monarch_money.new_transaction_merchant == "Store 10"
+    # Every month was pulled from monarch and released after its push.
+    assert fake_monarch_money.get_transactions_count == 4
+    assert not monarch.accounts()["JP Checking"].years
+
+
+@pytest.mark.asyncio
+async def test_stream_sync_raises_crawl_errors() -> None:
+    fake_monarch_money: FakeMonarchMoney = FakeMonarchMoney()
+    monarch: Monarch = Monarch(mm=fake_monarch_money)
+    await monarch.login()
+
+    zaim = FakeZaim([7, 8, 9], fail_at=9)
+    with pytest.raises(RuntimeError):
+        await _stream_sync(zaim, monarch, None, None, None, queue_size=1)
+
+    assert fake_monarch_money.create_transaction_count == 2
@@ -0,0 +1,87 @@
+import pytest
+
+from zaim_to_monarch import Monarch, SyncOptions, ZaimCrawlerManager
+from zaim_to_monarch import zaim, zaim_crawler_pool
+from zaim_to_monarch.ledger import SyncLedger
+from zaim_to_monarch.zaim_to_monarch import do_sync
+
+from .fake_zaim_crawler import FakeCrawler
+
+pytest_plugins = "pytest_asyncio"
+
+
+@pytest.fixture
+def options(monkeypatch, tmp_path) -> SyncOptions:
+    monkeypatch.setenv("ZAIM_TO_MONARCH_CACHE_DIR", str(tmp_path))
+    return SyncOptions(
+        ledger_file=str(tmp_path / "ledger.sqlite3"), report_dir=str(tmp_path)
+    )
+
+
+@pytest.fixture
+def closed_ledgers(monkeypatch):
+    closed = []
+    close = SyncLedger.close
+
+    def record_close(ledger: SyncLedger) -> None:
+        closed.append(ledger)
+        close(ledger)
+
+    monkeypatch.setattr(SyncLedger, "close", record_close)
+    return closed
+
+
+async def _fail_login(monarch: Monarch) -> None:
+    raise RuntimeError("monarch login failed")
+
+
+@pytest.mark.asyncio
+async def test_failed_sync_closes_the_ledger(
+    monkeypatch, options, closed_ledgers
+) -> None:
+    monkeypatch.setattr(Monarch, "login", _fail_login)
+    FakeCrawler.instances = []
+    manager = ZaimCrawlerManager(pool_size=1, crawler_factory=FakeCrawler)
+
+    with pytest.raises(RuntimeError, match="monarch login failed"):
+        await do_sync(None, None, options, manager)
+
+    assert len(closed_ledgers) == 1
+
+
+class _BrokenCrawler(FakeCrawler):
+    def get_account_balances(self):
+        raise RuntimeError("zaim login failed")
+
+
+@pytest.mark.asyncio
+async def test_monarch_error_is_raised_when_zaim_fails_too(
+    monkeypatch, options, closed_ledgers
+) -> None:
+    monkeypatch.setattr(Monarch, "login", _fail_login)
+    FakeCrawler.instances = []
+    manager = ZaimCrawlerManager(pool_size=1, crawler_factory=_BrokenCrawler)
+
+    with pytest.raises(RuntimeError, match="monarch login failed"):
+        await do_sync(None, None, options, manager)
+
+    # The pool that started is released, its cookies kept for the next sync.
+    assert manager.started == 1
+    assert manager._cookies == FakeCrawler.instances[0].cookie_jar
+    assert len(closed_ledgers) == 1
+
+
+@pytest.mark.asyncio
+async def test_zaim_that_fails_to_start_stops_chrome(monkeypatch) -> None:
+    FakeCrawler.instances = []
+    monkeypatch.setattr(
+        zaim,
+        "ZaimCrawlerPool",
+        lambda user_id, password, size: zaim_crawler_pool.ZaimCrawlerPool(
+            user_id, password, size, crawler_factory=_BrokenCrawler
+        ),
+    )
+
+    with pytest.raises(RuntimeError, match="zaim login failed"):
+        zaim.Zaim()
+    assert FakeCrawler.instances[0].closed
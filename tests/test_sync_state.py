@@ -0,0 +1,71 @@
+import datetime as dt
+import pathlib
+
+from zaim_to_monarch import SyncState
+
+
+def test_first_sync_covers_one_interval(tmp_path: pathlib.Path) -> None:
+    state = SyncState(str(tmp_path / "state.json"))
+    today = dt.date(year=2024, month=3, day=10)
+
+    # Three days of lookback plus the one week overlap.
+    assert state.sync_range(3, today) == (dt.date(year=2024, month=2, day=29), today)
+    assert state.next_due(3) == dt.datetime.min
+
+
+def test_watermark_survives_restart(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / "state.json")
+    state = SyncState(path)
+
+    run = state.start_run(
+        dt.date(year=2024, month=3, day=1),
+        dt.date(year=2024, month=3, day=10),
+    )
+    state.finish_run(run)
+
+    restarted = SyncState(path)
+    assert restarted.watermark == dt.date(year=2024, month=3, day=10)
+    assert restarted.last_run.succeeded
+    assert restarted.next_due(3) == run.finished_at + dt.timedelta(days=3)
+
+    # Missed intervals are caught up in one run from the watermark.
+    assert restarted.sync_range(3, dt.date(year=2024, month=4, day=1)) == (
+        dt.date(year=2024, month=3, day=3),
+        dt.date(year=2024, month=4, day=1),
+    )
+
+
+def test_failed_run_keeps_watermark(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / "state.json")
+    state = SyncState(path)
+
+    run = state.start_run(
+        dt.date(year=2024, month=3, day=1),
+        dt.date(year=2024, month=3, day=10),
+    )
+    state.finish_run(run)
+
+    run = state.start_run(
+        dt.date(year=2024, month=3, day=3),
+        dt.date(year=2024, month=3, day=13),
+    )
+    state.finish_run(run, error="RuntimeError()")
+
+    restarted = SyncState(path)
+    assert restarted.watermark == dt.date(year=2024, month=3, day=10)
+    assert not restarted.last_run.succeeded
+    assert restarted.last_run.error == "RuntimeError()"
+
+
+def test_interrupted_run_is_retried_immediately(tmp_path: pathlib.Path) -> None:
+    path = str(tmp_path / "state.json")
+    state = SyncState(path)
+
+    state.start_run(
+        dt.date(year=2024, month=3, day=1),
+        dt.date(year=2024, month=3, day=10),
+    )
+
+    restarted = SyncState(path)
+    assert restarted.watermark is None
+    assert restarted.next_due(3) == dt.datetime.min
@@ -0,0 +1,25 @@
+import threading
+import time
+
+from zaim_to_monarch.timeline import Timeline
+
+
+def test_timeline_measures_overlap() -> None:
+    timeline = Timeline()
+
+    def background() -> None:
+        with timeline.span("zaim startup"):
+            time.sleep(0.2)
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    with timeline.span("monarch login"):
+        time.sleep(0.1)
+    thread.join()
+
+    with timeline.span("zaim crawl"):
+        pass
+
+    assert 0.05 < timeline.overlap_saved(["zaim startup", "monarch login"]) < 0.15
+    assert timeline.overlap_saved(["zaim crawl"]) == 0
+    assert "monarch login" in str(timeline)
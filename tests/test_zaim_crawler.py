@@ -0,0 +1,172 @@
+import datetime
+
+from typing import Any, Dict, Optional
+
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+)
+
+from zaim_to_monarch.zaim_crawler import _EXTRACT_ROWS_SCRIPT, ZaimCrawler, parse_rows
+
+
+def _row(
+    zaim_id: str,
+    from_account: Optional[str] = "Wallet",
+    to_account: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        "url": f"/money/{zaim_id}",
+        "count": "1（集計に含める）",
+        "date": " 09月10日（木）\n",
+        "category": "Food",
+        "genre": " Groceries ",
+        "amount": "¥1,234",
+        "from_account": from_account,
+        "to_account": to_account,
+        "place": "Amazon ",
+        "name": "Coffee",
+        "comment": "",
+    }
+
+
+def test_parse_rows() -> None:
+    items = parse_rows([_row("1234")], "2020", set())
+
+    assert items == [
+        {
+            "id": "1234",
+            "count": "1",
+            "date": datetime.datetime(year=2020, month=9, day=10),
+            "category": "Food",
+            "genre": "Groceries",
+            "amount": 1234,
+            "from_account": "Wallet",
+            "type": "payment",
+            "place": "Amazon",
+            "name": "Coffee",
+            "comment": "",
+        }
+    ]
+
+
+def test_parse_rows_types() -> None:
+    items = parse_rows(
+        [
+            _row("1", from_account="Wallet", to_account="Bank"),
+            _row("2", from_account=None, to_account="Bank"),
+        ],
+        "2020",
+        set(),
+    )
+
+    assert [item["type"] for item in items] == ["transfer", "income"]
+    assert "from_account" not in items[1]
+
+
+def test_parse_rows_skips_seen_ids() -> None:
+    seen_ids = set()
+
+    first_page = parse_rows([_row("1"), _row("2")], "2020", seen_ids)
+    second_page = parse_rows([_row("2"), _row("3"), _row("3")], "2020", seen_ids)
+
+    assert [item["id"] for item in first_page] == ["1", "2"]
+    assert [item["id"] for item in second_page] == ["3"]
+    assert seen_ids == {"1", "2", "3"}
+
+
+class _FakeDriver:
+    # Shows pages of result rows, the next one after every scroll once the
+    # page has been polled `load_polls` times. Without results the results
+    # list never appears.
+    def __init__(self, pages, results: bool = True, load_polls: int = 0):
+        self.pages = pages
+        self.results = results
+        self.load_polls = load_polls
+        self.stale_polls = 0
+        self.page = 0
+        self.polls = 0
+        self.scrolled = False
+
+    def get(self, url) -> None:
+        pass
+
+    def find_element(self, by, value):
+        if not self.results:
+            raise NoSuchElementException()
+        return object()
+
+    def execute_script(self, script, *args):
+        if script == _EXTRACT_ROWS_SCRIPT:
+            if not self.results:
+                return None
+            self.scrolled = True
+            return self.pages[self.page]
+
+        if self.stale_polls:
+            self.stale_polls -= 1
+            raise StaleElementReferenceException()
+        self.polls += 1
+        if self.scrolled and self.polls > self.load_polls:
+            self.scrolled = False
+            self.polls = 0
+            self.page = min(self.page + 1, len(self.pages) - 1)
+        rows = self.pages[self.page]
+        return [len(rows), rows[0]["url"] if rows else None]
+
+
+def _crawler(driver: _FakeDriver) -> ZaimCrawler:
+    crawler = ZaimCrawler.__new__(ZaimCrawler)
+    crawler.driver = driver
+    crawler._page_timeout = 0.2
+    crawler._results_timeout = 0.2
+    crawler._scroll_timeout = 0.2
+    crawler.month_timings = []
+    crawler.page_loads = 0
+    crawler._seen_ids = set()
+    crawler._timing = None
+    crawler.last_month_complete = True
+    crawler.data = []
+    crawler.current = 0
+    return crawler
+
+
+def test_get_data_scrolls_to_the_end_of_the_month() -> None:
+    driver = _FakeDriver(
+        [
+            [_row("1"), _row("2"), _row("3")],
+            [_row("3"), _row("4")],
+        ],
+        load_polls=2,
+    )
+    driver.stale_polls = 1
+    crawler = _crawler(driver)
+
+    items = list(crawler.get_data(2020, 9))
+
+    # Rows already read are not read again, stale elements are waited out.
+    assert [item["id"] for item in items] == ["4", "3", "2", "1"]
+    timing = crawler.month_timings[0]
+    assert timing.scrolls == 2
+    assert timing.complete
+    assert crawler.last_month_complete
+    # The last page ends the month after the scroll timeout.
+    assert timing.waited >= crawler._scroll_timeout
+
+
+def test_get_data_reports_results_that_did_not_load() -> None:
+    crawler = _crawler(_FakeDriver([], results=False))
+
+    assert list(crawler.get_data(2020, 9)) == []
+    timing = crawler.month_timings[0]
+    assert not timing.complete
+    assert not crawler.last_month_complete
+    assert timing.waited >= crawler._results_timeout
+    assert timing.scrolls == 0
+
+
+def test_get_data_of_an_empty_month_is_complete() -> None:
+    crawler = _crawler(_FakeDriver([[]]))
+
+    assert list(crawler.get_data(2020, 9)) == []
+    assert crawler.last_month_complete
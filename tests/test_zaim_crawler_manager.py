@@ -0,0 +1,107 @@
+from urllib3.exceptions import MaxRetryError
+
+from zaim_to_monarch import ZaimCrawlerManager
+from zaim_to_monarch.zaim_crawler import ZaimCrawler
+
+from .fake_zaim_crawler import FakeCrawler
+
+
+def _manager(**kwargs) -> ZaimCrawlerManager:
+    FakeCrawler.instances = []
+    return ZaimCrawlerManager(pool_size=1, crawler_factory=FakeCrawler, **kwargs)
+
+
+def _sync(manager: ZaimCrawlerManager, months: int = 1) -> None:
+    pool = manager.acquire()
+    list(pool.get_months([(2020, month + 1) for month in range(months)]))
+    manager.release()
+
+
+def test_manager_reuses_the_session_between_syncs() -> None:
+    manager = _manager()
+
+    _sync(manager)
+    _sync(manager)
+
+    assert len(FakeCrawler.instances) == 1
+    assert manager.started == 1
+
+    manager.close()
+    assert FakeCrawler.instances[0].closed
+
+
+def test_manager_restarts_logged_out_sessions_from_cookies() -> None:
+    manager = _manager()
+
+    _sync(manager)
+    FakeCrawler.instances[0].cookie_jar = [{"name": "refreshed"}]
+    manager.release()
+    FakeCrawler.instances[0].logged_out = True
+    _sync(manager)
+
+    assert len(FakeCrawler.instances) == 2
+    assert FakeCrawler.instances[0].closed
+    assert not FakeCrawler.instances[1].logged_in
+    assert FakeCrawler.instances[1].cookie_jar == [{"name": "refreshed"}]
+
+
+def test_manager_recycles_after_page_loads() -> None:
+    manager = _manager(max_page_loads=3)
+
+    _sync(manager, months=2)
+    _sync(manager, months=2)
+
+    assert manager.recycled == 1
+    assert FakeCrawler.instances[0].closed
+
+    _sync(manager)
+    assert len(FakeCrawler.instances) == 2
+
+
+def test_manager_recycles_above_memory_threshold() -> None:
+    manager = _manager(max_rss_mb=50)
+
+    _sync(manager)
+
+    assert manager.recycled == 1
+    assert FakeCrawler.instances[0].closed
+
+
+class _DeadDriver:
+    # What selenium does once chromedriver has died.
+    def get(self, url):
+        raise MaxRetryError(None, url, "Connection refused")
+
+    def quit(self):
+        raise MaxRetryError(None, "/session", "Connection refused")
+
+
+def test_dead_chromedriver_is_not_logged_in() -> None:
+    crawler = ZaimCrawler.__new__(ZaimCrawler)
+    crawler.driver = _DeadDriver()
+    crawler.page_loads = 0
+    crawler._page_timeout = 1
+    crawler._timing = None
+
+    assert not crawler.is_logged_in()
+    crawler.close()
+
+
+class _DeadCrawler(FakeCrawler):
+    def is_logged_in(self) -> bool:
+        raise MaxRetryError(None, "/session", "Connection refused")
+
+    def close(self) -> None:
+        raise MaxRetryError(None, "/session", "Connection refused")
+
+
+def test_manager_replaces_pools_that_fail_to_check_or_close() -> None:
+    FakeCrawler.instances = []
+    manager = ZaimCrawlerManager(pool_size=1, crawler_factory=_DeadCrawler)
+    first = manager.acquire()
+    manager.release()
+
+    # The dead pool is dropped and a new one started.
+    assert manager.acquire() is not first
+    assert manager.started == 2
+    manager.close()
@@ -0,0 +1,61 @@
+from zaim_to_monarch.zaim_crawler_pool import ZaimCrawlerPool
+
+from .fake_zaim_crawler import FakeCrawler
+
+
+def _pool(size: int) -> ZaimCrawlerPool:
+    FakeCrawler.instances = []
+    return ZaimCrawlerPool("user", "password", size, crawler_factory=FakeCrawler)
+
+
+_MONTHS = [(2019, 11), (2019, 12), (2020, 1), (2020, 2), (2020, 3), (2020, 4)]
+
+
+def test_pool_of_one_crawls_with_a_single_session() -> None:
+    pool = _pool(1)
+
+    results = list(pool.get_months(_MONTHS))
+
+    assert [month for month, _ in results] == _MONTHS
+    assert len(FakeCrawler.instances) == 1
+    assert FakeCrawler.instances[0].months == _MONTHS
+
+
+def test_pool_shares_the_session_and_keeps_month_order() -> None:
+    pool = _pool(3)
+
+    results = list(pool.get_months(_MONTHS))
+
+    assert [month for month, _ in results] == _MONTHS
+    assert [rows[0]["id"] for _, rows in results] == [
+        f"{year}{month}-1" for year, month in _MONTHS
+    ]
+
+    assert len(FakeCrawler.instances) == 3
+    assert [crawler.logged_in for crawler in FakeCrawler.instances] == [
+        True,
+        False,
+        False,
+    ]
+    assert all(
+        crawler.cookie_jar == [{"name": "session"}]
+        for crawler in FakeCrawler.instances
+    )
+    assert sorted(
+        month for crawler in FakeCrawler.instances for month in crawler.months
+    ) == _MONTHS
+
+    pool.close()
+    assert all(crawler.closed for crawler in FakeCrawler.instances)
+
+
+def test_pool_falls_back_when_sessions_fail_to_start() -> None:
+    pool = _pool(3)
+    FakeCrawler.fail_with_cookies = True
+    try:
+        results = list(pool.get_months(_MONTHS))
+    finally:
+        FakeCrawler.fail_with_cookies = False
+
+    assert [month for month, _ in results] == _MONTHS
+    assert len(FakeCrawler.instances) == 1
@@ -1,4 +1,10 @@
-from .zaim_to_monarch import do_sync, import_pdfs
+from .zaim_to_monarch import apply_plan, do_sync, import_pdfs
 from .account_data import Account, Amount, Day, Month, Transaction, Year
-from .monarch import Monarch
+from .change_plan import AccountChange, ChangePlan, TransactionChange
+from .transaction_table import TransactionTable
+from .instrumentation import Instrumentation
+from .monarch import Monarch, PushStats
+from .options import SyncOptions
+from .sync_state import SyncRun, SyncState
 from .zaim import Zaim
+from .zaim_crawler_manager import ZaimCrawlerManager
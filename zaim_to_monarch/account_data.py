@@ -1,17 +1,16 @@
-from currency_converter import CurrencyConverter, ECB_URL
 import dataclasses
 import datetime as dt
 
-from typing import Dict, List, Optional
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence
 
+from .exchange_rates import default_store
+from .transaction_table import TransactionTable
 
-class Amount:
-    _converter = CurrencyConverter(
-        currency_file=ECB_URL,
-        fallback_on_missing_rate=True,
-        fallback_on_wrong_date=True,
-    )
 
+class Amount:
+    # Only one of jpy/usd is usually known up front. The other one is
+    # converted the first time it is read, or in bulk by resolve_many.
     def __init__(
         self,
         jpy: Optional[float] = None,
@@ -22,87 +21,352 @@ class Amount:
         if jpy is None and usd is None:
             raise Exception("Either JPY or USD is required")
 
-        if jpy is not None and usd is not None:
-            self._jpy = jpy
-            self._usd = usd
-            return
-
-        if jpy is not None:
-            self._jpy = jpy
-            self._usd = self._converter.convert(jpy, "JPY", "USD", date)
-
-        if usd is not None:
-            self._usd = usd
-            self._jpy = self._converter.convert(usd, "USD", "JPY", date)
+        self._jpy: Optional[float] = jpy
+        self._usd: Optional[float] = usd
+        self._date: Optional[dt.date] = date
 
     @property
     def jpy(self) -> float:
+        if self._jpy is None:
+            self._jpy = default_store().convert(self._usd, "USD", "JPY", self._date)
         return self._jpy
 
     @property
     def usd(self) -> float:
+        if self._usd is None:
+            self._usd = default_store().convert(self._jpy, "JPY", "USD", self._date)
         return self._usd
 
+    @classmethod
+    def resolve_many(cls, amounts: List["Amount"]) -> None:
+        from_jpy = [amount for amount in amounts if amount._usd is None]
+        from_usd = [amount for amount in amounts if amount._jpy is None]
+
+        if from_jpy:
+            usd = default_store().convert_many(
+                [amount._jpy for amount in from_jpy],
+                "JPY",
+                "USD",
+                [amount._date for amount in from_jpy],
+            )
+            for amount, value in zip(from_jpy, usd):
+                amount._usd = value
+
+        if from_usd:
+            jpy = default_store().convert_many(
+                [amount._usd for amount in from_usd],
+                "USD",
+                "JPY",
+                [amount._date for amount in from_usd],
+            )
+            for amount, value in zip(from_usd, jpy):
+                amount._jpy = value
+
     def __str__(self) -> str:
         return f"(¥{round(self.jpy)}, ${round(self.usd, 2)})"
 
 
-@dataclasses.dataclass(frozen=False)
 class Transaction:
-    date: dt.date
-    merchant: str
-    amount: Amount
-    zaim_id: str = ""
-    monarch_id: str = ""
-    needs_push_to_monarch: bool = False
+    # A transaction is either detached, holding its own values, or a view of
+    # a row of the TransactionTable of the account it was added to.
+    __slots__ = (
+        "_table",
+        "_row",
+        "_date",
+        "_merchant",
+        "_amount",
+        "_zaim_id",
+        "_monarch_id",
+        "_needs_push_to_monarch",
+    )
+
+    def __init__(
+        self,
+        date: dt.date,
+        merchant: str,
+        amount: Amount,
+        zaim_id: str = "",
+        monarch_id: str = "",
+        needs_push_to_monarch: bool = False,
+    ) -> None:
+        self._table: Optional[TransactionTable] = None
+        self._row: int = -1
+        self._date: Optional[dt.date] = date
+        self._merchant: Optional[str] = merchant
+        self._amount: Optional[Amount] = amount
+        self._zaim_id: Optional[str] = zaim_id
+        self._monarch_id: Optional[str] = monarch_id
+        self._needs_push_to_monarch: bool = needs_push_to_monarch
+
+    @classmethod
+    def _view(cls, table: TransactionTable, row: int) -> "Transaction":
+        transaction = cls.__new__(cls)
+        transaction._bind(table, row)
+        return transaction
+
+    def _bind(self, table: TransactionTable, row: int) -> None:
+        self._table = table
+        self._row = row
+        self._date = None
+        self._merchant = None
+        self._amount = None
+        self._zaim_id = None
+        self._monarch_id = None
+        self._needs_push_to_monarch = False
+
+    @property
+    def date(self) -> dt.date:
+        if self._table is None:
+            return self._date
+        return self._table.date(self._row)
+
+    @property
+    def merchant(self) -> str:
+        if self._table is None:
+            return self._merchant
+        return self._table.merchant(self._row)
+
+    @merchant.setter
+    def merchant(self, merchant: str) -> None:
+        if self._table is None:
+            self._merchant = merchant
+        else:
+            self._table.set_merchant(self._row, merchant)
+
+    @property
+    def amount(self) -> Amount:
+        if self._table is None:
+            return self._amount
+
+        yen = self._table.yen(self._row)
+        usd_cents = self._table.usd_cents(self._row)
+        if usd_cents is None:
+            return Amount(jpy=yen, date=self._table.date(self._row))
+        return Amount(jpy=yen, usd=usd_cents / 100)
+
+    @amount.setter
+    def amount(self, amount: Amount) -> None:
+        if self._table is None:
+            self._amount = amount
+        else:
+            self._table.set_amount(self._row, *self._columns(amount, self.date))
+
+    @property
+    def zaim_id(self) -> str:
+        if self._table is None:
+            return self._zaim_id
+        return self._table.zaim_id(self._row)
+
+    @zaim_id.setter
+    def zaim_id(self, zaim_id: str) -> None:
+        if self._table is None:
+            self._zaim_id = zaim_id
+        else:
+            self._table.set_zaim_id(self._row, zaim_id)
+
+    @property
+    def monarch_id(self) -> str:
+        if self._table is None:
+            return self._monarch_id
+        return self._table.monarch_id(self._row)
+
+    @monarch_id.setter
+    def monarch_id(self, monarch_id: str) -> None:
+        if self._table is None:
+            self._monarch_id = monarch_id
+        else:
+            self._table.set_monarch_id(self._row, monarch_id)
+
+    @property
+    def needs_push_to_monarch(self) -> bool:
+        if self._table is None:
+            return self._needs_push_to_monarch
+        return self._table.dirty(self._row)
+
+    @needs_push_to_monarch.setter
+    def needs_push_to_monarch(self, needs_push_to_monarch: bool) -> None:
+        if self._table is None:
+            self._needs_push_to_monarch = needs_push_to_monarch
+        else:
+            self._table.set_dirty(self._row, needs_push_to_monarch)
+
+    @classmethod
+    def resolve_amounts(cls, transactions: List["Transaction"]) -> None:
+        # Converts the USD value of every transaction in as few passes as possible.
+        rows: Dict[int, List[int]] = {}
+        tables: Dict[int, TransactionTable] = {}
+        detached: List[Amount] = []
+
+        for transaction in transactions:
+            if transaction._table is None:
+                detached.append(transaction._amount)
+            else:
+                tables[id(transaction._table)] = transaction._table
+                rows.setdefault(id(transaction._table), []).append(transaction._row)
+
+        for key, table in tables.items():
+            table.resolve_usd(rows[key])
+
+        Amount.resolve_many(detached)
+
+    @staticmethod
+    def _columns(amount: Amount, date: dt.date):
+        yen = int(round(amount.jpy))
+
+        # Conversions left for later always use the transaction date, so an
+        # amount that was meant to be converted at another date is converted now.
+        if amount._usd is None and amount._date == date:
+            return yen, None
+        return yen, round(amount.usd * 100)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Transaction):
+            return NotImplemented
+        if self._table is not None and self._table is other._table:
+            return self._row == other._row
+        return (
+            self.date,
+            self.merchant,
+            self.amount.jpy,
+            self.zaim_id,
+            self.monarch_id,
+            self.needs_push_to_monarch,
+        ) == (
+            other.date,
+            other.merchant,
+            other.amount.jpy,
+            other.zaim_id,
+            other.monarch_id,
+            other.needs_push_to_monarch,
+        )
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (
+            f"Transaction(date={self.date!r}, merchant={self.merchant!r}, "
+            f"amount={self.amount}, zaim_id={self.zaim_id!r}, "
+            f"monarch_id={self.monarch_id!r}, "
+            f"needs_push_to_monarch={self.needs_push_to_monarch!r})"
+        )
 
     def __str__(self):
         return f"Date: {self.date} Merchant: {self.merchant} Amount: {self.amount} zaim_id: {self.zaim_id} monarch_id: {self.monarch_id}"
 
 
+class TransactionList(Sequence[Transaction]):
+    # The transactions of one day, as views of their rows in the table.
+    def __init__(self, table: TransactionTable) -> None:
+        self._table: TransactionTable = table
+        self._rows: array = array("I")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Transaction._view(self._table, row) for row in self._rows[index]]
+        return Transaction._view(self._table, self._rows[index])
+
+    def __iter__(self) -> Iterator[Transaction]:
+        for row in self._rows:
+            yield Transaction._view(self._table, row)
+
+    def rows(self) -> array:
+        return self._rows
+
+    def append(self, transaction: Transaction) -> None:
+        table = self._table
+        amount = transaction.amount
+        date = transaction.date
+
+        row = table.append(
+            date,
+            transaction.merchant,
+            *Transaction._columns(amount, date),
+            transaction.zaim_id,
+            transaction.monarch_id,
+            transaction.needs_push_to_monarch,
+        )
+        self._rows.append(row)
+
+        # A transaction that already belongs to another table keeps viewing
+        # its own row. Otherwise it becomes the view of the new row.
+        if transaction._table is None:
+            transaction._bind(table, row)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
 @dataclasses.dataclass(frozen=False)
 class Day:
     day: int
-    transactions: List[Transaction]
+    transactions: Sequence[Transaction]
+    table: Optional[TransactionTable] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        if self.table is None:
+            self.table = TransactionTable()
+
+        transactions = self.transactions
+        self.transactions = TransactionList(self.table)
+        for transaction in transactions:
+            self.transactions.append(transaction)
 
     def add_transaction(self, new_transaction: Transaction) -> None:
 
         if not new_transaction.monarch_id:
             new_transaction.needs_push_to_monarch = True
 
-        for transaction in self.transactions:
-            if new_transaction.zaim_id and (
-                transaction.zaim_id == new_transaction.zaim_id
-            ):
-                return
-
-            if new_transaction.monarch_id and (
-                transaction.monarch_id == new_transaction.monarch_id
-            ):
-                return
-
-            # Transactions sourced from PDFs will not have any ID.
-            # In this case, the merchant info may differ and cannot
-            # be used to distinguish transactions. Use amount_jpy as
-            # an approximate proxy for an ID.
-            if not new_transaction.zaim_id and not new_transaction.monarch_id:
-                if new_transaction.amount.jpy == transaction.amount.jpy:
-                    transaction.merchant = new_transaction.merchant
-                    transaction.amount = new_transaction.amount
-                    transaction.needs_push_to_monarch = True
-                    return
-
-            # Similarly, transactions that were originally created from
-            # a PDF import may have a monarch id but not a zaim id.
-            # In this case, update the zaim id when a match is found.
-            if (
-                not transaction.zaim_id
-                and new_transaction.zaim_id
-                and new_transaction.amount.jpy == transaction.amount.jpy
-            ):
+        # The table indexes rows by day. Matching picks the earliest row of
+        # each rule, exactly as a scan of self.transactions in order would.
+        table = self.table
+        date = new_transaction.date
+        duplicate: Optional[int] = None
+
+        if new_transaction.zaim_id:
+            duplicate = table.first_by_zaim_id(date, new_transaction.zaim_id)
+
+        if new_transaction.monarch_id:
+            row = table.first_by_monarch_id(date, new_transaction.monarch_id)
+            if row is not None and (duplicate is None or row < duplicate):
+                duplicate = row
+
+        match: Optional[int] = None
+        yen = int(round(new_transaction.amount.jpy))
+
+        # Transactions sourced from PDFs will not have any ID.
+        # In this case, the merchant info may differ and cannot
+        # be used to distinguish transactions. Use amount_jpy as
+        # an approximate proxy for an ID.
+        if not new_transaction.zaim_id and not new_transaction.monarch_id:
+            match = table.first_by_yen(date, yen)
+
+        # Similarly, transactions that were originally created from
+        # a PDF import may have a monarch id but not a zaim id.
+        # In this case, update the zaim id when a match is found.
+        if new_transaction.zaim_id:
+            match = table.first_by_yen(date, yen, without_zaim_id=True)
+
+        # An id match on an earlier (or the same) transaction wins, as it
+        # would have been found first when scanning in order.
+        if duplicate is not None and (match is None or duplicate <= match):
+            return
+
+        if match is not None:
+            transaction = Transaction._view(table, match)
+
+            if new_transaction.zaim_id:
                 transaction.zaim_id = new_transaction.zaim_id
-                transaction.needs_push_to_monarch = True
-                return
+            else:
+                transaction.merchant = new_transaction.merchant
+                transaction.amount = new_transaction.amount
+
+            transaction.needs_push_to_monarch = True
+            return
 
         self.transactions.append(new_transaction)
 
@@ -111,12 +375,19 @@ class Day:
 class Month:
     month: int
     days: Dict[int, Day]
+    table: Optional[TransactionTable] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        if self.table is None:
+            self.table = TransactionTable()
 
     def add_transaction(self, transaction: Transaction) -> None:
         day = transaction.date.day
 
         if not day in self.days:
-            self.days[day] = Day(day, [])
+            self.days[day] = Day(day, [], self.table)
 
         self.days[day].add_transaction(transaction)
 
@@ -125,12 +396,19 @@ class Month:
 class Year:
     year: int
     months: Dict[int, Month]
+    table: Optional[TransactionTable] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        if self.table is None:
+            self.table = TransactionTable()
 
     def add_transaction(self, transaction: Transaction) -> None:
         month = transaction.date.month
 
         if not month in self.months:
-            self.months[month] = Month(month, {})
+            self.months[month] = Month(month, {}, self.table)
 
         self.months[month].add_transaction(transaction)
 
@@ -141,11 +419,20 @@ class Account:
     id: str
     balance: Optional[Amount]
     years: Dict[int, Year]
+    # Every transaction of the account is a row of this table. The
+    # years/months/days tree indexes into it.
+    table: Optional[TransactionTable] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        if self.table is None:
+            self.table = TransactionTable()
 
     def add_transaction(self, transaction: Transaction) -> None:
         year = transaction.date.year
 
         if not year in self.years:
-            self.years[year] = Year(year, {})
+            self.years[year] = Year(year, {}, self.table)
 
         self.years[year].add_transaction(transaction)
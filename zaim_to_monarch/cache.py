@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+
+def cache_dir() -> str:
+    path = os.getenv("ZAIM_TO_MONARCH_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "zaim-to-monarch"
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    # Write to a temporary file in the same directory and rename it over the
+    # target so readers only ever see the old or the new contents.
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
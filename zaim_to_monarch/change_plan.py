@@ -0,0 +1,157 @@
+import dataclasses
+import datetime as dt
+import json
+
+from typing import Any, Dict, List, Optional
+
+from .account_data import Transaction
+from .cache import atomic_write
+
+_VERSION = 1
+
+
+@dataclasses.dataclass(frozen=False)
+class AccountChange:
+    name: str
+    # Empty for accounts that are created.
+    id: str
+    balance_usd: float
+
+
+@dataclasses.dataclass(frozen=False)
+class TransactionChange:
+    account_name: str
+    # Empty for transactions that are created.
+    monarch_id: str
+    date: str
+    amount_usd: float
+    merchant: str
+    notes: str
+    # The transaction the change was planned from. Applying the change marks
+    # it pushed and stores the id of created transactions. Plans loaded from
+    # a file have none.
+    transaction: Optional[Transaction] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    def __str__(self) -> str:
+        return (
+            f"Date: {self.date} Merchant: {self.merchant} "
+            f"Amount: ${round(self.amount_usd, 2)} ({self.notes}) "
+            f"Account: {self.account_name}"
+            + (f" monarch_id: {self.monarch_id}" if self.monarch_id else "")
+        )
+
+
+@dataclasses.dataclass(frozen=False)
+class ChangePlan:
+    # Everything Monarch.push would change in monarch, worked out once so it
+    # can be reviewed, saved and applied as is, later or by another process.
+    accounts_to_create: List[AccountChange] = dataclasses.field(default_factory=list)
+    balance_updates: List[AccountChange] = dataclasses.field(default_factory=list)
+    transactions_to_create: List[TransactionChange] = dataclasses.field(
+        default_factory=list
+    )
+    transactions_to_update: List[TransactionChange] = dataclasses.field(
+        default_factory=list
+    )
+    # Category of created transactions, if it was known when planning.
+    category_id: str = ""
+    created_at: str = dataclasses.field(
+        default_factory=lambda: dt.datetime.now().isoformat(timespec="seconds")
+    )
+    # Set once the plan has been applied without failures. Applied plans are
+    # refused, so saving a plan after applying it keeps it from being applied
+    # twice.
+    applied_at: str = ""
+
+    def is_empty(self) -> bool:
+        return not (
+            self.accounts_to_create
+            or self.balance_updates
+            or self.transactions_to_create
+            or self.transactions_to_update
+        )
+
+    def save(self, path: str) -> None:
+        data = {
+            "version": _VERSION,
+            "created_at": self.created_at,
+            "applied_at": self.applied_at,
+            "category_id": self.category_id,
+            "accounts_to_create": [
+                dataclasses.asdict(change) for change in self.accounts_to_create
+            ],
+            "balance_updates": [
+                dataclasses.asdict(change) for change in self.balance_updates
+            ],
+            "transactions_to_create": [
+                self._transaction_dict(change) for change in self.transactions_to_create
+            ],
+            "transactions_to_update": [
+                self._transaction_dict(change) for change in self.transactions_to_update
+            ],
+        }
+        atomic_write(
+            path, json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8")
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ChangePlan":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("version") != _VERSION:
+            raise ValueError(
+                f"{path} is a version {data.get('version')} change plan, "
+                f"expected version {_VERSION}."
+            )
+
+        return cls(
+            accounts_to_create=[
+                AccountChange(**change) for change in data["accounts_to_create"]
+            ],
+            balance_updates=[
+                AccountChange(**change) for change in data["balance_updates"]
+            ],
+            transactions_to_create=[
+                TransactionChange(**change) for change in data["transactions_to_create"]
+            ],
+            transactions_to_update=[
+                TransactionChange(**change) for change in data["transactions_to_update"]
+            ],
+            category_id=data["category_id"],
+            created_at=data["created_at"],
+            applied_at=data.get("applied_at", ""),
+        )
+
+    @staticmethod
+    def _transaction_dict(change: TransactionChange) -> Dict[str, Any]:
+        return {
+            field.name: getattr(change, field.name)
+            for field in dataclasses.fields(change)
+            if field.name != "transaction"
+        }
+
+    def __str__(self) -> str:
+        lines: List[str] = []
+        for change in self.accounts_to_create:
+            lines.append(
+                f"Creating new monarch account: {change.name} "
+                f"Balance: ${round(change.balance_usd, 2)}"
+            )
+        for change in self.balance_updates:
+            lines.append(
+                f"Updating balance of {change.name}: ${round(change.balance_usd, 2)}"
+            )
+        for change in self.transactions_to_create:
+            lines.append(f"Creating new transaction: {change}")
+        for change in self.transactions_to_update:
+            lines.append(f"Updating transaction: {change}")
+        lines.append(
+            f"{len(self.accounts_to_create)} accounts to create, "
+            f"{len(self.balance_updates)} balances to update, "
+            f"{len(self.transactions_to_create)} transactions to create, "
+            f"{len(self.transactions_to_update)} transactions to update."
+        )
+        return "\n".join(lines)
@@ -0,0 +1,301 @@
+import csv
+import datetime as dt
+import io
+import os
+import threading
+import time
+import urllib.request
+import zipfile
+
+from array import array
+from currency_converter import ECB_URL
+from currency_converter.currency_converter import CURRENCY_FILE
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .cache import atomic_write, cache_dir
+
+
+class DailyRates:
+    # Rates of one currency against EUR, one slot per calendar day starting at
+    # first_date. Days without a published rate are linearly interpolated from
+    # the closest published rates, matching CurrencyConverter.
+    def __init__(self, first_date: dt.date, rates: array) -> None:
+        self._first_ordinal: int = first_date.toordinal()
+        self._rates: array = rates
+
+    @property
+    def first_date(self) -> dt.date:
+        return dt.date.fromordinal(self._first_ordinal)
+
+    @property
+    def last_date(self) -> dt.date:
+        return dt.date.fromordinal(self._first_ordinal + len(self._rates) - 1)
+
+    def rate(self, date: dt.date) -> float:
+        # Dates outside of the published range use the closest bound.
+        offset = date.toordinal() - self._first_ordinal
+        offset = min(max(offset, 0), len(self._rates) - 1)
+        return self._rates[offset]
+
+    @classmethod
+    def from_published(cls, published: Dict[dt.date, float]) -> "DailyRates":
+        first_date = min(published)
+        last_date = max(published)
+        days = (last_date - first_date).days + 1
+
+        rates = array("d", [0.0]) * days
+        known = [False] * days
+        for date, rate in published.items():
+            offset = (date - first_date).days
+            rates[offset] = rate
+            known[offset] = True
+
+        # Distance to, and value of, the closest published rate on each side.
+        before = [(0.0, 0)] * days
+        after = [(0.0, 0)] * days
+
+        for offset in range(days):
+            if known[offset]:
+                closest, distance = rates[offset], 0
+            else:
+                distance += 1
+                before[offset] = (closest, distance)
+
+        for offset in reversed(range(days)):
+            if known[offset]:
+                closest, distance = rates[offset], 0
+            else:
+                distance += 1
+                after[offset] = (closest, distance)
+
+        for offset in range(days):
+            if not known[offset]:
+                (r0, d0), (r1, d1) = before[offset], after[offset]
+                rates[offset] = (r0 * d1 + r1 * d0) / (d0 + d1)
+
+        return cls(first_date, rates)
+
+
+class ExchangeRates:
+    REFERENCE_CURRENCY: str = "EUR"
+
+    def __init__(self, rates: Dict[str, DailyRates]) -> None:
+        self._rates: Dict[str, DailyRates] = rates
+
+    def convert(
+        self,
+        amount: float,
+        currency: str,
+        new_currency: str,
+        date: Optional[dt.date] = None,
+    ) -> float:
+        if date is None:
+            date = self._rates[currency].last_date
+        elif isinstance(date, dt.datetime):
+            date = date.date()
+
+        return amount / self._rate(currency, date) * self._rate(new_currency, date)
+
+    def convert_many(
+        self,
+        amounts: Sequence[float],
+        currency: str,
+        new_currency: str,
+        dates: Sequence[Optional[dt.date]],
+    ) -> List[float]:
+        # Each distinct date is resolved once, then every amount is converted
+        # in a single pass.
+        rates: Dict[Optional[dt.date], Tuple[float, float]] = {}
+        for date in set(dates):
+            lookup_date = date
+            if lookup_date is None:
+                lookup_date = self._rates[currency].last_date
+            elif isinstance(lookup_date, dt.datetime):
+                lookup_date = lookup_date.date()
+            rates[date] = (
+                self._rate(currency, lookup_date),
+                self._rate(new_currency, lookup_date),
+            )
+
+        return [
+            amount / rates[date][0] * rates[date][1]
+            for amount, date in zip(amounts, dates)
+        ]
+
+    def _rate(self, currency: str, date: dt.date) -> float:
+        if currency == self.REFERENCE_CURRENCY:
+            return 1.0
+        return self._rates[currency].rate(date)
+
+    @classmethod
+    def from_lines(
+        cls, lines: Iterable[str], currencies: Iterable[str] = ("USD", "JPY")
+    ) -> "ExchangeRates":
+        published: Dict[str, Dict[dt.date, float]] = {
+            currency: {} for currency in currencies
+        }
+
+        reader = csv.reader(lines)
+        header = [column.strip() for column in next(reader)]
+        columns = {currency: header.index(currency) for currency in published}
+
+        for row in reader:
+            if not row:
+                continue
+            date = dt.date.fromisoformat(row[0].strip())
+            for currency, column in columns.items():
+                value = row[column].strip()
+                if value and value != "N/A":
+                    published[currency][date] = float(value)
+
+        return cls(
+            {
+                currency: DailyRates.from_published(rates)
+                for currency, rates in published.items()
+            }
+        )
+
+    @classmethod
+    def from_zip(cls, content: bytes) -> "ExchangeRates":
+        with zipfile.ZipFile(io.BytesIO(content)) as z:
+            text = z.read(z.namelist()[0]).decode("utf-8")
+        return cls.from_lines(text.splitlines())
+
+
+class ExchangeRateStore:
+    # Loads ECB rates the first time a conversion is needed. Rates are read
+    # from a local copy of the ECB history, which is refreshed in the
+    # background once it is older than max_age, also while long running
+    # processes like --every_n_days keep converting. Without a local copy or
+    # network access, the history bundled with currency_converter is used.
+    # Failed refreshes are tried again after at most an hour.
+    _RETRY_SECONDS: float = 60 * 60
+
+    def __init__(
+        self,
+        cache_file: Optional[str] = None,
+        max_age: Optional[dt.timedelta] = None,
+        url: str = ECB_URL,
+        download_timeout: float = 30,
+    ) -> None:
+        if cache_file is None:
+            cache_file = os.getenv(
+                "EXCHANGE_RATE_CACHE_FILE",
+                os.path.join(cache_dir(), "eurofxref-hist.zip"),
+            )
+        if max_age is None:
+            max_age = dt.timedelta(
+                hours=float(os.getenv("EXCHANGE_RATE_MAX_AGE_HOURS", "24"))
+            )
+
+        self._cache_file: str = cache_file
+        self._max_age: dt.timedelta = max_age
+        self._url: str = url
+        self._download_timeout: float = download_timeout
+        self._rates: Optional[ExchangeRates] = None
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        # time.time() at which the rates are stale and refreshed next.
+        self._refresh_at: float = 0
+
+    def convert(
+        self,
+        amount: float,
+        currency: str,
+        new_currency: str,
+        date: Optional[dt.date] = None,
+    ) -> float:
+        return self.rates().convert(amount, currency, new_currency, date)
+
+    def convert_many(
+        self,
+        amounts: Sequence[float],
+        currency: str,
+        new_currency: str,
+        dates: Sequence[Optional[dt.date]],
+    ) -> List[float]:
+        return self.rates().convert_many(amounts, currency, new_currency, dates)
+
+    def rates(self) -> ExchangeRates:
+        if self._rates is None:
+            with self._lock:
+                if self._rates is None:
+                    self._rates = self._load()
+        elif time.time() >= self._refresh_at:
+            with self._lock:
+                if time.time() >= self._refresh_at:
+                    self._start_refresh()
+        return self._rates
+
+    def wait_for_refresh(self, timeout: Optional[float] = None) -> None:
+        if self._refresh_thread:
+            self._refresh_thread.join(timeout)
+
+    def _load(self) -> ExchangeRates:
+        if os.path.exists(self._cache_file):
+            self._refresh_at = (
+                os.path.getmtime(self._cache_file) + self._max_age.total_seconds()
+            )
+            if time.time() >= self._refresh_at:
+                self._start_refresh()
+
+            with open(self._cache_file, "rb") as f:
+                return ExchangeRates.from_zip(f.read())
+
+        try:
+            rates = self._download()
+            self._refresh_at = time.time() + self._max_age.total_seconds()
+            return rates
+        except Exception as e:
+            print(f"Could not download exchange rates ({e}). Using bundled rates.")
+            self._refresh_at = time.time() + self._retry_seconds()
+
+        with open(CURRENCY_FILE, "rb") as f:
+            return ExchangeRates.from_zip(f.read())
+
+    def _start_refresh(self) -> None:
+        # Called with the lock held. The rates are not stale again until the
+        # refresh has finished or failed.
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        self._refresh_at = float("inf")
+        self._refresh_thread = threading.Thread(target=self._refresh, daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh(self) -> None:
+        try:
+            rates = self._download()
+        except Exception as e:
+            print(f"Could not refresh exchange rates ({e}). Using cached rates.")
+            self._refresh_at = time.time() + self._retry_seconds()
+            return
+
+        self._rates = rates
+        self._refresh_at = time.time() + self._max_age.total_seconds()
+
+    def _retry_seconds(self) -> float:
+        return min(self._RETRY_SECONDS, self._max_age.total_seconds())
+
+    def _download(self) -> ExchangeRates:
+        with urllib.request.urlopen(self._url, timeout=self._download_timeout) as r:
+            content = r.read()
+
+        # Parse before caching so a bad download never replaces a good file.
+        rates = ExchangeRates.from_zip(content)
+        atomic_write(self._cache_file, content)
+        return rates
+
+
+_default_store: Optional[ExchangeRateStore] = None
+_default_store_lock = threading.Lock()
+
+
+def default_store() -> ExchangeRateStore:
+    # Crawler and PDF threads convert at the same time. Only one of them may
+    # create the store, or each would start its own download.
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = ExchangeRateStore()
+    return _default_store
@@ -0,0 +1,181 @@
+import contextlib
+import dataclasses
+import datetime as dt
+import json
+import os
+import re
+import threading
+import time
+
+from typing import Any, Dict, Iterator, List, Optional
+
+from .cache import atomic_write, cache_dir
+from .profiling import Profiler
+from .timeline import Timeline
+
+# Upper bounds, in seconds, of the histogram buckets.
+_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_METRIC_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+@dataclasses.dataclass(frozen=False)
+class Histogram:
+    values: List[float] = dataclasses.field(default_factory=list)
+
+    def percentile(self, p: float) -> float:
+        if not self.values:
+            return 0
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": len(self.values),
+            "sum": sum(self.values),
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.percentile(1),
+        }
+
+    def buckets(self) -> List[int]:
+        # Cumulative counts of values up to each bound of _BUCKETS.
+        return [sum(1 for value in self.values if value <= bound) for bound in _BUCKETS]
+
+
+class Instrumentation:
+    # Phases, counters and latency histograms of a single run of do_sync or
+    # import_pdfs. Counters and histograms may be updated from the crawler
+    # threads. The finished run is written as a JSON report and, when a file
+    # is configured, in the Prometheus text format for the node exporter's
+    # textfile collector. With a profiler, the profiled sections of the run
+    # are CPU and memory profiled as well.
+    def __init__(self, run: str = "sync", profiler: Optional[Profiler] = None):
+        self.run: str = run
+        self.profiler: Optional[Profiler] = profiler
+        self.started_at: dt.datetime = dt.datetime.now()
+        self.timeline: Timeline = Timeline()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.error: Optional[str] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def phase(self, name: str) -> contextlib.AbstractContextManager:
+        return self.timeline.span(name)
+
+    def profiled(self, name: str) -> contextlib.AbstractContextManager:
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(name)
+
+    def count(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms.setdefault(name, Histogram()).values.append(seconds)
+
+    @contextlib.contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "run": self.run,
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "error": self.error,
+                "phases": [
+                    {"name": name, "start": start, "end": end, "seconds": end - start}
+                    for name, start, end in sorted(
+                        self.timeline.spans, key=lambda span: span[1]
+                    )
+                ],
+                "counters": dict(self.counters),
+                "histograms": {
+                    name: histogram.summary()
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def prometheus(self) -> str:
+        lines: List[str] = []
+        prefix = f"zaim_to_monarch_{self.run}"
+
+        def metric(name: str) -> str:
+            return _METRIC_NAME_RE.sub("_", f"{prefix}_{name}").lower()
+
+        with self._lock:
+            lines.append(f"# TYPE {metric('success')} gauge")
+            lines.append(f"{metric('success')} {0 if self.error else 1}")
+            lines.append(f"# TYPE {metric('started_timestamp_seconds')} gauge")
+            lines.append(
+                f"{metric('started_timestamp_seconds')} {self.started_at.timestamp():.0f}"
+            )
+
+            phase_seconds: Dict[str, float] = {}
+            for name, start, end in self.timeline.spans:
+                phase_seconds[name] = phase_seconds.get(name, 0) + end - start
+            lines.append(f"# TYPE {metric('phase_seconds')} gauge")
+            for name, seconds in sorted(phase_seconds.items()):
+                lines.append(f'{metric("phase_seconds")}{{phase="{name}"}} {seconds:.3f}')
+
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {metric(name)} gauge")
+                lines.append(f"{metric(name)} {value:g}")
+
+            for name, histogram in sorted(self.histograms.items()):
+                name = metric(name)
+                lines.append(f"# TYPE {name} histogram")
+                for bound, count in zip(_BUCKETS, histogram.buckets()):
+                    lines.append(f'{name}_bucket{{le="{bound:g}"}} {count}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {len(histogram.values)}')
+                lines.append(f"{name}_sum {sum(histogram.values):.6f}")
+                lines.append(f"{name}_count {len(histogram.values)}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(
+        self, report_dir: Optional[str] = None, prometheus_file: Optional[str] = None
+    ) -> str:
+        # Returns the path of the JSON report. Reports go to report_dir, then
+        # SYNC_REPORT_DIR, then the reports directory in the cache directory.
+        # The Prometheus file, from prometheus_file or SYNC_PROMETHEUS_FILE,
+        # is replaced by every run.
+        report_dir = report_dir or os.getenv("SYNC_REPORT_DIR") or os.path.join(
+            cache_dir(), "reports"
+        )
+        path = os.path.join(
+            report_dir,
+            f"{self.run}-{self.started_at.strftime('%Y%m%d-%H%M%S')}.json",
+        )
+        atomic_write(path, json.dumps(self.report(), indent=2).encode("utf-8"))
+
+        prometheus_file = prometheus_file or os.getenv("SYNC_PROMETHEUS_FILE")
+        if prometheus_file:
+            atomic_write(prometheus_file, self.prometheus().encode("utf-8"))
+
+        return path
+
+    def __str__(self) -> str:
+        lines = [str(self.timeline)]
+        if self.counters:
+            lines.append("Counters:")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"  {name:<32} {value:g}")
+        if self.histograms:
+            lines.append("Latencies:")
+            for name, histogram in sorted(self.histograms.items()):
+                summary = histogram.summary()
+                lines.append(
+                    f"  {name:<32} n={summary['count']} "
+                    f"p50={summary['p50'] * 1000:.0f}ms "
+                    f"p95={summary['p95'] * 1000:.0f}ms "
+                    f"max={summary['max'] * 1000:.0f}ms"
+                )
+        return "\n".join(lines)
@@ -0,0 +1,122 @@
+import datetime as dt
+import hashlib
+import os
+import sqlite3
+import threading
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from .cache import cache_dir
+
+
+class SyncLedger:
+    # Records every zaim transaction that has been synced to monarch, with a
+    # hash of the content it was synced with. A transaction whose zaim_id and
+    # content hash are in the ledger does not need to be compared against
+    # monarch again.
+    _SCHEMA_VERSION: int = 1
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        if path is None:
+            path = os.getenv("SYNC_LEDGER_FILE") or os.path.join(
+                cache_dir(), "ledger.sqlite3"
+            )
+
+        self._path: str = path
+        self._lock = threading.Lock()
+
+        try:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._create_schema()
+        except sqlite3.DatabaseError as e:
+            # An unreadable ledger is replaced, which means a full sync.
+            print(f"Sync ledger {path} is unreadable ({e}). Starting a new one.")
+            self._connection.close()
+            os.remove(path)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._create_schema()
+
+    @staticmethod
+    def content_hash(date: dt.date, merchant: str, amount_jpy: float) -> str:
+        content = f"{date.isoformat()}|{merchant}|{int(round(amount_jpy))}"
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=8).hexdigest()
+
+    def is_unchanged(self, account_name: str, zaim_id: str, content_hash: str) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content_hash FROM synced WHERE account = ? AND zaim_id = ?",
+                (account_name, zaim_id),
+            ).fetchone()
+        return row is not None and row[0] == content_hash
+
+    def record(
+        self,
+        account_name: str,
+        account_id: str,
+        synced: Iterable[Tuple[str, str, str]],
+    ) -> None:
+        # synced holds (zaim_id, monarch_id, content_hash) tuples.
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO accounts (name, monarch_id) VALUES (?, ?)",
+                (account_name, account_id),
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO synced (account, zaim_id, monarch_id, content_hash) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    (account_name, zaim_id, monarch_id, content_hash)
+                    for zaim_id, monarch_id, content_hash in synced
+                ),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM synced").fetchone()[0]
+
+    def check_consistency(self, account_ids: Dict[str, str]) -> bool:
+        # The ledger can only be trusted if it is intact and every account it
+        # has synced still exists in monarch under the same id.
+        with self._lock:
+            if self._connection.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                return False
+
+            for name, monarch_id in self._connection.execute(
+                "SELECT name, monarch_id FROM accounts"
+            ):
+                if account_ids.get(name) != monarch_id:
+                    return False
+
+        return True
+
+    def reset(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM synced")
+            self._connection.execute("DELETE FROM accounts")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _create_schema(self) -> None:
+        with self._lock, self._connection:
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+
+            if version != self._SCHEMA_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS synced")
+                self._connection.execute("DROP TABLE IF EXISTS accounts")
+
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS synced ("
+                "account TEXT NOT NULL, "
+                "zaim_id TEXT NOT NULL, "
+                "monarch_id TEXT NOT NULL, "
+                "content_hash TEXT NOT NULL, "
+                "PRIMARY KEY (account, zaim_id))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS accounts ("
+                "name TEXT PRIMARY KEY, "
+                "monarch_id TEXT NOT NULL)"
+            )
+            self._connection.execute(f"PRAGMA user_version = {self._SCHEMA_VERSION}")
@@ -1,12 +1,52 @@
+import asyncio
+import dataclasses
 import datetime as dt
 import os
 import re
+import time
 
 from dateutil.relativedelta import relativedelta
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
 from .account_data import Account, Amount, Day, Month, Transaction, Year
-from .monarchmoney import MonarchMoney
+from .change_plan import AccountChange, ChangePlan, TransactionChange
+from .instrumentation import Instrumentation
+from .ledger import SyncLedger
+from .monarch_batch import MonarchBatch
+from .monarch_client import RateLimitedMonarchMoney
+from .monarchmoney import MonarchMoney, MonarchMoneyEndpoints
+
+
+@dataclasses.dataclass(frozen=False)
+class PushStats:
+    created: int = 0
+    updated: int = 0
+    elapsed: float = 0
+    latencies: List[float] = dataclasses.field(default_factory=list)
+
+    def record(self, created: bool, latency: float) -> None:
+        if created:
+            self.created += 1
+        else:
+            self.updated += 1
+        self.latencies.append(latency)
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def __str__(self) -> str:
+        total = self.created + self.updated
+        throughput = total / self.elapsed if self.elapsed > 0 else 0
+        return (
+            f"Pushed {total} transactions ({self.created} created, {self.updated} updated) "
+            f"in {self.elapsed:.1f}s ({throughput:.1f}/s). "
+            f"Latency p50: {self.percentile(0.5) * 1000:.0f}ms "
+            f"p95: {self.percentile(0.95) * 1000:.0f}ms "
+            f"max: {self.percentile(1) * 1000:.0f}ms"
+        )
 
 
 class Monarch:
@@ -18,76 +58,459 @@ class Monarch:
 
     _TRANSACTION_CATEGORY: str = "zaim-to-monarch"
 
-    def __init__(self, mm=MonarchMoney()) -> None:
-        self._mm: MonarchMoney = mm
+    def __init__(
+        self,
+        mm=MonarchMoney(),
+        push_concurrency: Optional[int] = None,
+        ledger: Optional[SyncLedger] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        batch_size: Optional[int] = None,
+        rate_limit: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ) -> None:
+        self._instrumentation: Instrumentation = instrumentation or Instrumentation()
+        # Every monarch call is rate limited, and retried when it fails
+        # transiently.
+        self._mm: RateLimitedMonarchMoney = RateLimitedMonarchMoney(
+            mm,
+            max_rate=rate_limit,
+            max_retries=max_retries,
+            instrumentation=self._instrumentation,
+        )
         self._accounts: Dict[str, Account] = {}
         self._transaction_category_id = ""
+        # (account name, year, month) of every month already pulled from monarch.
+        self._loaded_months: Set[Tuple[str, int, int]] = set()
+        # Names of existing accounts whose balance changed since the last push.
+        self._balance_changed: Set[str] = set()
+
+        self._ledger: Optional[SyncLedger] = ledger
+        # (account name, date, zaim_id, content hash) of imported transactions
+        # that are not in the ledger yet.
+        self._unrecorded: List[Tuple[str, dt.date, str, str]] = []
+        self.ledger_skipped: int = 0
+
+        if push_concurrency is None:
+            push_concurrency = int(os.getenv("MONARCH_PUSH_CONCURRENCY", "1"))
+        self._push_concurrency: int = max(1, push_concurrency)
+        self.push_stats: PushStats = PushStats()
+
+        # Transactions created or updated per request. Larger batches take
+        # fewer round trips, smaller ones lose less to a failing request.
+        if batch_size is None:
+            batch_size = int(os.getenv("MONARCH_BATCH_SIZE", "1"))
+        self._batch_size: int = max(1, batch_size)
+        self._batch: MonarchBatch = MonarchBatch(self._mm)
 
     async def login(self) -> None:
         username = os.getenv("MONARCH_USERNAME")
         password = os.getenv("MONARCH_PASSWORD")
         mfa_key = os.getenv("MONARCH_MFA_KEY")
-        await self._mm.login(username, password, mfa_secret_key=mfa_key)
+        base_url = os.getenv("MONARCH_BASE_URL")
+        if base_url:
+            # Another server, like benchmarks/monarch_server.py. Its session
+            # must not be saved over, or reused as, the real one.
+            MonarchMoneyEndpoints.BASE_URL = base_url.rstrip("/")
+            await self._mm.login(
+                username,
+                password,
+                use_saved_session=False,
+                save_session=False,
+                mfa_secret_key=mfa_key,
+            )
+        else:
+            await self._mm.login(username, password, mfa_secret_key=mfa_key)
 
         await self._get_accounts()
 
+        if self._ledger is not None and not self._ledger.check_consistency(
+            {name: account.id for name, account in self._accounts.items()}
+        ):
+            print("Sync ledger does not match monarch accounts. Running a full sync.")
+            self._ledger.reset()
+
     async def import_account(self, incoming_account: Account) -> None:
-        if not incoming_account.name in self._accounts:
-            self._accounts[incoming_account.name] = Account(
-                name=incoming_account.name,
-                id="",
-                balance=incoming_account.balance,
-                years={},
-            )
+        await self.import_accounts([incoming_account])
+
+    async def import_accounts(self, incoming_accounts: List[Account]) -> None:
+        months_to_pull: Dict[str, Set[Tuple[int, int]]] = {}
+        to_import: List[Tuple[Account, List[Transaction]]] = []
+
+        for incoming_account in incoming_accounts:
+            if not incoming_account.name in self._accounts:
+                self._accounts[incoming_account.name] = Account(
+                    name=incoming_account.name,
+                    id="",
+                    balance=incoming_account.balance,
+                    years={},
+                )
 
-        monarch_account = self._accounts[incoming_account.name]
+            monarch_account = self._accounts[incoming_account.name]
 
-        if incoming_account.balance:
-            monarch_account.balance = incoming_account.balance
-            if monarch_account.id:
-                await self._update_account_balance(monarch_account)
+            if incoming_account.balance:
+                monarch_account.balance = incoming_account.balance
+                if monarch_account.id:
+                    self._balance_changed.add(monarch_account.name)
 
-        for incoming_year in incoming_account.years.values():
-            year: int = incoming_year.year
+            incoming_transactions: List[Transaction] = []
 
-            if not year in monarch_account.years:
-                monarch_account.years[year] = Year(year, {})
+            for incoming_year in incoming_account.years.values():
+                for incoming_month in incoming_year.months.values():
+                    for incoming_day in incoming_month.days.values():
+                        for incoming_transaction in incoming_day.transactions:
+                            if self._is_synced(incoming_account.name, incoming_transaction):
+                                self.ledger_skipped += 1
+                                self._instrumentation.count("ledger_skipped_transactions")
+                                continue
+                            incoming_transactions.append(incoming_transaction)
 
-            monarch_account_year = monarch_account.years[year]
+            to_import.append((monarch_account, incoming_transactions))
 
-            for incoming_month in incoming_year.months.values():
-                month: int = incoming_month.month
+            # New accounts have nothing to pull yet.
+            if not monarch_account.id:
+                continue
 
-                if not month in monarch_account_year.months:
-                    await self._pull_monarch_transactions(monarch_account, year, month)
+            for incoming_transaction in incoming_transactions:
+                date = incoming_transaction.date
+                key = (incoming_account.name, date.year, date.month)
+                if not key in self._loaded_months:
+                    months_to_pull.setdefault(incoming_account.name, set()).add(
+                        key[1:]
+                    )
+
+        for start_date, end_date, account_names in self._plan_pulls(months_to_pull):
+            await self._pull_monarch_transactions(
+                [self._accounts[name] for name in account_names], start_date, end_date
+            )
 
-                for incoming_day in incoming_month.days.values():
-                    for incoming_transaction in incoming_day.transactions:
-                        monarch_account.add_transaction(incoming_transaction)
+        # Every transaction either matches a row of its account or becomes a
+        # new one, so the rows added tell them apart.
+        tables = {id(account.table): account.table for account, _ in to_import}
+        rows_before = sum(len(table) for table in tables.values())
+        imported = sum(len(transactions) for _, transactions in to_import)
+
+        with self._instrumentation.timed(
+            "merge_seconds"
+        ), self._instrumentation.profiled("merge"):
+            for monarch_account, incoming_transactions in to_import:
+                for incoming_transaction in incoming_transactions:
+                    monarch_account.add_transaction(incoming_transaction)
+
+        added = sum(len(table) for table in tables.values()) - rows_before
+        self._instrumentation.count("imported_transactions", imported)
+        self._instrumentation.count("imported_new_transactions", added)
+        self._instrumentation.count("imported_matched_transactions", imported - added)
+
+    def _is_synced(self, account_name: str, transaction: Transaction) -> bool:
+        if self._ledger is None or not transaction.zaim_id:
+            return False
+
+        content_hash = SyncLedger.content_hash(
+            transaction.date, transaction.merchant, transaction.amount.jpy
+        )
+        if self._ledger.is_unchanged(account_name, transaction.zaim_id, content_hash):
+            return True
+
+        self._unrecorded.append(
+            (account_name, transaction.date, transaction.zaim_id, content_hash)
+        )
+        return False
+
+    def _record_synced(self) -> None:
+        # Every imported transaction that now exists unchanged in monarch is
+        # added to the ledger, whether it was pushed by this run or not.
+        synced: Dict[str, List[Tuple[str, str, str]]] = {}
+        unrecorded: List[Tuple[str, dt.date, str, str]] = []
+
+        for account_name, date, zaim_id, content_hash in self._unrecorded:
+            account = self._accounts[account_name]
+            row = account.table.first_by_zaim_id(date, zaim_id)
+
+            if (
+                row is None
+                or not account.table.monarch_id(row)
+                or account.table.dirty(row)
+            ):
+                unrecorded.append((account_name, date, zaim_id, content_hash))
+                continue
+
+            synced.setdefault(account_name, []).append(
+                (zaim_id, account.table.monarch_id(row), content_hash)
+            )
+
+        for account_name, transactions in synced.items():
+            self._ledger.record(
+                account_name, self._accounts[account_name].id, transactions
+            )
+
+        self._unrecorded = unrecorded
 
     def accounts(self) -> Dict[str, Account]:
         return self._accounts
 
+    def release_transactions(self) -> None:
+        # Drops every transaction once it has been pushed so that a streaming
+        # sync only holds the months in flight. Released months are pulled
+        # again if they are imported later.
+        for name, account in self._accounts.items():
+            self._accounts[name] = Account(
+                name=account.name, id=account.id, balance=account.balance, years={}
+            )
+        self._loaded_months.clear()
+        self._unrecorded.clear()
+
     async def push(self, dry_run=True) -> None:
+        plan = await self.plan()
+        if dry_run:
+            print(plan)
+            return
+        await self.apply(plan)
+
+    async def plan(self) -> ChangePlan:
+        # Works out every change push would make, without making any.
+        plan = ChangePlan()
+        pending: List[Tuple[Account, Transaction]] = []
+
         for account in self._accounts.values():
+            balance_usd = account.balance.usd if account.balance else 0
             if not account.id:
-                print(
-                    f"Creating new monarch account: {account.name} Balance: {account.balance}"
+                plan.accounts_to_create.append(
+                    AccountChange(account.name, "", balance_usd)
+                )
+            elif account.name in self._balance_changed:
+                plan.balance_updates.append(
+                    AccountChange(account.name, account.id, balance_usd)
                 )
-                if not dry_run:
-                    await self._push_new_account(account)
 
             for year in account.years.values():
                 for month in year.months.values():
                     for day in month.days.values():
                         for transaction in day.transactions:
                             if transaction.needs_push_to_monarch:
+                                pending.append((account, transaction))
+
+        # Only the amounts that are actually pushed are converted to USD.
+        Transaction.resolve_amounts([transaction for _, transaction in pending])
+
+        for account, transaction in pending:
+            change = TransactionChange(
+                account_name=account.name,
+                monarch_id=transaction.monarch_id,
+                date=self._format_date(transaction.date),
+                amount_usd=transaction.amount.usd,
+                merchant=transaction.merchant,
+                notes=self._create_transaction_notes(transaction),
+                transaction=transaction,
+            )
+            if change.monarch_id:
+                plan.transactions_to_update.append(change)
+            else:
+                plan.transactions_to_create.append(change)
+
+        if plan.transactions_to_create:
+            await self.find_transaction_category()
+            plan.category_id = self._transaction_category_id
+
+        return plan
+
+    async def apply(self, plan: ChangePlan) -> None:
+        # Makes exactly the changes of the plan. Plans loaded from a file may
+        # be applied by a process that never imported any transactions.
+        # Created transactions get their ids in the plan, so a plan saved
+        # after a failed apply only updates them when it is applied again.
+        if plan.applied_at:
+            raise ValueError(f"The plan was already applied at {plan.applied_at}.")
+
+        planned = {change.name for change in plan.accounts_to_create}
+        for change in plan.transactions_to_create + plan.transactions_to_update:
+            account = self._accounts.get(change.account_name)
+            if change.account_name not in planned and not (account and account.id):
+                raise ValueError(
+                    f"Monarch account {change.account_name} of the plan does not exist."
+                )
+
+        # Accounts are created up front so every queued transaction already
+        # has the id of the account it belongs to.
+        for change in plan.accounts_to_create:
+            await self._push_new_account(change)
+
+        for change in plan.balance_updates:
+            await self._update_account_balance(change.id, change.balance_usd)
+        self._balance_changed.clear()
+
+        if plan.category_id:
+            self._transaction_category_id = plan.category_id
+
+        failures: List[Tuple[TransactionChange, str]] = []
+        changes = plan.transactions_to_create + plan.transactions_to_update
+        try:
+            if changes:
+                with self._instrumentation.profiled("push"):
+                    failures = await self._push_transactions(changes)
+        finally:
+            # Transactions pushed before a failure are recorded all the same,
+            # even when an error ended the push.
+            if self._ledger is not None:
+                self._record_synced()
+
+        if failures:
+            change, error = failures[0]
+            raise RuntimeError(
+                f"Failed to push {len(failures)} of {len(changes)} transactions. "
+                f"First failure: {change}: {error}"
+            )
+
+        plan.applied_at = dt.datetime.now().isoformat(timespec="seconds")
+
+    async def _push_transactions(
+        self, changes: List[TransactionChange]
+    ) -> List[Tuple[TransactionChange, str]]:
+        # Returns the changes that failed, with their errors.
+        # Resolve the category before any workers start so that concurrent
+        # creates cannot race to create the category more than once.
+        if not self._transaction_category_id and any(
+            not change.monarch_id for change in changes
+        ):
+            await self._find_transaction_category_id()
 
-                                await self._update_transaction(
-                                    account.id, transaction, dry_run
-                                )
+        queue: asyncio.Queue = asyncio.Queue()
+        for change in changes:
+            queue.put_nowait(change)
+
+        stats = PushStats()
+        failures: List[Tuple[TransactionChange, str]] = []
+        start = time.perf_counter()
+
+        # The order that matters within an account is kept by apply: the
+        # account is created and its balance set before any of its
+        # transactions are queued. The changes themselves are pushed in no
+        # particular order. A plan touches every transaction at most once,
+        # each carries its own date and amount, and creates do not update the
+        # balance, so any order leaves monarch the same. Keeping an account
+        # on one worker would push most syncs, which have a single account,
+        # one change at a time.
+        batches = -(-len(changes) // self._batch_size)
+        workers = [
+            asyncio.create_task(self._push_worker(queue, stats, failures))
+            for _ in range(min(self._push_concurrency, batches))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            # gather leaves the other workers running. Stop them so nothing
+            # is pushed after the push failed.
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+
+        stats.elapsed = time.perf_counter() - start
+        self.push_stats = stats
+
+        print(stats)
+        print(self._mm.summary())
+        return failures
+
+    async def _push_worker(
+        self,
+        queue: asyncio.Queue,
+        stats: PushStats,
+        failures: List[Tuple[TransactionChange, str]],
+    ) -> None:
+        while not queue.empty():
+            if self._batch_size > 1:
+                batch: List[TransactionChange] = []
+                while len(batch) < self._batch_size and not queue.empty():
+                    batch.append(queue.get_nowait())
+                await self._push_batch(batch, stats, failures)
+                continue
 
-        return
+            change = queue.get_nowait()
+
+            created = not change.monarch_id
+            call_start = time.perf_counter()
+
+            # A change that fails on its own does not stop the others, like
+            # a failed mutation of a batch.
+            try:
+                await self._update_transaction(change)
+            except Exception as e:
+                print(f"Failed to push transaction: {change}: {e!r}")
+                failures.append((change, repr(e)))
+                self._instrumentation.count("monarch_push_failures")
+                continue
+
+            self._record_push(stats, created, time.perf_counter() - call_start)
+
+    async def _push_batch(
+        self,
+        changes: List[TransactionChange],
+        stats: PushStats,
+        failures: List[Tuple[TransactionChange, str]],
+    ) -> None:
+        mutations = []
+        for change in changes:
+            if change.monarch_id:
+                print(f"Updating transaction: {change}")
+                mutations.append(
+                    (
+                        "update",
+                        MonarchBatch.update_input(
+                            change.monarch_id, change.merchant, change.notes
+                        ),
+                    )
+                )
+            else:
+                print(f"Creating new transaction: {change}")
+                mutations.append(
+                    (
+                        "create",
+                        MonarchBatch.create_input(
+                            date=change.date,
+                            account_id=self._accounts[change.account_name].id,
+                            amount=change.amount_usd,
+                            merchant_name=change.merchant,
+                            category_id=self._transaction_category_id,
+                            notes=change.notes,
+                        ),
+                    )
+                )
+
+        # A request that fails as a whole fails every change of the batch,
+        # like a failed change of an unbatched push. The other batches go on.
+        call_start = time.perf_counter()
+        try:
+            results = await self._batch.mutate(mutations)
+        except Exception as e:
+            print(f"Failed to push a batch of {len(changes)} transactions: {e!r}")
+            for change in changes:
+                failures.append((change, repr(e)))
+            self._instrumentation.count("monarch_push_failures", len(changes))
+            return
+        latency = time.perf_counter() - call_start
+
+        self._instrumentation.count("monarch_batches")
+        self._instrumentation.observe("monarch_batch_seconds", latency)
+
+        for change, result in zip(changes, results):
+            created = not change.monarch_id
+            if result.error:
+                print(f"Failed to push transaction: {change}: {result.error}")
+                failures.append((change, result.error))
+                self._instrumentation.count("monarch_push_failures")
+                continue
+
+            if created:
+                change.monarch_id = result.id
+            self._mark_pushed(change)
+            self._record_push(stats, created, latency)
+
+    def _record_push(self, stats: PushStats, created: bool, latency: float) -> None:
+        # Transactions of a batch all share the latency of its request.
+        stats.record(created, latency)
+        kind = "create" if created else "update"
+        self._instrumentation.count(f"monarch_{kind}s")
+        self._instrumentation.observe(f"monarch_{kind}_seconds", latency)
 
     async def _get_accounts(self) -> None:
         raw_accounts = await self._mm.get_accounts()
@@ -102,11 +525,31 @@ class Monarch:
                 name=name, id=id, balance=Amount(usd=balance), years={}
             )
 
-    async def _push_new_account(self, account: Account) -> None:
+    async def _push_new_account(self, change: AccountChange) -> None:
+        account = self._accounts.get(change.name)
+        if account is None:
+            account = Account(
+                name=change.name,
+                id="",
+                balance=Amount(usd=change.balance_usd),
+                years={},
+            )
+            self._accounts[change.name] = account
+
+        # A plan applied later may find the account created in the meantime.
+        if account.id:
+            print(f"Monarch account {change.name} already exists.")
+            return
+
+        print(
+            f"Creating new monarch account: {change.name} "
+            f"Balance: ${round(change.balance_usd, 2)}"
+        )
+
         account_type = "depository"
         account_subtype = "checking"
         # Very naive way to determine if this is a credit card or bank account.
-        if account.balance.usd < 0:
+        if change.balance_usd < 0:
             account_type = "credit"
             account_subtype = "credit_card"
 
@@ -114,8 +557,8 @@ class Monarch:
             account_type=account_type,
             account_sub_type=account_subtype,
             is_in_net_worth=True,
-            account_name=account.name,
-            account_balance=abs(account.balance.usd),
+            account_name=change.name,
+            account_balance=abs(change.balance_usd),
         )
 
         new_account_id: str = create_account_response["createManualAccount"]["account"][
@@ -123,92 +566,166 @@ class Monarch:
         ]
 
         account.id = new_account_id
-
-    async def _update_transaction(
-        self, account_id: str, transaction: Transaction, dry_run: bool
-    ) -> None:
-        if not dry_run:
-            transaction.needs_push_to_monarch = False
-
-        if transaction.monarch_id:
-            notes: str = self._create_transaction_notes(transaction)
-            print(f"Updating transaction: {transaction}")
-            if not dry_run:
-                await self._mm.update_transaction(
-                    transaction_id=transaction.monarch_id,
-                    merchant_name=transaction.merchant,
-                    notes=notes,
-                )
-            return
-
-        if not self._transaction_category_id:
-            await self._find_transaction_category_id()
-
-        print(f"Creating new transaction: {transaction}")
-
-        if not dry_run:
+        self._instrumentation.count("monarch_accounts_created")
+
+    async def _update_transaction(self, change: TransactionChange) -> None:
+        if change.monarch_id:
+            print(f"Updating transaction: {change}")
+            await self._mm.update_transaction(
+                transaction_id=change.monarch_id,
+                merchant_name=change.merchant,
+                notes=change.notes,
+            )
+        else:
+            print(f"Creating new transaction: {change}")
             create_result = await self._mm.create_transaction(
-                date=self._format_date(transaction.date),
-                account_id=account_id,
-                amount=transaction.amount.usd,
-                merchant_name=transaction.merchant,
+                date=change.date,
+                account_id=self._accounts[change.account_name].id,
+                amount=change.amount_usd,
+                merchant_name=change.merchant,
                 category_id=self._transaction_category_id,
-                notes=self._create_transaction_notes(transaction),
+                notes=change.notes,
             )
-            transaction.monarch_id = create_result["createTransaction"]["transaction"][
-                "id"
+            change.monarch_id = create_result["createTransaction"]["transaction"]["id"]
+
+        self._mark_pushed(change)
+
+    def _mark_pushed(self, change: TransactionChange) -> None:
+        if change.transaction is not None:
+            if change.transaction.monarch_id != change.monarch_id:
+                change.transaction.monarch_id = change.monarch_id
+            change.transaction.needs_push_to_monarch = False
+
+    def _plan_pulls(
+        self, months_to_pull: Dict[str, Set[Tuple[int, int]]]
+    ) -> List[Tuple[dt.date, dt.date, List[str]]]:
+        # Group the requested months into runs of consecutive months and fetch
+        # each run for every account that needs any month of it in one ranged
+        # request. Gaps between runs are not fetched.
+        all_months = sorted(set().union(*months_to_pull.values()))
+
+        runs: List[List[Tuple[int, int]]] = []
+        for year, month in all_months:
+            if runs:
+                last_year, last_month = runs[-1][-1]
+                if (year * 12 + month) - (last_year * 12 + last_month) == 1:
+                    runs[-1].append((year, month))
+                    continue
+            runs.append([(year, month)])
+
+        plan: List[Tuple[dt.date, dt.date, List[str]]] = []
+        for run in runs:
+            account_names = [
+                name
+                for name, months in months_to_pull.items()
+                if any(month in months for month in run)
             ]
 
+            start_year, start_month = run[0]
+            end_year, end_month = run[-1]
+            start_date: dt.date = dt.date(year=start_year, month=start_month, day=1)
+            end_date: dt.date = (
+                dt.date(year=end_year, month=end_month, day=1)
+                + relativedelta(months=1)
+            ) - relativedelta(days=1)
+
+            plan.append((start_date, end_date, account_names))
+
+        return plan
+
     async def _pull_monarch_transactions(
-        self, account: Account, year: int, month: int
+        self, accounts: List[Account], start_date: dt.date, end_date: dt.date
     ) -> None:
+        accounts_by_id: Dict[str, Account] = {
+            account.id: account for account in accounts if account.id
+        }
 
-        if not account.id:
+        if not accounts_by_id:
             return
 
-        start_date: dt.date = dt.datetime(year=year, month=month, day=1).date()
-        end_date: dt.date = (start_date + relativedelta(months=1)) - relativedelta(
-            days=1
-        )
+        with self._instrumentation.profiled("pull"):
+            await self._pull_pages(accounts_by_id, start_date, end_date)
 
-        raw_transactions = await self._mm.get_transactions(
-            limit=self._TRANSACTION_LIMIT,
-            start_date=self._format_date(start_date),
-            end_date=self._format_date(end_date),
-            account_ids=[account.id],
-        )
+        month: dt.date = start_date
+        while month <= end_date:
+            for account in accounts_by_id.values():
+                self._loaded_months.add((account.name, month.year, month.month))
+            month += relativedelta(months=1)
 
-        for raw_transaction in raw_transactions["allTransactions"]["results"]:
-            zaim_id: str = ""
-            amount_jpy: float = 0
+    async def _pull_pages(
+        self, accounts_by_id: Dict[str, Account], start_date: dt.date, end_date: dt.date
+    ) -> None:
+        # Months that were loaded before this pull already hold these rows.
+        already_loaded: Set[Tuple[str, int, int]] = set(self._loaded_months)
+
+        offset: int = 0
+        while True:
+            with self._instrumentation.timed("monarch_pull_seconds"):
+                raw_transactions = await self._mm.get_transactions(
+                    limit=self._TRANSACTION_LIMIT,
+                    offset=offset,
+                    start_date=self._format_date(start_date),
+                    end_date=self._format_date(end_date),
+                    account_ids=list(accounts_by_id.keys()),
+                )
 
-            match = self._TRANSACTION_NOTES_RE.search(raw_transaction["notes"])
-            if not match:
-                print(
-                    f"ERROR: Transaction notes do not match expected format: {raw_transaction['notes']}"
+            results = raw_transactions["allTransactions"]["results"]
+            self._instrumentation.count("monarch_pulls")
+            self._instrumentation.count("monarch_pulled_transactions", len(results))
+
+            for raw_transaction in results:
+                account = accounts_by_id.get(raw_transaction["account"]["id"])
+                if not account:
+                    continue
+
+                date: dt.date = self._parse_date(raw_transaction["date"])
+                if (account.name, date.year, date.month) in already_loaded:
+                    continue
+
+                zaim_id: str = ""
+                amount_jpy: float = 0
+
+                match = self._TRANSACTION_NOTES_RE.search(raw_transaction["notes"])
+                if not match:
+                    print(
+                        f"ERROR: Transaction notes do not match expected format: {raw_transaction['notes']}"
+                    )
+                    continue
+
+                amount_jpy = float(match["amount_jpy"])
+                if match["zaim_id"]:
+                    zaim_id = match["zaim_id"]
+
+                new_transaction = Transaction(
+                    date=date,
+                    merchant=raw_transaction["merchant"]["name"],
+                    amount=Amount(jpy=amount_jpy, usd=raw_transaction["amount"]),
+                    zaim_id=zaim_id,
+                    monarch_id=raw_transaction["id"],
                 )
-                continue
 
-            amount_jpy = float(match["amount_jpy"])
-            if match["zaim_id"]:
-                zaim_id = match["zaim_id"]
+                account.add_transaction(new_transaction)
 
-            new_transaction = Transaction(
-                date=self._parse_date(raw_transaction["date"]),
-                merchant=raw_transaction["merchant"]["name"],
-                amount=Amount(jpy=amount_jpy, usd=raw_transaction["amount"]),
-                zaim_id=zaim_id,
-                monarch_id=raw_transaction["id"],
-            )
+            if len(results) < self._TRANSACTION_LIMIT:
+                break
 
-            account.add_transaction(new_transaction)
+            offset += len(results)
 
-    async def _update_account_balance(self, account: Account) -> None:
+    async def _update_account_balance(
+        self, account_id: str, balance_usd: float
+    ) -> None:
         await self._mm.update_account(
-            account_id=account.id, account_balance=account.balance.usd
+            account_id=account_id, account_balance=balance_usd
         )
+        self._instrumentation.count("monarch_balance_updates")
+
+    async def find_transaction_category(self) -> None:
+        # Looks up the category of created transactions ahead of the first
+        # push. It is only created once a transaction needs it.
+        if not self._transaction_category_id:
+            await self._find_transaction_category_id(create=False)
 
-    async def _find_transaction_category_id(self) -> None:
+    async def _find_transaction_category_id(self, create: bool = True) -> None:
         existing_categories = await self._mm.get_transaction_categories()
 
         for category in existing_categories["categories"]:
@@ -216,6 +733,9 @@ class Monarch:
                 self._transaction_category_id = category["id"]
                 return
 
+        if not create:
+            return
+
         # Otherwise create the correct category
         existing_groups = await self._mm.get_transaction_category_groups()
 
@@ -0,0 +1,146 @@
+import dataclasses
+import functools
+
+from gql import gql
+from gql.transport.exceptions import TransportQueryError
+from graphql import DocumentNode
+from typing import Any, Dict, List, Tuple
+
+from .monarchmoney import MonarchMoney
+
+# Operation name of every batched request.
+OPERATION = "Zaim_BatchTransactionMutations"
+
+# Mutation field and input type of each kind of mutation.
+_MUTATIONS: Dict[str, Tuple[str, str]] = {
+    "create": ("createTransaction", "CreateTransactionMutationInput!"),
+    "update": ("updateTransaction", "UpdateTransactionMutationInput!"),
+}
+
+_PAYLOAD = """{
+    transaction {
+      id
+    }
+    errors {
+      message
+      code
+      fieldErrors {
+        field
+        messages
+      }
+    }
+  }"""
+
+
+def document(kinds: Tuple[str, ...]) -> str:
+    parameters = ", ".join(
+        f"$m{i}: {_MUTATIONS[kind][1]}" for i, kind in enumerate(kinds)
+    )
+    fields = "\n".join(
+        f"  m{i}: {_MUTATIONS[kind][0]}(input: $m{i}) {_PAYLOAD}"
+        for i, kind in enumerate(kinds)
+    )
+    return f"mutation {OPERATION}({parameters}) {{\n{fields}\n}}"
+
+
+# Batches mostly repeat a few shapes, like all creates of the batch size.
+@functools.lru_cache(maxsize=64)
+def _parsed_document(kinds: Tuple[str, ...]) -> DocumentNode:
+    return gql(document(kinds))
+
+
+@dataclasses.dataclass(frozen=False)
+class MutationResult:
+    # Id of the created or updated transaction, empty when it failed.
+    id: str = ""
+    error: str = ""
+
+
+class MonarchBatch:
+    # Sends many createTransaction and updateTransaction mutations as the
+    # aliased fields of one GraphQL document, so they take a single round
+    # trip. Each mutation succeeds or fails on its own. Errors that fail the
+    # whole request, like network errors or throttling, are raised.
+    def __init__(self, mm: MonarchMoney):
+        self._mm: MonarchMoney = mm
+
+    @staticmethod
+    def create_input(
+        date: str,
+        account_id: str,
+        amount: float,
+        merchant_name: str,
+        category_id: str,
+        notes: str,
+    ) -> Dict[str, Any]:
+        # The input MonarchMoney.create_transaction sends.
+        return {
+            "date": date,
+            "accountId": account_id,
+            "amount": round(amount, 2),
+            "merchantName": merchant_name,
+            "categoryId": category_id,
+            "notes": notes,
+            "shouldUpdateBalance": False,
+        }
+
+    @staticmethod
+    def update_input(
+        transaction_id: str, merchant_name: str, notes: str
+    ) -> Dict[str, Any]:
+        # The input MonarchMoney.update_transaction sends for these fields.
+        return {"id": transaction_id, "name": merchant_name, "notes": notes}
+
+    async def mutate(
+        self, mutations: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[MutationResult]:
+        # mutations are (kind, input) pairs, kind being "create" or "update".
+        # Returns a result per mutation, in order.
+        if not mutations:
+            return []
+
+        query = _parsed_document(tuple(kind for kind, _ in mutations))
+        variables = {f"m{i}": input for i, (_, input) in enumerate(mutations)}
+
+        try:
+            data = await self._mm.gql_call(
+                operation=OPERATION, graphql_query=query, variables=variables
+            )
+            errors: List[Dict[str, Any]] = []
+        except TransportQueryError as e:
+            # Some fields failed. The others still return their data.
+            if not e.data:
+                raise
+            data = e.data
+            errors = e.errors or []
+
+        failed: Dict[str, str] = {}
+        for error in errors:
+            path = error.get("path") or []
+            if not path:
+                raise TransportQueryError(str(error), errors=errors, data=data)
+            failed[path[0]] = error.get("message", str(error))
+
+        results: List[MutationResult] = []
+        for i, (kind, _) in enumerate(mutations):
+            alias = f"m{i}"
+            payload = data.get(alias)
+            if alias in failed:
+                results.append(MutationResult(error=failed[alias]))
+            elif not payload:
+                results.append(MutationResult(error="No result returned."))
+            elif payload.get("errors"):
+                results.append(MutationResult(error=self._payload_error(payload)))
+            elif not (payload.get("transaction") or {}).get("id"):
+                results.append(MutationResult(error="No transaction returned."))
+            else:
+                results.append(MutationResult(id=payload["transaction"]["id"]))
+        return results
+
+    @staticmethod
+    def _payload_error(payload: Dict[str, Any]) -> str:
+        errors = payload["errors"]
+        message = errors.get("message") or "Unknown error."
+        for field_error in errors.get("fieldErrors") or []:
+            message += f" {field_error.get('field')}: {field_error.get('messages')}"
+        return message
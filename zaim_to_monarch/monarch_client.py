@@ -0,0 +1,178 @@
+import asyncio
+import os
+import random
+import time
+
+import aiohttp
+
+from gql.transport.exceptions import TransportServerError
+from typing import Any, Dict, Optional
+
+from .instrumentation import Instrumentation
+from .monarchmoney import MonarchMoney
+
+
+def _is_throttled(e: BaseException) -> bool:
+    return isinstance(e, TransportServerError) and e.code == 429
+
+
+def _is_transient(e: BaseException) -> bool:
+    if isinstance(e, TransportServerError):
+        return e.code is None or e.code == 429 or e.code >= 500
+    return isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class RateLimitedMonarchMoney:
+    # Every MonarchMoney call of Monarch goes through here. Calls are spaced
+    # by a token bucket whose rate halves when monarch throttles or slows
+    # down and creeps back up to max_rate while calls succeed. Transient
+    # failures are retried with jittered exponential backoff: every failure
+    # of idempotent calls, and only throttling, which monarch rejects before
+    # doing anything, of calls that create something.
+    _BASE_DELAY: float = 0.5
+    _MAX_DELAY: float = 30
+    _MIN_RATE: float = 0.5
+    _LATENCY_MARGIN: float = 0.05
+
+    def __init__(
+        self,
+        mm: MonarchMoney,
+        max_rate: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        instrumentation: Optional[Instrumentation] = None,
+    ):
+        self._mm: MonarchMoney = mm
+        self.max_rate: float = max_rate or float(
+            os.getenv("MONARCH_RATE_LIMIT", "20")
+        )
+        self.max_retries: int = (
+            max_retries
+            if max_retries is not None
+            else int(os.getenv("MONARCH_MAX_RETRIES", "5"))
+        )
+        self._instrumentation: Instrumentation = instrumentation or Instrumentation()
+
+        # Requests per second, and the tokens of the bucket. The bucket holds
+        # at most a second worth of requests.
+        self.rate: float = self.max_rate
+        self._tokens: float = self.max_rate
+        self._updated: float = time.monotonic()
+        self._lock: asyncio.Lock = asyncio.Lock()
+        # Smoothed latency per operation and the lowest it has been.
+        self._latency: Dict[str, float] = {}
+        self._baseline: Dict[str, float] = {}
+
+        self.retries: int = 0
+        self.throttled: int = 0
+        self.wait_seconds: float = 0
+
+    async def login(self, *args, **kwargs) -> None:
+        await self._call("login", True, *args, **kwargs)
+
+    async def get_accounts(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._call("get_accounts", True, *args, **kwargs)
+
+    async def get_transactions(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._call("get_transactions", True, *args, **kwargs)
+
+    async def get_transaction_categories(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._call("get_transaction_categories", True, *args, **kwargs)
+
+    async def get_transaction_category_groups(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._call(
+            "get_transaction_category_groups", True, *args, **kwargs
+        )
+
+    async def update_account(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._call("update_account", True, *args, **kwargs)
+
+    async def update_transaction(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._call("update_transaction", True, *args, **kwargs)
+
+    async def create_manual_account(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._call("create_manual_account", False, *args, **kwargs)
+
+    async def create_transaction(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._call("create_transaction", False, *args, **kwargs)
+
+    async def create_transaction_category(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._call("create_transaction_category", False, *args, **kwargs)
+
+    async def gql_call(self, *args, **kwargs) -> Dict[str, Any]:
+        # Batches may create transactions.
+        return await self._call("gql_call", False, *args, **kwargs)
+
+    def summary(self) -> str:
+        return (
+            f"Monarch rate limit: {self.retries} retries, {self.throttled} throttled, "
+            f"waited {self.wait_seconds:.1f}s, ended at {self.rate:.1f} requests/s."
+        )
+
+    async def _call(self, name: str, idempotent: bool, *args, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            await self._acquire()
+            start = time.perf_counter()
+            try:
+                result = await getattr(self._mm, name)(*args, **kwargs)
+            except Exception as e:
+                throttled = _is_throttled(e)
+                if throttled:
+                    self.throttled += 1
+                    self._instrumentation.count("monarch_throttled")
+                    self._slow_down()
+
+                retry = throttled or (idempotent and _is_transient(e))
+                if not retry or attempt >= self.max_retries:
+                    raise
+
+                delay = random.uniform(
+                    0, min(self._MAX_DELAY, self._BASE_DELAY * 2**attempt)
+                )
+                attempt += 1
+                self.retries += 1
+                self.wait_seconds += delay
+                self._instrumentation.count("monarch_retries")
+                self._instrumentation.count("monarch_backoff_seconds", delay)
+                print(f"Retrying {name} in {delay:.1f}s after: {e!r}")
+                await asyncio.sleep(delay)
+                continue
+
+            self._succeeded(name, time.perf_counter() - start)
+            return result
+
+    async def _acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+
+            if self._tokens < 1:
+                wait = (1 - self._tokens) / self.rate
+                self.wait_seconds += wait
+                self._instrumentation.count("monarch_rate_limit_seconds", wait)
+                await asyncio.sleep(wait)
+                self._tokens = 1
+                self._updated = time.monotonic()
+
+            self._tokens -= 1
+
+    def _succeeded(self, name: str, latency: float) -> None:
+        smoothed = 0.8 * self._latency.get(name, latency) + 0.2 * latency
+        self._latency[name] = smoothed
+        baseline = min(self._baseline.get(name, smoothed), smoothed)
+        self._baseline[name] = baseline
+
+        # Latency well above the best seen is taken as monarch getting busy.
+        # The margin keeps the jitter of fast calls from counting.
+        slow = 2 * baseline + self._LATENCY_MARGIN
+        if smoothed > slow and latency > slow:
+            self.rate = max(self._MIN_RATE, self.rate * 0.9)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+    def _slow_down(self) -> None:
+        self.rate = max(self._MIN_RATE, self.rate / 2)
+        self._tokens = min(self._tokens, 0)
@@ -0,0 +1,105 @@
+import calendar
+import datetime as dt
+import gzip
+import hashlib
+import json
+import os
+
+from typing import Any, Dict, List, Optional
+
+from .cache import atomic_write, cache_dir
+
+
+class MonthCache:
+    # Parsed zaim rows of whole months, one gzipped JSON file per month under
+    # a directory per zaim user. Only months that ended more than
+    # settled_days ago are read from or written to the cache, newer months
+    # can still change and are always crawled.
+    def __init__(
+        self,
+        user_id: str,
+        directory: Optional[str] = None,
+        settled_days: Optional[int] = None,
+        refresh: bool = False,
+    ):
+        directory = directory or os.getenv("ZAIM_MONTH_CACHE_DIR") or os.path.join(
+            cache_dir(), "months"
+        )
+        user_hash = hashlib.blake2b(
+            (user_id or "").encode("utf-8"), digest_size=8
+        ).hexdigest()
+        self._directory: str = os.path.join(directory, user_hash)
+
+        self.settled_days: int = (
+            settled_days
+            if settled_days is not None
+            else int(os.getenv("ZAIM_MONTH_CACHE_SETTLED_DAYS", "60"))
+        )
+        # Crawl every month again, and replace the cached ones.
+        self.refresh: bool = refresh
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.recent: int = 0
+
+    def is_settled(
+        self, year: int, month: int, today: Optional[dt.date] = None
+    ) -> bool:
+        today = today or dt.date.today()
+        last_day = dt.date(year, month, calendar.monthrange(year, month)[1])
+        return (today - last_day).days > self.settled_days
+
+    def get(
+        self, year: int, month: int, today: Optional[dt.date] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        if not self.is_settled(year, month, today):
+            self.recent += 1
+            return None
+
+        rows = None if self.refresh else self._read(year, month)
+        if rows is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return rows
+
+    def put(
+        self,
+        year: int,
+        month: int,
+        rows: List[Dict[str, Any]],
+        today: Optional[dt.date] = None,
+    ) -> None:
+        if not self.is_settled(year, month, today):
+            return
+
+        encoded = [
+            {**row, "date": row["date"].isoformat()} if "date" in row else row
+            for row in rows
+        ]
+        data = json.dumps(encoded, ensure_ascii=False, separators=(",", ":"))
+        atomic_write(self._path(year, month), gzip.compress(data.encode("utf-8")))
+
+    def summary(self) -> str:
+        return (
+            f"Zaim month cache: {self.hits} hits, {self.misses} misses, "
+            f"{self.recent} recent months crawled."
+        )
+
+    def _path(self, year: int, month: int) -> str:
+        return os.path.join(self._directory, f"{year}-{str(month).zfill(2)}.json.gz")
+
+    def _read(self, year: int, month: int) -> Optional[List[Dict[str, Any]]]:
+        try:
+            with gzip.open(self._path(year, month), "rt", encoding="utf-8") as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            print(f"Ignoring unreadable zaim month cache for {year}/{month}: {e}")
+            return None
+
+        for row in rows:
+            if "date" in row:
+                row["date"] = dt.datetime.fromisoformat(row["date"])
+        return rows
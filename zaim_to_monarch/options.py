@@ -0,0 +1,64 @@
+import dataclasses
+
+from typing import Optional
+
+
+@dataclasses.dataclass(frozen=False)
+class SyncOptions:
+    # Number of concurrent Monarch requests used by Monarch.push. Falls back to
+    # MONARCH_PUSH_CONCURRENCY, then 1.
+    push_concurrency: Optional[int] = None
+
+    # Number of transactions created or updated per Monarch request. Falls
+    # back to MONARCH_BATCH_SIZE, then 1.
+    batch_size: Optional[int] = None
+
+    # Most Monarch requests per second. The rate drops below this while
+    # monarch throttles or slows down. Falls back to MONARCH_RATE_LIMIT, then 20.
+    rate_limit: Optional[float] = None
+
+    # Sync ledger used to skip transactions that were already synced. Falls
+    # back to SYNC_LEDGER_FILE, then a file in the cache directory.
+    ledger_file: Optional[str] = None
+
+    # Ignore the sync ledger and compare every transaction against monarch.
+    full_sync: bool = False
+
+    # Number of zaim sessions that crawl months concurrently. Falls back to
+    # ZAIM_CRAWLER_POOL_SIZE, then 1.
+    crawler_pool_size: Optional[int] = None
+
+    # Months that ended more than this many days ago are read from the zaim
+    # month cache. Falls back to ZAIM_MONTH_CACHE_SETTLED_DAYS, then 60.
+    zaim_cache_settled_days: Optional[int] = None
+
+    # Crawl every month again and replace the cached months.
+    refresh_zaim_cache: bool = False
+
+    # Import and push every zaim month while the next months are crawled, and
+    # every month of a PDF statement once the statement has been parsed.
+    streaming: bool = False
+
+    # Number of crawled months that may wait for monarch when streaming.
+    # Falls back to ZAIM_STREAM_QUEUE_SIZE, then 2.
+    stream_queue_size: Optional[int] = None
+
+    # Number of PDFs extracted at once by --pdf imports. Falls back to
+    # PDF_WORKERS, then the number of CPUs.
+    pdf_workers: Optional[int] = None
+
+    # Directory of the JSON report written after every run. Falls back to
+    # SYNC_REPORT_DIR, then the reports directory in the cache directory.
+    report_dir: Optional[str] = None
+
+    # File replaced with the metrics of every run in the Prometheus text
+    # format. Falls back to SYNC_PROMETHEUS_FILE, not written if neither is set.
+    prometheus_file: Optional[str] = None
+
+    # CPU and memory profile the crawl, pull, merge and push of the run.
+    # Profiles are written to SYNC_PROFILE_DIR, then the cache directory.
+    profile: bool = False
+
+    # Where --pdf imports save their change plan for review. Falls back to a
+    # file in the plans directory of the cache directory.
+    plan_file: Optional[str] = None
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+from typing import List, Optional, Tuple
+
+from .cache import atomic_write, cache_dir
+
+# (date as ISO string, merchant, amount in yen) of one parsed transaction.
+ParsedRow = Tuple[str, str, float]
+
+_VERSION_RE = re.compile(r"^v\d+-[0-9a-f]+$")
+
+
+class PdfCache:
+    # Transactions parsed from PDF statements, keyed by the blake2b hash of
+    # the file contents. Entries live in a directory per parser version, so
+    # changing the parser makes every old entry unreachable. Directories of
+    # other versions are removed when the cache is opened.
+    def __init__(self, version: str, directory: Optional[str] = None):
+        root = directory or os.getenv("PDF_CACHE_DIR") or os.path.join(
+            cache_dir(), "pdf"
+        )
+        self._directory: str = os.path.join(root, version)
+        os.makedirs(self._directory, exist_ok=True)
+
+        for entry in os.listdir(root):
+            if entry != version and _VERSION_RE.match(entry):
+                shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+        # Entries are read from the threads of PdfParser.parse_dir.
+        self._lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def digest(filename: str) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def get(self, digest: str) -> Optional[List[ParsedRow]]:
+        try:
+            with open(self._path(digest), encoding="utf-8") as f:
+                rows = [tuple(row) for row in json.load(f)]
+        except FileNotFoundError:
+            rows = None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable PDF cache entry {digest}: {e}")
+            rows = None
+
+        with self._lock:
+            if rows is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return rows
+
+    def put(self, digest: str, rows: List[ParsedRow]) -> None:
+        data = json.dumps(rows, ensure_ascii=False, separators=(",", ":"))
+        atomic_write(self._path(digest), data.encode("utf-8"))
+
+    def summary(self) -> str:
+        return f"PDF cache: {self.hits} hits, {self.misses} misses."
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self._directory, f"{digest}.json")
@@ -1,9 +1,15 @@
+import collections
 import datetime as dt
+import hashlib
 import os
 import re
 import subprocess
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
 from .account_data import Account, Amount, Transaction
+from .pdf_cache import PdfCache
 
 
 class PdfParser:
@@ -11,27 +17,134 @@ class PdfParser:
         r"^(?P<date>\d\d/\d\d/\d\d)(?P<merchant>.*)JPY(?P<amount>.*\.\d\d).*"
     )
 
-    def __init__(self, account_name: str):
+    # Bump whenever parsing changes in a way the regex does not show, so that
+    # statements parsed by an older version are parsed again.
+    _PARSER_VERSION: int = 1
+
+    def __init__(
+        self,
+        account_name: str,
+        workers: Optional[int] = None,
+        cache: Optional[PdfCache] = None,
+    ):
         self._account: Account = Account(
             name=account_name, id="", balance=None, years={}
         )
+        # Number of pdftotext processes run at once by parse_dir.
+        self._workers: int = max(
+            1, workers or int(os.getenv("PDF_WORKERS", "0")) or os.cpu_count() or 1
+        )
+        self._cache: Optional[PdfCache] = cache
+
+    @classmethod
+    def cache_version(cls) -> str:
+        regex_hash = hashlib.blake2b(
+            cls._TRANSACTION_REGEX.pattern.encode("utf-8"), digest_size=4
+        ).hexdigest()
+        return f"v{cls._PARSER_VERSION}-{regex_hash}"
 
     def get_account(self) -> Account:
         return self._account
 
     def parse_dir(self, directory) -> None:
+        for transactions in self._read_files(self._pdf_files(directory)):
+            self._add_transactions(transactions)
+
+        if self._cache is not None:
+            print(self._cache.summary())
+
+    def stream_dir(self, directory) -> Iterator[Account]:
+        # Yields a new account per month of every statement, statement by
+        # statement, instead of collecting everything in get_account. Only
+        # the statements being extracted are held in memory.
+        for transactions in self._read_files(self._pdf_files(directory)):
+            months: Dict[Tuple[int, int], Account] = {}
+
+            for transaction in transactions:
+                key = (transaction.date.year, transaction.date.month)
+                if not key in months:
+                    months[key] = Account(
+                        name=self._account.name, id="", balance=None, years={}
+                    )
+                months[key].add_transaction(transaction)
+
+            for key in sorted(months):
+                yield months[key]
 
-        for filename in os.listdir(directory):
+        if self._cache is not None:
+            print(self._cache.summary())
+
+    def _pdf_files(self, directory) -> List[str]:
+        filenames: List[str] = []
+
+        for filename in sorted(os.listdir(directory)):
             if not filename.endswith(".pdf"):
                 continue
 
             f = os.path.join(directory, filename)
 
-            abs_filename = os.fsdecode(os.path.abspath(f))
+            filenames.append(os.fsdecode(os.path.abspath(f)))
+
+        return filenames
+
+    def _read_files(self, filenames: List[str]) -> Iterator[List[Transaction]]:
+        # Files are extracted and parsed concurrently, at most workers at a
+        # time, and returned in filename order so that the result does not
+        # depend on which file finishes first.
+        if self._workers == 1:
+            for filename in filenames:
+                yield self._read_file(filename)
+            return
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            pending: Deque[Future] = collections.deque()
+            for filename in filenames:
+                pending.append(executor.submit(self._read_file, filename))
+                if len(pending) >= self._workers:
+                    yield pending.popleft().result()
 
-            self.parse_file(abs_filename)
+            while pending:
+                yield pending.popleft().result()
 
     def parse_file(self, filename) -> None:
+        self._add_transactions(self._read_file(filename))
+
+    def _add_transactions(self, transactions: List[Transaction]) -> None:
+        for transaction in transactions:
+            self._account.add_transaction(transaction)
+
+    def _read_file(self, filename) -> List[Transaction]:
+        # Statements parsed before are read from the cache without starting
+        # pdftotext.
+        if self._cache is None:
+            return self._extract_file(filename)
+
+        digest = PdfCache.digest(filename)
+        rows = self._cache.get(digest)
+        if rows is not None:
+            transactions: List[Transaction] = []
+            for date_str, merchant, amount_jpy in rows:
+                date = dt.date.fromisoformat(date_str)
+                transactions.append(
+                    Transaction(date, merchant, Amount(jpy=amount_jpy, date=date))
+                )
+            return transactions
+
+        transactions = self._extract_file(filename)
+        self._cache.put(
+            digest,
+            [
+                (
+                    transaction.date.isoformat(),
+                    transaction.merchant,
+                    transaction.amount.jpy,
+                )
+                for transaction in transactions
+            ],
+        )
+        return transactions
+
+    def _extract_file(self, filename) -> List[Transaction]:
         pdf_to_text_args = [
             "pdftotext",
             "-layout",
@@ -40,10 +153,26 @@ class PdfParser:
             "-",
         ]
 
-        txt = subprocess.check_output(pdf_to_text_args, universal_newlines=True)
-        lines = txt.splitlines()
+        # The text is parsed line by line while pdftotext writes it.
+        with subprocess.Popen(
+            pdf_to_text_args, stdout=subprocess.PIPE, universal_newlines=True
+        ) as process:
+            transactions = self._parse_lines(filename, process.stdout)
+
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, pdf_to_text_args)
+
+        return transactions
+
+    def _parse_lines(self, filename, lines: Iterable[str]) -> List[Transaction]:
+        transactions: List[Transaction] = []
 
         for line in lines:
+            # Every transaction has an amount in JPY.
+            if not "JPY" in line:
+                continue
+
+            line = line.rstrip("\n")
             match = self._TRANSACTION_REGEX.search(line)
 
             if not match:
@@ -58,7 +187,7 @@ class PdfParser:
                     match["amount"].strip().replace(",", "").replace("‑", "-")
                 )
 
-                self._account.add_transaction(
+                transactions.append(
                     Transaction(
                         date,
                         merchant,
@@ -69,3 +198,5 @@ class PdfParser:
                 print(f"Error when parsing file: {filename}")
                 print(f"Line has bad format: {line}")
                 raise
+
+        return transactions
@@ -0,0 +1,185 @@
+import contextlib
+import cProfile
+import dataclasses
+import io
+import linecache
+import os
+import pstats
+import threading
+import tracemalloc
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .cache import cache_dir
+
+# Number of functions and allocation sites printed per phase.
+_TOP = 10
+
+
+@dataclasses.dataclass(frozen=False)
+class _Phase:
+    profile: cProfile.Profile = dataclasses.field(default_factory=cProfile.Profile)
+    # (file, line) to bytes and blocks allocated and still alive at the end
+    # of the phase.
+    allocations: Dict[Tuple[str, int], Tuple[int, int]] = dataclasses.field(
+        default_factory=dict
+    )
+    peak_bytes: int = 0
+    entered: int = 0
+    skipped: int = 0
+
+
+class Profiler:
+    # CPU profile and memory allocations of each phase of a run, like crawl,
+    # pull, merge and push. A phase may be entered many times, its numbers
+    # add up. Phases nest within a thread: the outer phase is paused while
+    # an inner one runs. Only one CPU profiler can run at a time on newer
+    # Pythons, so a phase entered while another thread is profiled is only
+    # tracked for memory.
+    def __init__(self) -> None:
+        self._phases: Dict[str, _Phase] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._local: threading.local = threading.local()
+        tracemalloc.start(1)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        with self._lock:
+            phase = self._phases.setdefault(name, _Phase())
+            phase.entered += 1
+
+        stack: List[Tuple[_Phase, bool]] = self._stack()
+        if stack and stack[-1][1]:
+            stack[-1][0].profile.disable()
+
+        profiling = True
+        try:
+            phase.profile.enable()
+        except ValueError:
+            profiling = False
+            phase.skipped += 1
+        stack.append((phase, profiling))
+
+        tracemalloc.reset_peak()
+        before = self._snapshot()
+        try:
+            yield
+        finally:
+            if profiling:
+                phase.profile.disable()
+            stack.pop()
+
+            after = self._snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            self._add_allocations(phase, after.compare_to(before, "lineno"), peak)
+            # The outer phase saw the peak of this one.
+            if stack:
+                stack[-1][0].peak_bytes = max(stack[-1][0].peak_bytes, peak)
+
+            if stack and stack[-1][1]:
+                try:
+                    stack[-1][0].profile.enable()
+                except ValueError:
+                    pass
+
+    def write(self, name: str, directory: Optional[str] = None) -> str:
+        # Writes a pstats file and the allocation sites of every phase to the
+        # name directory in directory, then SYNC_PROFILE_DIR, then the
+        # profiles directory in the cache directory. Returns the directory.
+        directory = os.path.join(
+            directory
+            or os.getenv("SYNC_PROFILE_DIR")
+            or os.path.join(cache_dir(), "profiles"),
+            name,
+        )
+        os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            phases = dict(self._phases)
+
+        for name, phase in phases.items():
+            filename = name.replace(" ", "_")
+            if phase.entered > phase.skipped:
+                phase.profile.dump_stats(os.path.join(directory, f"{filename}.prof"))
+            with open(
+                os.path.join(directory, f"{filename}-allocations.txt"), "w"
+            ) as f:
+                f.write(self._allocations_text(phase, limit=None))
+
+        return directory
+
+    def summary(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            phases = dict(self._phases)
+
+        for name, phase in phases.items():
+            lines.append(
+                f"Profile of {name}: entered {phase.entered} times, "
+                f"peak {phase.peak_bytes / 1024 / 1024:.1f}MB traced."
+            )
+            if phase.skipped:
+                lines.append(
+                    f"  {phase.skipped} times not CPU profiled, another phase was."
+                )
+            if phase.entered > phase.skipped:
+                lines.append("  Slowest functions (own time):")
+                lines.append(self._functions_text(phase))
+            lines.append("  Top allocation sites (still allocated):")
+            lines.append(self._allocations_text(phase, limit=_TOP))
+        return "\n".join(lines)
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+
+    def _stack(self) -> List[Tuple[_Phase, bool]]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _add_allocations(
+        self, phase: _Phase, diffs: List[tracemalloc.StatisticDiff], peak: int
+    ) -> None:
+        with self._lock:
+            phase.peak_bytes = max(phase.peak_bytes, peak)
+            for diff in diffs:
+                if diff.size_diff <= 0:
+                    continue
+                frame = diff.traceback[0]
+                key = (frame.filename, frame.lineno)
+                size, count = phase.allocations.get(key, (0, 0))
+                phase.allocations[key] = (
+                    size + diff.size_diff,
+                    count + diff.count_diff,
+                )
+
+    @staticmethod
+    def _functions_text(phase: _Phase) -> str:
+        out = io.StringIO()
+        stats = pstats.Stats(phase.profile, stream=out)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(_TOP)
+        # Drop the header pstats prints before the table.
+        text = out.getvalue()
+        start = text.find("   ncalls")
+        return text[start:].rstrip() if start >= 0 else text.rstrip()
+
+    @staticmethod
+    def _allocations_text(phase: _Phase, limit: Optional[int]) -> str:
+        sites = sorted(
+            phase.allocations.items(), key=lambda item: item[1][0], reverse=True
+        )
+        lines: List[str] = []
+        for (filename, lineno), (size, count) in sites[:limit]:
+            lines.append(
+                f"  {size / 1024:>10.1f}KB {count:>8} blocks  {filename}:{lineno}"
+            )
+            source = linecache.getline(filename, lineno).strip()
+            if source:
+                lines.append(f"      {source}")
+        return "\n".join(lines)
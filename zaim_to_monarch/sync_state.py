@@ -0,0 +1,111 @@
+import dataclasses
+import datetime as dt
+import json
+import os
+
+from typing import Any, Dict, Optional, Tuple
+
+from .cache import atomic_write, cache_dir
+
+
+@dataclasses.dataclass(frozen=False)
+class SyncRun:
+    start_date: dt.date
+    end_date: dt.date
+    started_at: dt.datetime
+    finished_at: Optional[dt.datetime] = None
+    succeeded: bool = False
+    error: str = ""
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "succeeded": self.succeeded,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "SyncRun":
+        return cls(
+            start_date=dt.date.fromisoformat(data["start_date"]),
+            end_date=dt.date.fromisoformat(data["end_date"]),
+            started_at=dt.datetime.fromisoformat(data["started_at"]),
+            finished_at=(
+                dt.datetime.fromisoformat(data["finished_at"])
+                if data["finished_at"]
+                else None
+            ),
+            succeeded=data["succeeded"],
+            error=data["error"],
+        )
+
+
+class SyncState:
+    # Watermark and last run of the periodic sync, kept on disk so that a
+    # restarted daemon resumes where the last successful sync ended. Every
+    # change is written atomically.
+
+    # Always sync one more week than is necessary in case any delayed
+    # transactions have appeared since the last sync.
+    OVERLAP: dt.timedelta = dt.timedelta(days=7)
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        if path is None:
+            path = os.getenv("SYNC_STATE_FILE") or os.path.join(
+                cache_dir(), "sync_state.json"
+            )
+
+        self._path: str = path
+        # End date of the last successful sync.
+        self.watermark: Optional[dt.date] = None
+        self.last_run: Optional[SyncRun] = None
+
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("watermark"):
+                self.watermark = dt.date.fromisoformat(data["watermark"])
+            if data.get("last_run"):
+                self.last_run = SyncRun.from_json(data["last_run"])
+
+    def sync_range(self, days_interval: int, today: dt.date) -> Tuple[dt.date, dt.date]:
+        # A single run covers every interval that was missed since the
+        # watermark.
+        watermark = self.watermark
+        if watermark is None:
+            watermark = today - dt.timedelta(days=days_interval)
+        return watermark - self.OVERLAP, today
+
+    def next_due(self, days_interval: int) -> dt.datetime:
+        # A run that never finished, for example because the process was
+        # killed, is retried immediately.
+        if not self.last_run or not self.last_run.finished_at:
+            return dt.datetime.min
+        return self.last_run.finished_at + dt.timedelta(days=days_interval)
+
+    def start_run(self, start_date: dt.date, end_date: dt.date) -> SyncRun:
+        self.last_run = SyncRun(
+            start_date=start_date, end_date=end_date, started_at=dt.datetime.now()
+        )
+        self._save()
+        return self.last_run
+
+    def finish_run(self, run: SyncRun, error: str = "") -> None:
+        run.finished_at = dt.datetime.now()
+        run.succeeded = not error
+        run.error = error
+
+        if run.succeeded:
+            self.watermark = run.end_date
+
+        self._save()
+
+    def _save(self) -> None:
+        data = {
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "last_run": self.last_run.to_json() if self.last_run else None,
+        }
+        atomic_write(self._path, json.dumps(data, indent=2).encode("utf-8"))
@@ -0,0 +1,43 @@
+import contextlib
+import threading
+import time
+
+from typing import Iterator, List, Tuple
+
+
+class Timeline:
+    # Start and end of the phases of a sync, in seconds since the timeline
+    # was created. Phases may run concurrently, in threads or coroutines.
+    def __init__(self) -> None:
+        self._start: float = time.perf_counter()
+        self._lock: threading.Lock = threading.Lock()
+        self.spans: List[Tuple[str, float, float]] = []
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter() - self._start
+        try:
+            yield
+        finally:
+            end = time.perf_counter() - self._start
+            with self._lock:
+                self.spans.append((name, start, end))
+
+    def overlap_saved(self, names: List[str]) -> float:
+        # Estimated time saved by running the named phases concurrently: the
+        # sum of their durations minus the wall-clock time they spanned. How
+        # long they take one after another is not measured.
+        spans = [span for span in self.spans if span[0] in names]
+        if not spans:
+            return 0
+        sequential = sum(end - start for _, start, end in spans)
+        wall = max(end for _, _, end in spans) - min(start for _, start, _ in spans)
+        return max(0, sequential - wall)
+
+    def __str__(self) -> str:
+        lines = ["Timeline:"]
+        for name, start, end in sorted(self.spans, key=lambda span: span[1]):
+            lines.append(
+                f"  {name:<24} {start:>7.1f}s - {end:>7.1f}s ({end - start:.1f}s)"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,263 @@
+import bisect
+import datetime as dt
+
+from array import array
+from typing import Dict, List, Optional, Union
+
+from .exchange_rates import default_store
+
+# Marks a row whose USD value has not been converted yet.
+_UNRESOLVED: int = -(2**63)
+
+# Index keys pack the row's date ordinal into the low bits so that matching
+# is always limited to a single day.
+_ORDINAL_BITS: int = 20
+
+_Index = Dict[int, Union[int, List[int]]]
+
+# Zaim and Monarch ids are decimal numbers. Those are stored as the number
+# plus one, other ids as the negated position in the string pool and "" as 0.
+_MAX_NUMERIC_ID_DIGITS: int = 18
+
+
+class TransactionTable:
+    # Column store for the transactions of one account. Every transaction is
+    # a row: integer yen, USD cents, an ordinal date, a pooled merchant
+    # string, encoded ids and one bit of a dirty bitmap. Day keeps the rows of one day
+    # and Transaction is a view of a single row.
+    def __init__(self) -> None:
+        self._dates: array = array("i")
+        self._yen: array = array("q")
+        self._usd_cents: array = array("q")
+        self._merchants: array = array("I")
+        self._zaim_ids: array = array("q")
+        self._monarch_ids: array = array("q")
+        self._dirty: bytearray = bytearray()
+
+        self._strings: List[str] = [""]
+        self._string_ids: Dict[str, int] = {"": 0}
+
+        # Rows, in ascending order, keyed by (value, date ordinal). A key
+        # with a single row stores the row itself instead of a list.
+        self._by_zaim_id: _Index = {}
+        self._by_monarch_id: _Index = {}
+        self._by_yen: _Index = {}
+        self._by_yen_without_zaim_id: _Index = {}
+
+    def __len__(self) -> int:
+        return len(self._dates)
+
+    def append(
+        self,
+        date: dt.date,
+        merchant: str,
+        yen: int,
+        usd_cents: Optional[int],
+        zaim_id: str,
+        monarch_id: str,
+        dirty: bool,
+    ) -> int:
+        row = len(self._dates)
+
+        self._dates.append(date.toordinal())
+        self._yen.append(yen)
+        self._usd_cents.append(_UNRESOLVED if usd_cents is None else usd_cents)
+        self._merchants.append(self._intern(merchant))
+        self._zaim_ids.append(self._encode_id(zaim_id))
+        self._monarch_ids.append(self._encode_id(monarch_id))
+
+        if row % 8 == 0:
+            self._dirty.append(0)
+        self.set_dirty(row, dirty)
+
+        self._index(row)
+        return row
+
+    def date(self, row: int) -> dt.date:
+        return dt.date.fromordinal(self._dates[row])
+
+    def merchant(self, row: int) -> str:
+        return self._strings[self._merchants[row]]
+
+    def set_merchant(self, row: int, merchant: str) -> None:
+        self._merchants[row] = self._intern(merchant)
+
+    def yen(self, row: int) -> int:
+        return self._yen[row]
+
+    def usd_cents(self, row: int) -> Optional[int]:
+        cents = self._usd_cents[row]
+        return None if cents == _UNRESOLVED else cents
+
+    def set_amount(self, row: int, yen: int, usd_cents: Optional[int]) -> None:
+        self._unindex(row)
+        self._yen[row] = yen
+        self._usd_cents[row] = _UNRESOLVED if usd_cents is None else usd_cents
+        self._index(row)
+
+    def zaim_id(self, row: int) -> str:
+        return self._decode_id(self._zaim_ids[row])
+
+    def set_zaim_id(self, row: int, zaim_id: str) -> None:
+        self._unindex(row)
+        self._zaim_ids[row] = self._encode_id(zaim_id)
+        self._index(row)
+
+    def monarch_id(self, row: int) -> str:
+        return self._decode_id(self._monarch_ids[row])
+
+    def set_monarch_id(self, row: int, monarch_id: str) -> None:
+        self._unindex(row)
+        self._monarch_ids[row] = self._encode_id(monarch_id)
+        self._index(row)
+
+    def dirty(self, row: int) -> bool:
+        return bool(self._dirty[row >> 3] & (1 << (row & 7)))
+
+    def set_dirty(self, row: int, dirty: bool) -> None:
+        if dirty:
+            self._dirty[row >> 3] |= 1 << (row & 7)
+        else:
+            self._dirty[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+
+    def first_by_zaim_id(self, date: dt.date, zaim_id: str) -> Optional[int]:
+        code = self._encode_id(zaim_id, add=False)
+        if code is None:
+            return None
+        return self._first(self._by_zaim_id, self._key(code, date.toordinal()))
+
+    def first_by_monarch_id(self, date: dt.date, monarch_id: str) -> Optional[int]:
+        code = self._encode_id(monarch_id, add=False)
+        if code is None:
+            return None
+        return self._first(self._by_monarch_id, self._key(code, date.toordinal()))
+
+    def first_by_yen(
+        self, date: dt.date, yen: int, without_zaim_id: bool = False
+    ) -> Optional[int]:
+        index = self._by_yen_without_zaim_id if without_zaim_id else self._by_yen
+        return self._first(index, self._key(yen, date.toordinal()))
+
+    def resolve_usd(self, rows: List[int]) -> None:
+        rows = [row for row in rows if self._usd_cents[row] == _UNRESOLVED]
+        if not rows:
+            return
+
+        usd = default_store().convert_many(
+            [self._yen[row] for row in rows],
+            "JPY",
+            "USD",
+            [dt.date.fromordinal(self._dates[row]) for row in rows],
+        )
+        for row, value in zip(rows, usd):
+            self._usd_cents[row] = round(value * 100)
+
+    def nbytes(self) -> int:
+        return (
+            sum(
+                column.itemsize * len(column)
+                for column in (
+                    self._dates,
+                    self._yen,
+                    self._usd_cents,
+                    self._merchants,
+                    self._zaim_ids,
+                    self._monarch_ids,
+                )
+            )
+            + len(self._dirty)
+        )
+
+    def _intern(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+
+    def _encode_id(self, value: str, add: bool = True) -> Optional[int]:
+        if not value:
+            return 0
+
+        if (
+            value.isdigit()
+            and value.isascii()
+            and len(value) <= _MAX_NUMERIC_ID_DIGITS
+            and (value[0] != "0" or value == "0")
+        ):
+            return int(value) + 1
+
+        if not add:
+            string_id = self._string_ids.get(value)
+            return None if string_id is None else -string_id
+        return -self._intern(value)
+
+    def _decode_id(self, code: int) -> str:
+        if code > 0:
+            return str(code - 1)
+        return self._strings[-code]
+
+    def _index(self, row: int) -> None:
+        ordinal = self._dates[row]
+
+        if self._zaim_ids[row]:
+            self._add(self._by_zaim_id, self._key(self._zaim_ids[row], ordinal), row)
+        if self._monarch_ids[row]:
+            self._add(
+                self._by_monarch_id, self._key(self._monarch_ids[row], ordinal), row
+            )
+
+        yen_key = self._key(self._yen[row], ordinal)
+        self._add(self._by_yen, yen_key, row)
+        if not self._zaim_ids[row]:
+            self._add(self._by_yen_without_zaim_id, yen_key, row)
+
+    def _unindex(self, row: int) -> None:
+        ordinal = self._dates[row]
+
+        if self._zaim_ids[row]:
+            self._remove(
+                self._by_zaim_id, self._key(self._zaim_ids[row], ordinal), row
+            )
+        if self._monarch_ids[row]:
+            self._remove(
+                self._by_monarch_id, self._key(self._monarch_ids[row], ordinal), row
+            )
+
+        yen_key = self._key(self._yen[row], ordinal)
+        self._remove(self._by_yen, yen_key, row)
+        if not self._zaim_ids[row]:
+            self._remove(self._by_yen_without_zaim_id, yen_key, row)
+
+    @staticmethod
+    def _key(value: int, ordinal: int) -> int:
+        return (value << _ORDINAL_BITS) | ordinal
+
+    @staticmethod
+    def _first(index: _Index, key: int) -> Optional[int]:
+        rows = index.get(key)
+        if rows is None or isinstance(rows, int):
+            return rows
+        return rows[0]
+
+    @staticmethod
+    def _add(index: _Index, key: int, row: int) -> None:
+        rows = index.get(key)
+        if rows is None:
+            index[key] = row
+        elif isinstance(rows, int):
+            index[key] = [min(rows, row), max(rows, row)]
+        else:
+            bisect.insort(rows, row)
+
+    @staticmethod
+    def _remove(index: _Index, key: int, row: int) -> None:
+        rows = index[key]
+        if isinstance(rows, int):
+            del index[key]
+            return
+
+        rows.pop(bisect.bisect_left(rows, row))
+        if len(rows) == 1:
+            index[key] = rows[0]
@@ -1,40 +1,102 @@
 import datetime as dt
 import os
 
-from typing import Dict
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from dateutil.relativedelta import relativedelta
 
 from .account_data import Account, Amount, Transaction
-from .zaim_crawler import ZaimCrawler
+from .instrumentation import Instrumentation
+from .ledger import SyncLedger
+from .month_cache import MonthCache
+from .zaim_crawler_pool import ZaimCrawlerPool
 
 
 class Zaim:
-    def __init__(self):
+    def __init__(
+        self,
+        crawler_pool_size: Optional[int] = None,
+        crawler: Optional[ZaimCrawlerPool] = None,
+        month_cache: Optional[MonthCache] = None,
+        instrumentation: Optional[Instrumentation] = None,
+    ):
         self._accounts: Dict[str, Account] = {}
-        self._crawler: ZaimCrawler = ZaimCrawler(
+        self._month_cache: Optional[MonthCache] = month_cache
+        self._instrumentation: Instrumentation = instrumentation or Instrumentation()
+
+        # A crawler passed in is owned by the caller and left running.
+        self._owns_crawler: bool = crawler is None
+        self._crawler: ZaimCrawlerPool = crawler or ZaimCrawlerPool(
             os.getenv("ZAIM_USERNAME"),
             os.getenv("ZAIM_PASSWORD"),
+            crawler_pool_size,
         )
 
-        balances = self._crawler.get_account_balances()
+        try:
+            balances = self._crawler.get_account_balances()
+        except BaseException:
+            # Nobody else can stop Chrome of a Zaim that failed to start.
+            if self._owns_crawler:
+                self._crawler.close()
+            raise
 
         for account_name, balance_jpy in balances.items():
             self._accounts[account_name] = Account(
                 account_name, "", Amount(jpy=balance_jpy), {}
             )
 
-    def load_data(self, start_date: dt.date, end_date: dt.date) -> None:
-
+    def load_data(
+        self,
+        start_date: dt.date,
+        end_date: dt.date,
+        ledger: Optional[SyncLedger] = None,
+    ) -> None:
+        with self._instrumentation.profiled("crawl"):
+            for _ in self._load_months(start_date, end_date, ledger, streaming=False):
+                pass
+
+    def stream_data(
+        self,
+        start_date: dt.date,
+        end_date: dt.date,
+        ledger: Optional[SyncLedger] = None,
+    ) -> Iterator[Dict[str, Account]]:
+        # Yields new accounts holding the transactions of a single month,
+        # month by month. Only the accounts of the first month have balances.
+        with self._instrumentation.profiled("crawl"):
+            yield from self._load_months(start_date, end_date, ledger, streaming=True)
+
+    def _load_months(
+        self,
+        start_date: dt.date,
+        end_date: dt.date,
+        ledger: Optional[SyncLedger],
+        streaming: bool,
+    ) -> Iterator[Dict[str, Account]]:
+        skipped: int = 0
+        # The crawlers may have crawled earlier syncs already.
+        page_loads = self._crawler.page_loads()
+        timings = {id(timing) for timing in self._crawler.month_timings()}
+
+        months: List[Tuple[int, int]] = []
         current_batch_date = dt.date(
             year=start_date.year, month=start_date.month, day=1
         )
 
         while current_batch_date < end_date:
+            months.append((current_batch_date.year, current_batch_date.month))
+            current_batch_date += relativedelta(months=1)
 
-            transactions = self._crawler.get_data(
-                current_batch_date.year, current_batch_date.month
-            )
+        for i, (_, transactions) in enumerate(self._get_months(months)):
+
+            accounts = self._accounts
+            if streaming:
+                accounts = {
+                    name: Account(
+                        name, "", account.balance if i == 0 else None, {}
+                    )
+                    for name, account in self._accounts.items()
+                }
 
             for transaction in transactions:
 
@@ -51,7 +113,18 @@ class Zaim:
                 else:
                     account_name = transaction["to_account"]
 
-                self._accounts[account_name].add_transaction(
+                # Transactions already synced with the same content are left out.
+                if ledger is not None and ledger.is_unchanged(
+                    account_name,
+                    transaction["id"],
+                    SyncLedger.content_hash(
+                        transaction_date, transaction["place"], amount_jpy
+                    ),
+                ):
+                    skipped += 1
+                    continue
+
+                accounts[account_name].add_transaction(
                     Transaction(
                         date=transaction_date,
                         merchant=transaction["place"],
@@ -60,7 +133,62 @@ class Zaim:
                     )
                 )
 
-            current_batch_date += relativedelta(months=1)
+            yield accounts
+
+        if skipped:
+            print(f"Skipped {skipped} zaim transactions already in the sync ledger.")
+        if self._month_cache is not None:
+            print(self._month_cache.summary())
+
+        instrumentation = self._instrumentation
+        instrumentation.count("zaim_page_loads", self._crawler.page_loads() - page_loads)
+        instrumentation.count("zaim_ledger_skipped_transactions", skipped)
+        for timing in self._crawler.month_timings():
+            if id(timing) in timings:
+                continue
+            instrumentation.count("zaim_months_crawled")
+            instrumentation.count("zaim_rows_scraped", timing.rows)
+            instrumentation.count("zaim_scrolls", timing.scrolls)
+            instrumentation.observe("zaim_month_seconds", timing.elapsed)
+            instrumentation.observe("zaim_month_wait_seconds", timing.waited)
+            if not timing.complete:
+                instrumentation.count("zaim_incomplete_months")
+        if self._month_cache is not None:
+            instrumentation.count("zaim_month_cache_hits", self._month_cache.hits)
+            instrumentation.count("zaim_month_cache_misses", self._month_cache.misses)
+
+    def _get_months(
+        self, months: List[Tuple[int, int]]
+    ) -> Iterator[Tuple[Tuple[int, int], List[Dict]]]:
+        # Serves settled months from the month cache and crawls the others,
+        # keeping the order of months.
+        if self._month_cache is None:
+            yield from self._crawler.get_months(months)
+            return
+
+        cached = {month: self._month_cache.get(*month) for month in months}
+        crawled = self._crawler.get_months(
+            [month for month in months if cached[month] is None]
+        )
+
+        for month in months:
+            if cached[month] is not None:
+                yield month, cached[month]
+                continue
+
+            crawled_month, rows = next(crawled)
+            # A month whose results did not load could be cached empty or
+            # partial, and served like that until the cache is refreshed.
+            if crawled_month in self._crawler.incomplete_months:
+                year, month = crawled_month
+                print(f"Not caching {year}/{month} of zaim, it did not load.")
+            else:
+                self._month_cache.put(*crawled_month, rows)
+            yield crawled_month, rows
 
     def accounts(self) -> Dict[str, Account]:
         return self._accounts
+
+    def close(self) -> None:
+        if self._owns_crawler:
+            self._crawler.close()
@@ -1,16 +1,202 @@
 import calendar
+import dataclasses
 import datetime
+import os
 import time
 
-from selenium.common.exceptions import NoSuchElementException
+from typing import Any, Dict, List, Optional, Set
+
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
 from selenium.webdriver import Chrome, ChromeOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 
 
+# Reads the cells of every result row on the page and scrolls the last row into
+# view. Returns null when there is no results list.
+_EXTRACT_ROWS_SCRIPT: str = """
+if (!document.querySelector(arguments[0])) {
+  return null;
+}
+const rows = Array.from(document.querySelectorAll(arguments[1]));
+const first = (item, tag) => item.getElementsByTagName(tag)[0] || null;
+const data = rows.map((row) => {
+  const items = row.getElementsByTagName("div");
+  const spans = items[3].getElementsByTagName("span");
+  const from = first(items[5], "img");
+  const to = first(items[6], "img");
+  return {
+    url: first(items[0], "i").getAttribute("data-url"),
+    count: first(items[1], "i").getAttribute("title"),
+    date: items[2].innerText,
+    category: spans[0].getAttribute("data-title"),
+    genre: spans[1].innerText,
+    amount: first(items[4], "span").innerText,
+    from_account: from ? from.getAttribute("data-title") : null,
+    to_account: to ? to.getAttribute("data-title") : null,
+    place: first(items[7], "span").innerText,
+    name: first(items[8], "span").innerText,
+    comment: first(items[9], "span").innerText,
+  };
+});
+if (rows.length) {
+  rows[rows.length - 1].scrollIntoView(true);
+}
+return data;
+"""
+
+# Returns the number of result rows and the data-url of the first one.
+_ROWS_STATE_SCRIPT: str = """
+const rows = document.querySelectorAll(arguments[0]);
+if (!rows.length) {
+  return [0, null];
+}
+return [rows.length, rows[0].getElementsByTagName("i")[0].getAttribute("data-url")];
+"""
+
+
+def parse_rows(
+    rows: List[Dict[str, Any]], year: str, seen_ids: Set[str]
+) -> List[Dict[str, Any]]:
+    # Turns rows read by _EXTRACT_ROWS_SCRIPT into zaim items, leaving out
+    # rows whose id is in seen_ids.
+    items = []
+
+    for row in rows:
+        item = {}
+        item["id"] = row["url"].split("/")[2]
+        if item["id"] in seen_ids:
+            continue
+        seen_ids.add(item["id"])
+
+        item["count"] = row["count"].split("（")[0]
+        date = row["date"].strip().split("（")[0]
+        item["date"] = datetime.datetime.strptime(f"{year}年{date}", "%Y年%m月%d日")
+        item["category"] = row["category"]
+        item["genre"] = row["genre"].strip()
+        item["amount"] = int(row["amount"].strip().strip("¥").replace(",", ""))
+        if row["from_account"] is not None:
+            item["from_account"] = row["from_account"]
+        if row["to_account"] is not None:
+            item["to_account"] = row["to_account"]
+        item["type"] = (
+            "transfer"
+            if "from_account" in item and "to_account" in item
+            else (
+                "payment"
+                if "from_account" in item
+                else "income" if "to_account" in item else None
+            )
+        )
+        item["place"] = row["place"].strip()
+        item["name"] = row["name"].strip()
+        item["comment"] = row["comment"].strip()
+        items.append(item)
+
+    return items
+
+
+def _process_tree_rss(pid: int) -> Optional[int]:
+    # Sums the resident memory of pid and its descendants. Only works where
+    # /proc is available.
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            pass
+        pending.extend(children.get(current, []))
+
+    return total
+
+
+@dataclasses.dataclass(frozen=False)
+class MonthTiming:
+    year: int
+    month: int
+    rows: int = 0
+    scrolls: int = 0
+    # Time spent waiting for the page, and an estimate of what the fixed
+    # sleeps that the waits replaced would have cost. The sleeps are not run,
+    # so the difference is not a measured saving.
+    waited: float = 0
+    fixed_sleeps: float = 0
+    elapsed: float = 0
+    # False when the results list never appeared, so an empty month cannot be
+    # told apart from a page that did not load.
+    complete: bool = True
+
+    def __str__(self) -> str:
+        return (
+            f"{self.year}/{str(self.month).zfill(2)}: {self.rows} rows, "
+            f"{self.scrolls} scrolls in {self.elapsed:.1f}s. "
+            f"Waited {self.waited:.1f}s (fixed sleeps: ~{self.fixed_sleeps:.1f}s)"
+            + ("" if self.complete else ". Results did not load")
+        )
+
+
 class ZaimCrawler:
-    def __init__(self, user_id, password):
+    _RESULTS_XPATH: str = "//*[starts-with(@class, 'SearchResult-module__list___')]"
+    _RESULTS_CSS: str = "[class^='SearchResult-module__list___']"
+    _ROWS_CSS: str = "[class^='SearchResult-module__body___']"
+
+    # The fixed sleeps used before waiting on page conditions, used to
+    # estimate the time the waits save.
+    _NAVIGATION_SLEEP: float = 1
+    _SCROLL_SLEEP: float = 0.1
+
+    def __init__(
+        self,
+        user_id,
+        password,
+        page_timeout: Optional[float] = None,
+        results_timeout: Optional[float] = None,
+        scroll_timeout: Optional[float] = None,
+        cookies: Optional[List[Dict[str, Any]]] = None,
+    ):
+        # Seconds to wait for a page to load, for the results list of a month
+        # to appear and for more rows to appear after scrolling.
+        self._page_timeout: float = page_timeout or float(
+            os.getenv("ZAIM_PAGE_TIMEOUT", "30")
+        )
+        self._results_timeout: float = results_timeout or float(
+            os.getenv("ZAIM_RESULTS_TIMEOUT", "10")
+        )
+        self._scroll_timeout: float = scroll_timeout or float(
+            os.getenv("ZAIM_SCROLL_TIMEOUT", "1")
+        )
+        self.month_timings: List[MonthTiming] = []
+        self.page_loads: int = 0
+        self._seen_ids: Set[str] = set()
+        self._timing: Optional[MonthTiming] = None
+        # Whether the results list of the month last read by get_data loaded.
+        self.last_month_complete: bool = True
+
         options = ChromeOptions()
 
         options.add_argument("--disable-gpu")
@@ -23,11 +209,23 @@ class ZaimCrawler:
         self.driver.set_window_size(480, 270)
 
         print("Start Chrome Driver.")
+
+        # A session of another crawler is reused when its cookies are given.
+        if cookies is None or not self._restore_session(cookies):
+            self._login(user_id, password)
+
+        self.data = []
+        self.current = 0
+
+    def cookies(self) -> List[Dict[str, Any]]:
+        return self.driver.get_cookies()
+
+    def _login(self, user_id, password) -> None:
         print("Login to Zaim.")
 
-        self.driver.get("https://zaim.net/user_session/new")
+        self._load("https://zaim.net/user_session/new")
 
-        WebDriverWait(self.driver, 30).until(
+        WebDriverWait(self.driver, self._page_timeout).until(
             EC.element_to_be_clickable((By.ID, "submit"))
         )
 
@@ -35,19 +233,27 @@ class ZaimCrawler:
         self.driver.find_element(By.ID, "password").send_keys(password)
         self.driver.find_element(By.ID, "submit").submit()
 
-        WebDriverWait(self.driver, 30).until(
+        WebDriverWait(self.driver, self._page_timeout).until(
             EC.presence_of_all_elements_located((By.ID, "payment_form"))
         )
 
         print("Login Success.")
-        self.data = []
-        self.current = 0
+
+    def _restore_session(self, cookies: List[Dict[str, Any]]) -> bool:
+        # Cookies can only be added for the domain of the current page.
+        self._load("https://zaim.net/")
+        for cookie in cookies:
+            self.driver.add_cookie(cookie)
+
+        self._load("https://zaim.net/home")
+        return self._wait_for((By.ID, "payment_form"), self._page_timeout)
 
     def get_account_balances(self):
         account_balances = {}
 
         # First navigate to the the accounts overview page which lists the full account names.
-        self.driver.get("https://zaim.net/accounts/")
+        self._load("https://zaim.net/accounts/")
+        self._wait_for((By.TAG_NAME, "table"), self._page_timeout)
 
         accounts_table = self.driver.find_element(
             by=By.TAG_NAME,
@@ -62,8 +268,8 @@ class ZaimCrawler:
                 account_balances[account_name.text] = 0
 
         # Now that the full account names have been set, get the account balances.
-        self.driver.get("https://zaim.net/home")
-        time.sleep(1)
+        self._load("https://zaim.net/home")
+        self._wait_for((By.CLASS_NAME, "account-name"), self._page_timeout)
 
         accounts = self.driver.find_elements(
             by=By.CLASS_NAME,
@@ -98,12 +304,23 @@ class ZaimCrawler:
 
     def get_data(self, year, month):
         self.data = []
+        self._seen_ids = set()
+        self._timing = MonthTiming(int(year), int(month))
+        start = time.perf_counter()
+
         day_len = calendar.monthrange(int(year), int(month))[1]
         year = str(year)
         month = str(month).zfill(2)
         print(f"Get Data of {year}/{month}.")
-        self.driver.get(f"https://zaim.net/money?month={year}{month}")
-        time.sleep(1)
+        self._load(f"https://zaim.net/money?month={year}{month}")
+        if not self._wait_for((By.XPATH, self._RESULTS_XPATH), self._results_timeout):
+            self._timing.complete = False
+            print(
+                f"Results of {year}/{month} did not load within "
+                f"{self._results_timeout}s. Rows of the month may be missing. "
+                "Raise ZAIM_RESULTS_TIMEOUT if this keeps happening."
+            )
+        self._timing.fixed_sleeps += self._NAVIGATION_SLEEP
 
         print(f"Found {day_len} days in {year}/{month}.")
         self.current = day_len
@@ -111,108 +328,90 @@ class ZaimCrawler:
         while self._crawler(year):
             pass
 
+        self._timing.rows = len(self.data)
+        self._timing.elapsed = time.perf_counter() - start
+        self.month_timings.append(self._timing)
+        self.last_month_complete = self._timing.complete
+        print(self._timing)
+
         return reversed(self.data)
 
     def close(self):
-        self.driver.close()
+        # quit also stops chromedriver and every Chrome process it started.
+        # A dead chromedriver raises urllib3 errors, not WebDriverException.
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Failed to stop Chrome: {e}")
 
-    def _crawler(self, year):
+    def is_logged_in(self) -> bool:
         try:
-            table = self.driver.find_element(
-                by=By.XPATH,
-                value="//*[starts-with(@class, 'SearchResult-module__list___')]",
-            )
-        except:
+            self._load("https://zaim.net/home")
+            return self._wait_for((By.ID, "payment_form"), self._page_timeout)
+        except Exception:
             return False
-        lines = table.find_elements(
-            by=By.XPATH,
-            value="//*[starts-with(@class, 'SearchResult-module__body___')]",
+
+    def rss_bytes(self) -> Optional[int]:
+        # Resident memory of chromedriver and the Chrome processes under it.
+        try:
+            return _process_tree_rss(self.driver.service.process.pid)
+        except AttributeError:
+            return None
+
+    def _load(self, url: str) -> None:
+        self.page_loads += 1
+        self.driver.get(url)
+
+    def _crawler(self, year):
+        # One script call reads every visible row and scrolls to the last one.
+        rows = self.driver.execute_script(
+            _EXTRACT_ROWS_SCRIPT, self._RESULTS_CSS, self._ROWS_CSS
         )
+        if not rows:
+            return False
 
-        for line in lines:
-            items = line.find_elements(by=By.TAG_NAME, value="div")
+        self.data.extend(parse_rows(rows, year, self._seen_ids))
 
-            item = {}
-            item["id"] = (
-                items[0]
-                .find_element(by=By.TAG_NAME, value="i")
-                .get_attribute("data-url")
-                .split("/")[2]
-            )
+        self._timing.scrolls += 1
+        self._timing.fixed_sleeps += self._SCROLL_SLEEP
 
-            flg_duplicate = next(
-                (data["id"] for data in self.data if data["id"] == item["id"]), None
+        # More rows were loaded when the list grew or scrolled. If neither
+        # happens, the end of the month has been reached.
+        def rows_changed(driver) -> bool:
+            count, first_url = driver.execute_script(
+                _ROWS_STATE_SCRIPT, self._ROWS_CSS
             )
-            if flg_duplicate:
-                continue
+            return count > 0 and (count != len(rows) or first_url != rows[0]["url"])
 
-            item["count"] = (
-                items[1]
-                .find_element(by=By.TAG_NAME, value="i")
-                .get_attribute("title")
-                .split("（")[0]
-            )
-            date = items[2].text.split("（")[0]
-            item["date"] = datetime.datetime.strptime(f"{year}年{date}", "%Y年%m月%d日")
-            item["category"] = (
-                items[3]
-                .find_element(by=By.TAG_NAME, value="span")
-                .get_attribute("data-title")
-            )
-            item["genre"] = items[3].find_elements(by=By.TAG_NAME, value="span")[1].text
-            item["amount"] = int(
-                items[4]
-                .find_element(by=By.TAG_NAME, value="span")
-                .text.strip("¥")
-                .replace(",", "")
-            )
-            m_from = items[5].find_elements(by=By.TAG_NAME, value="img")
-            if len(m_from) != 0:
-                item["from_account"] = m_from[0].get_attribute("data-title")
-            m_to = items[6].find_elements(by=By.TAG_NAME, value="img")
-            if len(m_to) != 0:
-                item["to_account"] = m_to[0].get_attribute("data-title")
-            item["type"] = (
-                "transfer"
-                if "from_account" in item and "to_account" in item
-                else (
-                    "payment"
-                    if "from_account" in item
-                    else "income" if "to_account" in item else None
-                )
-            )
-            item["place"] = items[7].find_element(by=By.TAG_NAME, value="span").text
-            item["name"] = items[8].find_element(by=By.TAG_NAME, value="span").text
-            item["comment"] = items[9].find_element(by=By.TAG_NAME, value="span").text
-            self.data.append(item)
-
-        current_id = (
-            lines[0]
-            .find_elements(by=By.TAG_NAME, value="div")[0]
-            .find_element(by=By.TAG_NAME, value="i")
-            .get_attribute("data-url")
-            .split("/")[2]
-        )
-        self.driver.execute_script(
-            "arguments[0].scrollIntoView(true);", lines[len(lines) - 1]
-        )
-        time.sleep(0.1)
-        next_id = (
-            self.driver.find_element(
-                by=By.XPATH,
-                value="//*[starts-with(@class, 'SearchResult-module__list___')]",
-            )
-            .find_elements(
-                by=By.XPATH,
-                value="//*[starts-with(@class, 'SearchResult-module__body___')]",
-            )[0]
-            .find_elements(by=By.TAG_NAME, value="div")[0]
-            .find_element(by=By.TAG_NAME, value="i")
-            .get_attribute("data-url")
-            .split("/")[2]
+        if self._wait_until(rows_changed, self._scroll_timeout):
+            return True
+
+        # Also how a month ends normally, when there are no more rows. A load
+        # slower than the timeout ends the month early the same way.
+        print(
+            f"No more rows after {self._scroll_timeout}s, ending the month at "
+            f"{len(self.data)} rows. Raise ZAIM_SCROLL_TIMEOUT if rows are missing."
         )
+        return False
 
-        if current_id == next_id:
-            return False
-        else:
+    def _wait_for(self, locator, timeout: float) -> bool:
+        return self._wait_until(EC.presence_of_element_located(locator), timeout)
+
+    def _wait_until(self, condition, timeout: float) -> bool:
+        start = time.perf_counter()
+        try:
+            WebDriverWait(
+                self.driver,
+                timeout,
+                poll_frequency=0.05,
+                ignored_exceptions=(
+                    NoSuchElementException,
+                    StaleElementReferenceException,
+                ),
+            ).until(condition)
             return True
+        except TimeoutException:
+            return False
+        finally:
+            if self._timing:
+                self._timing.waited += time.perf_counter() - start
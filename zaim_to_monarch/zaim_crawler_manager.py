@@ -0,0 +1,95 @@
+import os
+
+from typing import Any, Callable, Dict, List, Optional
+
+from .zaim_crawler import ZaimCrawler
+from .zaim_crawler_pool import ZaimCrawlerPool
+
+
+class ZaimCrawlerManager:
+    # Keeps a crawler pool warm between the syncs of a long running process.
+    # The pool is checked before it is reused and replaced when it died, got
+    # logged out, loaded too many pages or uses too much memory. Replacements
+    # start from the cookies of the last healthy session.
+    def __init__(
+        self,
+        pool_size: Optional[int] = None,
+        max_page_loads: Optional[int] = None,
+        max_rss_mb: Optional[int] = None,
+        crawler_factory: Callable[..., ZaimCrawler] = ZaimCrawler,
+    ):
+        self._pool_size: Optional[int] = pool_size
+        self._max_page_loads: int = max_page_loads or int(
+            os.getenv("ZAIM_MAX_PAGE_LOADS", "500")
+        )
+        self._max_rss_bytes: int = (
+            max_rss_mb or int(os.getenv("ZAIM_MAX_RSS_MB", "1024"))
+        ) * 1024 * 1024
+        self._crawler_factory = crawler_factory
+
+        self._pool: Optional[ZaimCrawlerPool] = None
+        self._cookies: Optional[List[Dict[str, Any]]] = None
+
+        self.started: int = 0
+        self.recycled: int = 0
+
+    def acquire(self) -> ZaimCrawlerPool:
+        if self._pool is not None and not self._is_alive(self._pool):
+            print("Zaim session is no longer logged in. Restarting Chrome.")
+            self._stop()
+
+        if self._pool is None:
+            self._pool = ZaimCrawlerPool(
+                os.getenv("ZAIM_USERNAME"),
+                os.getenv("ZAIM_PASSWORD"),
+                self._pool_size,
+                crawler_factory=self._crawler_factory,
+                cookies=self._cookies,
+            )
+            self.started += 1
+
+        return self._pool
+
+    def release(self) -> None:
+        # Called after every sync. Keeps the cookies for the next restart and
+        # recycles the pool if it grew too old or too large.
+        if self._pool is None:
+            return
+
+        try:
+            self._cookies = self._pool.cookies()
+        except Exception as e:
+            print(f"Failed to save zaim cookies: {e}")
+            self._stop()
+            return
+
+        page_loads = self._pool.page_loads()
+        rss_bytes = self._pool.rss_bytes()
+        if page_loads >= self._max_page_loads or (
+            rss_bytes is not None and rss_bytes >= self._max_rss_bytes
+        ):
+            rss = "unknown" if rss_bytes is None else f"{rss_bytes / 1024 / 1024:.0f}MB"
+            print(f"Recycling Chrome after {page_loads} page loads using {rss}.")
+            self._stop()
+            self.recycled += 1
+
+    def close(self) -> None:
+        self._stop()
+
+    @staticmethod
+    def _is_alive(pool: ZaimCrawlerPool) -> bool:
+        try:
+            return pool.is_logged_in()
+        except Exception as e:
+            print(f"Failed to check the zaim session: {e}")
+            return False
+
+    def _stop(self) -> None:
+        # The pool is dropped even when closing it fails, so the next sync
+        # starts a new one instead of reusing a dead pool.
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            try:
+                pool.close()
+            except Exception as e:
+                print(f"Failed to stop zaim sessions: {e}")
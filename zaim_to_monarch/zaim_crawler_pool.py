@@ -0,0 +1,142 @@
+import os
+import queue
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .zaim_crawler import MonthTiming, ZaimCrawler
+
+YearMonth = Tuple[int, int]
+
+
+class ZaimCrawlerPool:
+    # Crawls months with several Zaim sessions at once. The first crawler logs
+    # in, the others reuse its cookies. A size of 1 crawls every month with
+    # the first crawler, one after another.
+    def __init__(
+        self,
+        user_id,
+        password,
+        size: Optional[int] = None,
+        crawler_factory: Callable[..., ZaimCrawler] = ZaimCrawler,
+        cookies: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self._user_id = user_id
+        self._password = password
+        self._crawler_factory = crawler_factory
+        self.size: int = max(
+            1, size or int(os.getenv("ZAIM_CRAWLER_POOL_SIZE", "1"))
+        )
+
+        self._crawlers: List[ZaimCrawler] = [
+            crawler_factory(user_id, password, cookies=cookies)
+        ]
+        # Months crawled whose results list did not load. Their rows may be
+        # missing, so they must not be cached.
+        self.incomplete_months: Set[YearMonth] = set()
+
+    def get_account_balances(self) -> Dict[str, int]:
+        return self._crawlers[0].get_account_balances()
+
+    def get_months(
+        self, months: List[YearMonth]
+    ) -> Iterator[Tuple[YearMonth, List[Dict]]]:
+        # Yields the rows of every month in the order of months, as soon as
+        # that month and all the ones before it have been crawled.
+        size = min(self.size, len(months))
+        if size <= 1:
+            for month in months:
+                yield month, self._crawl(self._crawlers[0], month)
+            return
+
+        self._start_crawlers(size)
+
+        idle: queue.Queue = queue.Queue()
+        for crawler in self._crawlers:
+            idle.put(crawler)
+
+        def crawl(month: YearMonth) -> List[Dict]:
+            crawler = idle.get()
+            try:
+                return self._crawl(crawler, month)
+            finally:
+                idle.put(crawler)
+
+        with ThreadPoolExecutor(max_workers=len(self._crawlers)) as executor:
+            for month, rows in zip(months, executor.map(crawl, months)):
+                yield month, rows
+
+    def _crawl(self, crawler: ZaimCrawler, month: YearMonth) -> List[Dict]:
+        rows = list(crawler.get_data(*month))
+        if crawler.last_month_complete:
+            self.incomplete_months.discard(month)
+        else:
+            self.incomplete_months.add(month)
+        return rows
+
+    def month_timings(self) -> List[MonthTiming]:
+        timings = [
+            timing
+            for crawler in self._crawlers
+            for timing in crawler.month_timings
+        ]
+        return sorted(timings, key=lambda timing: (timing.year, timing.month))
+
+    def cookies(self) -> List[Dict[str, Any]]:
+        return self._crawlers[0].cookies()
+
+    def is_logged_in(self) -> bool:
+        # Extra sessions that died are dropped, they are restarted from the
+        # first session when needed.
+        if not self._crawlers or not self._crawlers[0].is_logged_in():
+            return False
+
+        alive = [self._crawlers[0]]
+        for crawler in self._crawlers[1:]:
+            if crawler.is_logged_in():
+                alive.append(crawler)
+            else:
+                crawler.close()
+        self._crawlers = alive
+        return True
+
+    def page_loads(self) -> int:
+        return sum(crawler.page_loads for crawler in self._crawlers)
+
+    def rss_bytes(self) -> Optional[int]:
+        sizes = [crawler.rss_bytes() for crawler in self._crawlers]
+        if any(size is None for size in sizes):
+            return None
+        return sum(sizes)
+
+    def close(self) -> None:
+        # Every crawler is closed, even when closing one of them fails.
+        crawlers, self._crawlers = self._crawlers, []
+        for crawler in crawlers:
+            try:
+                crawler.close()
+            except Exception as e:
+                print(f"Failed to close zaim session: {e}")
+
+    def _start_crawlers(self, size: int) -> None:
+        missing = size - len(self._crawlers)
+        if missing <= 0:
+            return
+
+        cookies: List[Dict[str, Any]] = self._crawlers[0].cookies()
+
+        def start(_) -> Optional[ZaimCrawler]:
+            try:
+                return self._crawler_factory(
+                    self._user_id, self._password, cookies=cookies
+                )
+            except Exception as e:
+                print(f"Could not start another zaim session: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            started = list(executor.map(start, range(missing)))
+
+        self._crawlers.extend(crawler for crawler in started if crawler is not None)
+
+        print(f"Crawling with {len(self._crawlers)} zaim sessions.")
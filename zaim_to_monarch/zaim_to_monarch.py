@@ -1,28 +1,257 @@
+import asyncio
+import os
 import sys
+import threading
 
+from typing import Awaitable, Dict, Optional
+
+from .cache import cache_dir
+from .change_plan import ChangePlan
+from .instrumentation import Instrumentation
+from .ledger import SyncLedger
 from .monarch import Monarch
+from .month_cache import MonthCache
+from .options import SyncOptions
+from .pdf_cache import PdfCache
 from .pdf_parser import PdfParser
+from .profiling import Profiler
 from .zaim import Zaim
+from .zaim_crawler_manager import ZaimCrawlerManager
+
+# Phases of do_sync that run concurrently before zaim is crawled.
+_STARTUP_PHASES = ["zaim startup", "monarch login", "monarch category lookup"]
+
+
+async def do_sync(
+    start_date,
+    end_date,
+    options: Optional[SyncOptions] = None,
+    crawler_manager: Optional[ZaimCrawlerManager] = None,
+) -> None:
+    options = options or SyncOptions()
+    instrumentation = Instrumentation("sync", Profiler() if options.profile else None)
+    try:
+        await _sync(start_date, end_date, options, crawler_manager, instrumentation)
+    except BaseException as e:
+        instrumentation.error = repr(e)
+        raise
+    finally:
+        _write_report(instrumentation, options)
+
+
+async def _sync(
+    start_date,
+    end_date,
+    options: SyncOptions,
+    crawler_manager: Optional[ZaimCrawlerManager],
+    instrumentation: Instrumentation,
+) -> None:
+    ledger = SyncLedger(options.ledger_file)
+    # Closed on errors too, so the --every_n_days loop does not leak a
+    # connection for every failed sync.
+    try:
+        if options.full_sync:
+            ledger.reset()
+
+        loop = asyncio.get_running_loop()
+
+        # Starting zaim (Chrome, login and balances) blocks, so it runs in a
+        # thread while monarch logs in. A crawler manager keeps Chrome running
+        # between syncs, otherwise Chrome is stopped once zaim has been crawled.
+        month_cache = MonthCache(
+            os.getenv("ZAIM_USERNAME"),
+            settled_days=options.zaim_cache_settled_days,
+            refresh=options.refresh_zaim_cache,
+        )
+
+        def start_zaim() -> Zaim:
+            with instrumentation.phase("zaim startup"):
+                if crawler_manager is not None:
+                    return Zaim(
+                        crawler=crawler_manager.acquire(),
+                        month_cache=month_cache,
+                        instrumentation=instrumentation,
+                    )
+                return Zaim(
+                    crawler_pool_size=options.crawler_pool_size,
+                    month_cache=month_cache,
+                    instrumentation=instrumentation,
+                )
+
+        zaim_startup = loop.run_in_executor(None, start_zaim)
+
+        # The ledger is checked against the monarch accounts during login, before
+        # zaim uses it to skip transactions.
+        monarch = Monarch(
+            push_concurrency=options.push_concurrency,
+            ledger=ledger,
+            instrumentation=instrumentation,
+            batch_size=options.batch_size,
+            rate_limit=options.rate_limit,
+        )
+        try:
+            with instrumentation.phase("monarch login"):
+                await monarch.login()
+            with instrumentation.phase("monarch category lookup"):
+                await monarch.find_transaction_category()
+        except BaseException:
+            await _abandon_zaim_startup(zaim_startup, crawler_manager)
+            raise
 
+        zaim = await zaim_startup
+        # An estimate from the phase durations. Running them one after
+        # another is not measured.
+        print(
+            "Zaim startup and monarch login overlapped "
+            f"~{instrumentation.timeline.overlap_saved(_STARTUP_PHASES):.1f}s."
+        )
+
+        try:
+            if options.streaming:
+                with instrumentation.phase("zaim stream"):
+                    await _stream_sync(
+                        zaim,
+                        monarch,
+                        start_date,
+                        end_date,
+                        ledger,
+                        options.stream_queue_size,
+                    )
+            else:
+                with instrumentation.phase("zaim crawl"):
+                    await loop.run_in_executor(
+                        None, zaim.load_data, start_date, end_date, ledger
+                    )
+        finally:
+            _stop_zaim(zaim, crawler_manager)
+
+        if not options.streaming:
+            with instrumentation.phase("monarch import"):
+                await monarch.import_accounts(list(zaim.accounts().values()))
+
+            with instrumentation.phase("monarch push"):
+                await monarch.push(dry_run=False)
+    finally:
+        ledger.close()
+
+
+def _write_report(instrumentation: Instrumentation, options: SyncOptions) -> None:
+    # A failing report must not fail the run, or hide the error that ended it.
+    print(instrumentation)
+    try:
+        path = instrumentation.write(options.report_dir, options.prometheus_file)
+        print(f"Wrote run report to {path}")
+    except OSError as e:
+        print(f"Failed to write run report: {e}")
+
+    profiler = instrumentation.profiler
+    if profiler is None:
+        return
+    profiler.stop()
+    print(profiler.summary())
+    try:
+        name = f"{instrumentation.run}-{instrumentation.started_at.strftime('%Y%m%d-%H%M%S')}"
+        print(f"Wrote profiles to {profiler.write(name)}")
+    except OSError as e:
+        print(f"Failed to write profiles: {e}")
+
+
+async def _abandon_zaim_startup(
+    zaim_startup: Awaitable[Zaim], crawler_manager: Optional[ZaimCrawlerManager]
+) -> None:
+    # Stops zaim once monarch failed to start. If zaim failed to start as
+    # well, its error is only logged so the monarch error is the one raised.
+    try:
+        zaim = await zaim_startup
+    except Exception as e:
+        print(f"Zaim failed to start as well: {e!r}")
+        if crawler_manager is not None:
+            crawler_manager.release()
+        return
+    _stop_zaim(zaim, crawler_manager)
 
-async def do_sync(start_date, end_date) -> None:
 
-    zaim = Zaim()
+def _stop_zaim(zaim: Zaim, crawler_manager: Optional[ZaimCrawlerManager]) -> None:
+    if crawler_manager is not None:
+        crawler_manager.release()
+    else:
+        zaim.close()
 
-    zaim.load_data(start_date, end_date)
 
-    monarch = Monarch()
-    await monarch.login()
+async def _stream_sync(
+    zaim: Zaim,
+    monarch: Monarch,
+    start_date,
+    end_date,
+    ledger: Optional[SyncLedger],
+    queue_size: Optional[int] = None,
+) -> None:
+    # Zaim is crawled in a thread and hands each month over through a bounded
+    # queue, so monarch imports and pushes a month while the next ones are
+    # crawled.
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(
+        maxsize=max(1, queue_size or int(os.getenv("ZAIM_STREAM_QUEUE_SIZE", "2")))
+    )
+    stop = threading.Event()
 
-    for zaim_account in zaim.accounts().values():
-        await monarch.import_account(zaim_account)
+    def put(item) -> None:
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
 
-    await monarch.push(dry_run=False)
+    def produce() -> None:
+        try:
+            for accounts in zaim.stream_data(start_date, end_date, ledger):
+                if stop.is_set():
+                    return
+                put(accounts)
+        finally:
+            put(None)
 
+    producer = loop.run_in_executor(None, produce)
 
-async def import_pdfs(pdfs_dir) -> None:
-    monarch = Monarch()
-    await monarch.login()
+    try:
+        while True:
+            accounts = await queue.get()
+            if accounts is None:
+                break
+
+            await monarch.import_accounts(list(accounts.values()))
+            await monarch.push(dry_run=False)
+            monarch.release_transactions()
+    except BaseException:
+        # Let the crawler thread finish its month and stop.
+        stop.set()
+        while await queue.get() is not None:
+            pass
+        raise
+
+    # Raises the error of the crawler, if any.
+    await producer
+
+
+async def import_pdfs(pdfs_dir, options: Optional[SyncOptions] = None) -> None:
+    options = options or SyncOptions()
+    instrumentation = Instrumentation("pdf", Profiler() if options.profile else None)
+    try:
+        await _import_pdfs(pdfs_dir, options, instrumentation)
+    except BaseException as e:
+        instrumentation.error = repr(e)
+        raise
+    finally:
+        _write_report(instrumentation, options)
+
+
+async def _import_pdfs(
+    pdfs_dir, options: SyncOptions, instrumentation: Instrumentation
+) -> None:
+    monarch = Monarch(
+        push_concurrency=options.push_concurrency,
+        instrumentation=instrumentation,
+        batch_size=options.batch_size,
+        rate_limit=options.rate_limit,
+    )
+    with instrumentation.phase("monarch login"):
+        await monarch.login()
 
     i: int = 1
 
@@ -45,21 +274,104 @@ async def import_pdfs(pdfs_dir) -> None:
         if not choice in account_ids:
             print(f"{line} is not a valid choice")
 
-    parser: PdfParser = PdfParser(account_ids[choice])
+    pdf_cache = PdfCache(PdfParser.cache_version())
+    parser: PdfParser = PdfParser(account_ids[choice], options.pdf_workers, pdf_cache)
 
-    parser.parse_dir(pdfs_dir)
+    if options.streaming:
+        await _stream_pdfs(parser, monarch, pdfs_dir, instrumentation)
+        _count_pdf_cache(pdf_cache, instrumentation)
+        return
+
+    with instrumentation.phase("pdf parse"), instrumentation.profiled("parse"):
+        parser.parse_dir(pdfs_dir)
+    _count_pdf_cache(pdf_cache, instrumentation)
+
+    with instrumentation.phase("monarch import"):
+        await monarch.import_account(parser.get_account())
 
-    await monarch.import_account(parser.get_account())
+    # The reviewed plan is applied as is, and kept so it can be applied by a
+    # later --apply_plan run instead.
+    with instrumentation.phase("monarch plan"):
+        plan = await monarch.plan()
+    plan_file = options.plan_file or os.path.join(
+        cache_dir(),
+        "plans",
+        f"pdf-{instrumentation.started_at.strftime('%Y%m%d-%H%M%S')}.json",
+    )
+    plan.save(plan_file)
 
     print("The following changes would be made to monarch. Continue? (y/N)")
-    await monarch.push(dry_run=True)
+    print(plan)
+    print(f"Saved the plan to {plan_file}.")
 
     choice = input()
 
     if choice != "y":
-        print("Exiting.")
+        print(f"Exiting. Apply the plan later with --apply_plan {plan_file}")
         return
 
-    await monarch.push(dry_run=False)
+    await _apply_saved_plan(monarch, plan, plan_file, instrumentation)
 
     return
+
+
+async def apply_plan(plan_file: str, options: Optional[SyncOptions] = None) -> None:
+    options = options or SyncOptions()
+    instrumentation = Instrumentation("apply", Profiler() if options.profile else None)
+    try:
+        plan = ChangePlan.load(plan_file)
+        print(f"Applying the plan made at {plan.created_at}:")
+        print(plan)
+
+        monarch = Monarch(
+            push_concurrency=options.push_concurrency,
+            instrumentation=instrumentation,
+            batch_size=options.batch_size,
+            rate_limit=options.rate_limit,
+        )
+        with instrumentation.phase("monarch login"):
+            await monarch.login()
+        await _apply_saved_plan(monarch, plan, plan_file, instrumentation)
+    except BaseException as e:
+        instrumentation.error = repr(e)
+        raise
+    finally:
+        _write_report(instrumentation, options)
+
+
+async def _apply_saved_plan(
+    monarch: Monarch, plan: ChangePlan, plan_file: str, instrumentation: Instrumentation
+) -> None:
+    # The plan is saved again even when the apply failed. It then holds the
+    # ids of the transactions that were created, or that it was applied.
+    try:
+        with instrumentation.phase("monarch push"):
+            await monarch.apply(plan)
+    finally:
+        plan.save(plan_file)
+    print(f"Marked {plan_file} as applied.")
+
+
+async def _stream_pdfs(
+    parser: PdfParser, monarch: Monarch, pdfs_dir, instrumentation: Instrumentation
+) -> None:
+    # Pushes statements month by month, so there is no dry run to review.
+    print(
+        "Transactions will be pushed to monarch month by month without a dry run. "
+        "Continue? (y/N)"
+    )
+
+    if input() != "y":
+        print("Exiting.")
+        return
+
+    with instrumentation.phase("pdf stream"):
+        for account in parser.stream_dir(pdfs_dir):
+            await monarch.import_account(account)
+            await monarch.push(dry_run=False)
+            monarch.release_transactions()
+
+
+def _count_pdf_cache(pdf_cache: PdfCache, instrumentation: Instrumentation) -> None:
+    instrumentation.count("pdf_cache_hits", pdf_cache.hits)
+    instrumentation.count("pdf_cache_misses", pdf_cache.misses)